@@ -3,7 +3,6 @@ import os
 from datetime import timedelta
 from dotenv import load_dotenv
 
-
 # Load environment variables from .env file
 load_dotenv()
 
@@ -26,7 +25,6 @@ ALLOWED_HOSTS = []
 # Application definition
 
 INSTALLED_APPS = [
-    "django.contrib.admin",
     "django.contrib.auth",
     "django.contrib.contenttypes",
     "django.contrib.sessions",
@@ -41,6 +39,12 @@ INSTALLED_APPS = [
 EXTERNAL_APPS = ["api"]
 
 INSTALLED_APPS += EXTERNAL_APPS
+
+# API-only workers can skip loading the admin (and its URLs)
+ADMIN_ENABLED = os.getenv("ADMIN_ENABLED", "true").lower() == "true"
+if ADMIN_ENABLED:
+    INSTALLED_APPS.insert(0, "django.contrib.admin")
+
 MIDDLEWARE = [
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
@@ -50,6 +54,8 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    # Replays retried writes sent with an Idempotency-Key header
+    "api.idempotency.IdempotencyMiddleware",
 ]
 
 ROOT_URLCONF = "Backend.urls"
@@ -83,6 +89,9 @@ DATABASES = {
         "PASSWORD": os.getenv("POSTGRES_PASSWORD"),
         "HOST": "localhost",
         "PORT": "5432",
+        # Seconds a connection is reused across requests (0: one per request)
+        "CONN_MAX_AGE": int(os.getenv("DB_CONN_MAX_AGE", "0")),
+        "CONN_HEALTH_CHECKS": True,
     }
 }
 
@@ -133,7 +142,7 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 REST_FRAMEWORK = {
     #    "DEFAULT_RENDERER_CLASSES": ("rest_framework.renderers.JSONRenderer",)
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "api.authentication.StoreJWTAuthentication",
         "rest_framework.authentication.SessionAuthentication",
         "rest_framework.authentication.BasicAuthentication",
     ),
@@ -144,14 +153,19 @@ REST_FRAMEWORK = {
     ],
     "DEFAULT_FILTER _BACKENDS": ["django_filters.rest_framework.DjangoFilterBackend"],
     "DEFAULT_RENDERER_CLASSES": [
-        "rest_framework.renderers.JSONRenderer",
+        "api.renderers.FastJSONRenderer",  # orjson when installed
     ],
     "DEFAULT_THROTTLE_CLASSES": [
-        "rest_framework.throttling.UserRateThrottle",
-        "rest_framework.throttling.AnonRateThrottle",
+        "api.throttling.ScopedTokenBucketThrottle",
     ],
+    # Token bucket capacity per period; store admins share their store's bucket
     "DEFAULT_THROTTLE_RATES": {
-        "user": "100/hour",  # for authenticated users
+        "catalog_read": "1200/min",  # products, stores, inventory, suppliers
+        "sales_write": "300/min",  # POS checkouts
+        "reports": "60/min",  # sales listings and reports
+        "sync": "120/min",  # POS terminal sync round trips
+        "read": "600/min",  # other authenticated reads
+        "write": "120/min",  # other authenticated writes
         "anon": "10/hour",  # for anonymous users
     },
 }
@@ -159,16 +173,131 @@ REST_FRAMEWORK = {
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=30),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
+    # Adds store_id/is_superuser claims so reads skip the user lookup
+    "TOKEN_OBTAIN_SERIALIZER": "api.authentication.StoreTokenObtainPairSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "api.authentication.StoreTokenRefreshSerializer",
+}
+
+# Per-process cache for reference rows (stores, addresses, admins, suppliers)
+REFERENCE_CACHE = {
+    "MAX_SIZE": 2048,  # entries per process
+    "TTL": 300,  # seconds
+    "VERSION_CHECK_INTERVAL": 1.0,  # seconds between shared version reads
+}
+
+# Build read-only sales/inventory listings from values() rows instead of
+# ModelSerializer instances (see api/fastpath.py)
+API_FAST_READ_PATH = os.getenv("API_FAST_READ_PATH", "false").lower() == "true"
+
+# Cold archive of old sales (api/archive.py), written by `archive_sales`
+SALES_ARCHIVE = {
+    "DIR": os.getenv("SALES_ARCHIVE_DIR", BASE_DIR / "archive"),
+}
+
+# Columnar copy of sales items for heavy reports (api/analytics.py), appended
+# to by `refresh_analytics`
+ANALYTICS_STORE = {
+    "DIR": os.getenv("ANALYTICS_STORE_DIR", BASE_DIR / "analytics"),
+    "SETTLE_SECONDS": 60,  # leave rows this young for the next refresh
+}
+
+# Database-backed background task queue (api/tasks.py), run by `run_tasks`
+TASK_QUEUE = {
+    "WORKERS": 4,  # tasks run at once per worker command
+    "POLL_SECONDS": 1.0,  # idle wait between polls of the queue
+    "MAX_ATTEMPTS": 3,  # default runs per task before it is marked failed
+    "BACKOFF_SECONDS": 10,  # retry delay, doubled after every failure
+    "HEARTBEAT_SECONDS": 60,  # how often a running task renews its claim
+    "STALE_SECONDS": 900,  # no renewal for this long means the worker died
+}
+
+# Transactional outbox of sales and stock events (api/outbox.py), published by
+# `relay_outbox` to SINK: api.outbox.FileSink(path), HTTPSink(url, headers,
+# timeout) or LocalQueueSink(), or any class with a send(messages) method
+OUTBOX = {
+    "SINK": os.getenv("OUTBOX_SINK", "api.outbox.FileSink"),
+    "OPTIONS": {"path": os.getenv("OUTBOX_FILE", BASE_DIR / "outbox.ndjson")},
+    "BATCH_SIZE": 500,  # events per send
+    "POLL_SECONDS": 1.0,  # idle wait between polls
+    "KEEP_DAYS": 7,  # published events are purged after this
+}
+
+# Stored responses of writes sent with an Idempotency-Key (api/idempotency.py);
+# expired ones are deleted by the purge_idempotency_keys task
+IDEMPOTENCY = {
+    "TTL": 24 * 3600,  # seconds a stored response is replayed
 }
 
+# Change tracking (api/changes.py) for products, stores, suppliers and inventory
+CHANGES = {
+    "SETTLE_SECONDS": 5,  # changes this young wait for the next pull
+    "TOMBSTONE_DAYS": 30,  # deletes kept (purge_tombstones); older cursors get 410
+}
+
+# POS terminal sync (api/sync.py, POST /api/sync/)
+SYNC = {
+    "BATCH_SIZE": 500,  # changed rows and deletes per stream per round trip
+    "MAX_PUSH": 100,  # sales per round trip
+}
+
+# Best sellers and ABC classes per store (api/rankings.py), refreshed by
+# `refresh_rankings` from the sales items added since the last run
+RANKINGS = {
+    "MONTHS": 3,  # ranked over this month and the ones before it
+    "TOP": 20,  # best sellers kept per store
+    "ABC": (80, 95),  # cumulative revenue percent closing the A and B classes
+    "SETTLE_SECONDS": 60,  # leave items this young for the next refresh
+}
+
+# Demand forecasts and reorder suggestions (api/forecast.py), written by
+# `forecast_demand`
+FORECAST = {
+    "HISTORY_DAYS": 56,  # complete days of sales fitted
+    "ALPHA": 0.2,  # exponential smoothing weight of the latest day
+    "LEAD_TIME_DAYS": 7,  # from ordering to stock on the shelf
+    "REVIEW_DAYS": 7,  # between two runs; orders cover it too
+    "SERVICE_Z": 1.65,  # safety stock in standard deviations (~95% in stock)
+    "CHUNK_STORES": 50,  # stores fitted together by one worker
+    "WORKERS": min(4, os.cpu_count() or 1),  # processes fitting the chunks
+    "BATCH_SIZE": 5000,  # suggestions per INSERT
+}
+
+# Counts of paginated API lists (api/pagination.py)
+PAGINATION = {
+    "EXACT_COUNT_BELOW": 10000,  # larger lists report PostgreSQL's estimate
+    "COUNT_CACHE_SECONDS": 30,  # per query (filters and store scope)
+}
+
+# Admin changelists of the large tables (api/admin_perf.py)
+ADMIN_PERFORMANCE = {
+    "EXACT_COUNT_BELOW": 10000,  # larger changelists show PostgreSQL's estimate
+    "COUNT_CACHE_SECONDS": 0,  # edits show up in the count right away
+    "BUDGET_MS": 200,  # `bench_admin` fails above this changelist time
+}
+
+# Worker startup (api/startup.py). With PRELOAD the WSGI module warms URL
+# lookups, serializer fields and persistent DB connections before the
+# first request. Under gunicorn --preload that happens before forking, so set
+# STARTUP_PRELOAD=false and call api.startup.preload() in a post_fork hook.
+STARTUP = {
+    "PRELOAD": os.getenv("STARTUP_PRELOAD", "true").lower() == "true",
+    "IMPORT_BUDGET_MS": 600,  # `report_importtime` fails above this boot time
+}
+
+
+# Caching Configuration
+# The shared cache holds reference-cache versions and throttle buckets. Without
+# REDIS_URL each process falls back to its own local memory cache.
+if os.getenv("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django_redis.cache.RedisCache",
+            "LOCATION": os.getenv("REDIS_URL"),  # e.g. redis://127.0.0.1:6379/1
+            "OPTIONS": {
+                "CLIENT_CLASS": "django_redis.client.DefaultClient",
+            },
+        }
+    }
 
-# # Caching Configuration
-# CACHES = {
-#     "default": {
-#         "BACKEND": "django_redis.cache.RedisCache",
-#         "LOCATION": "redis://127.0.0.1:6379/1",  # Adjust for your Redis server
-#         "OPTIONS": {
-#             "CLIENT_CLASS": "django_redis.client.DefaultClient",
-#         },
-#     }
-# }
+# Per-store overrides of DEFAULT_THROTTLE_RATES, e.g. {1: {"sales_write": "900/min"}}
+STORE_THROTTLE_RATES = {}
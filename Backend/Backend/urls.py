@@ -15,8 +15,13 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 
-from django.contrib import admin
+from django.conf import settings
 from django.urls import path, include
 from api import urls as api_urls
 
-urlpatterns = [path("admin/", admin.site.urls), path("api/", include(api_urls))]
+urlpatterns = [path("api/", include(api_urls))]
+
+if settings.ADMIN_ENABLED:
+    from django.contrib import admin
+
+    urlpatterns.insert(0, path("admin/", admin.site.urls))
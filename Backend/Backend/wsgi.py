@@ -14,3 +14,11 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Backend.settings')
 
 application = get_wsgi_application()
+
+# Warm the worker before its first request (see STARTUP in settings)
+from django.conf import settings  # noqa: E402
+
+if settings.STARTUP["PRELOAD"]:
+    from api.startup import preload
+
+    preload()
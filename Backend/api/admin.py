@@ -1,5 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
+from .admin_perf import AutocompleteFilter, LargeTableAdminMixin
 from .models import (
     Address,
     StoreAdmin,
@@ -10,6 +11,11 @@ from .models import (
     Sales,
     SalesItems,
     InventoryMovement,
+    Task,
+    OutboxEvent,
+    IdempotencyKey,
+    SyncedSale,
+    Tombstone,
 )
 
 
@@ -112,6 +118,7 @@ class ProductAdmin(admin.ModelAdmin):
 @admin.register(Store)
 class StoreAdmin(admin.ModelAdmin):
     list_display = ("id", "name", "admin", "address", "created_at")
+    list_select_related = ("admin", "address")
     list_filter = ("created_at",)
     search_fields = ("name",)
     ordering = ("name", "created_at")
@@ -132,7 +139,7 @@ class SupplierAdmin(admin.ModelAdmin):
 
 
 @admin.register(Inventory)
-class InventoryAdmin(admin.ModelAdmin):
+class InventoryAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = (
         "id",
         "store",
@@ -142,8 +149,14 @@ class InventoryAdmin(admin.ModelAdmin):
         "reorder_level",
         "created_at",
     )
-    list_filter = ("store", "supplier", "created_at")
+    list_select_related = ("store", "product", "supplier")
+    list_filter = (
+        ("store", AutocompleteFilter),
+        ("supplier", AutocompleteFilter),
+        "created_at",
+    )
     search_fields = ("store__name", "product__product_name", "supplier__name")
+    autocomplete_fields = ("store", "product", "supplier")
     ordering = ("store", "product", "created_at")
     fieldsets = (
         ("Inventory Details", {"fields": ("store", "product", "quantity", "supplier")}),
@@ -168,7 +181,7 @@ class InventoryAdmin(admin.ModelAdmin):
 
 
 @admin.register(Sales)
-class SalesAdmin(admin.ModelAdmin):
+class SalesAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = (
         "id",
         "store",
@@ -177,8 +190,11 @@ class SalesAdmin(admin.ModelAdmin):
         "overall_discount",
         "created_at",
     )
-    list_filter = ("store", "created_at")
-    search_fields = ("store__name", "id")
+    list_select_related = ("store",)
+    list_filter = (("store", AutocompleteFilter), "created_at")
+    # Exact ids only: a name or icontains search would scan every partition
+    search_fields = ("=id",)
+    autocomplete_fields = ("store",)
     ordering = ("-created_at",)
     fieldsets = (
         ("Sale Details", {"fields": ("store",)}),
@@ -212,7 +228,7 @@ class SalesAdmin(admin.ModelAdmin):
 
 
 @admin.register(SalesItems)
-class SalesItemsAdmin(admin.ModelAdmin):
+class SalesItemsAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = (
         "id",
         "sales",
@@ -222,8 +238,16 @@ class SalesItemsAdmin(admin.ModelAdmin):
         "discount",
         "created_at",
     )
-    list_filter = ("sales__store", "created_at")
-    search_fields = ("sales__id", "product__product_name")
+    list_select_related = ("sales__store", "product")
+    list_filter = (
+        ("sales__store", AutocompleteFilter),
+        ("product", AutocompleteFilter),
+        "created_at",
+    )
+    # Exact ids only: a name or icontains search would scan every partition
+    search_fields = ("=sales__id",)
+    raw_id_fields = ("sales",)
+    autocomplete_fields = ("product",)
     ordering = ("-created_at",)
     fieldsets = (
         ("Sale Item Details", {"fields": ("sales", "product", "quantity")}),
@@ -247,7 +271,7 @@ class SalesItemsAdmin(admin.ModelAdmin):
 
 
 @admin.register(InventoryMovement)
-class InventoryMovementAdmin(admin.ModelAdmin):
+class InventoryMovementAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = (
         "id",
         "inventory",
@@ -256,8 +280,14 @@ class InventoryMovementAdmin(admin.ModelAdmin):
         "created_by",
         "created_at",
     )
-    list_filter = ("movement_type", "created_at", "inventory__store")
+    list_select_related = ("inventory__store", "inventory__product", "created_by")
+    list_filter = (
+        "movement_type",
+        "created_at",
+        ("inventory__store", AutocompleteFilter),
+    )
     search_fields = ("inventory__product__product_name", "notes")
+    autocomplete_fields = ("inventory", "source_store", "destination_store")
     ordering = ("-created_at",)
     fieldsets = (
         ("Movement Details", {"fields": ("inventory", "quantity", "movement_type")}),
@@ -281,3 +311,70 @@ class InventoryMovementAdmin(admin.ModelAdmin):
             },
         ),
     )
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = (
+        "id",
+        "name",
+        "status",
+        "attempts",
+        "run_at",
+        "created_by",
+        "created_at",
+        "finished_at",
+    )
+    list_filter = ("status", "name", "created_at")
+    search_fields = ("name", "error")
+    ordering = ("-created_at",)
+    readonly_fields = ("locked_by", "locked_at", "result", "error")
+
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = (
+        "id",
+        "topic",
+        "store",
+        "key",
+        "created_at",
+        "published_at",
+        "attempts",
+    )
+    list_select_related = ("store",)
+    list_filter = ("topic", "created_at", "published_at")
+    search_fields = ("topic", "key")
+    ordering = ("-id",)
+    readonly_fields = ("payload", "last_error")
+
+
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ("id", "user", "key", "status_code", "created_at")
+    list_select_related = ("user",)
+    list_filter = ("status_code", "created_at")
+    search_fields = ("key", "user__username")
+    ordering = ("-created_at",)
+    readonly_fields = ("fingerprint", "headers", "body")
+
+
+@admin.register(SyncedSale)
+class SyncedSaleAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ("id", "store", "client_id", "sales_id", "created_at")
+    list_select_related = ("store",)
+    list_filter = ("created_at",)
+    search_fields = ("=client_id",)
+    ordering = ("-id",)
+    readonly_fields = ("fingerprint",)
+
+
+@admin.register(Tombstone)
+class TombstoneAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ("id", "model", "object_id", "store", "deleted_at")
+    # Joined, as the store may be gone (no database constraint)
+    list_select_related = ("store",)
+    date_hierarchy = "deleted_at"
+    list_filter = ("model", "deleted_at")
+    search_fields = ("object_id",)
+    ordering = ("-id",)
@@ -0,0 +1,575 @@
+import datetime
+import json
+import random
+import re
+from dataclasses import dataclass, field
+from decimal import Decimal
+
+from django.apps import apps
+from django.contrib.postgres.indexes import GinIndex
+from django.db import connection, models
+from django.db.migrations import AddIndex
+from django.db.migrations.loader import MigrationLoader
+from django.db.migrations.writer import OperationWriter
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Upper
+from django.utils import timezone
+
+from .filter import InventoryFilters, ProductFilter, SalesFilter
+from .models import (
+    Address,
+    Inventory,
+    Product,
+    Sales,
+    SalesItems,
+    Store,
+    StoreAdmin,
+    Supplier,
+)
+
+# (name, model, filterset, ordering fields, column store admins are scoped by)
+TARGETS = [
+    (
+        "sales",
+        Sales,
+        SalesFilter,
+        ["total_quantity", "total_price", "created_at"],
+        "store",
+    ),
+    (
+        "inventory",
+        Inventory,
+        InventoryFilters,
+        ["quantity", "reorder_level", "last_restock_date", "created_at"],
+        "store",
+    ),
+    (
+        "products",
+        Product,
+        ProductFilter,
+        ["product_name", "cost_price", "sale_price", "discount", "created_at"],
+        None,
+    ),
+]
+
+PAGE_SIZE = 10
+EQUALITY_LOOKUPS = {"exact"}
+RANGE_LOOKUPS = {"lte", "gte", "lt", "gt", "range"}
+# Partitions of the sales tables, reported under their parent
+PARTITION_SUFFIX = re.compile(r"_(p\d{6}|legacy)$")
+
+
+@dataclass
+class Finding:
+    target: str
+    params: dict
+    scoped: bool
+    milliseconds: float
+    problems: list = field(default_factory=list)  # "Seq Scan on ...", ...
+    proposals: list = field(default_factory=list)  # (model, Index)
+
+
+def resolve(model, path):
+    """
+    ``"store__name"`` on Sales -> ``(Store, Store.name)``.
+    """
+    parts = path.split("__")
+    for part in parts[:-1]:
+        model = model._meta.get_field(part).related_model
+    return model, model._meta.get_field(parts[-1])
+
+
+def quantile(queryset, path, fraction):
+    values = queryset.exclude(**{f"{path}__isnull": True}).order_by(path)
+    count = values.count()
+    if not count:
+        return None
+    return values.values_list(path, flat=True)[min(int(count * fraction), count - 1)]
+
+
+def as_param(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return str(value)
+
+
+def sample_param(queryset, path, lookup):
+    """
+    A realistic, fairly selective query parameter for ``path__lookup``, taken
+    from the data itself. None when the column is empty.
+    """
+    if lookup == "range":
+        low, high = quantile(queryset, path, 0.45), quantile(queryset, path, 0.55)
+        return None if low is None else f"{as_param(low)},{as_param(high)}"
+    fraction = {"lte": 0.05, "lt": 0.05, "gte": 0.95, "gt": 0.95}.get(lookup, 0.5)
+    value = quantile(queryset, path, fraction)
+    if value is None:
+        return None
+    if lookup == "icontains":
+        text = str(value)
+        start = len(text) // 3
+        return text[start : start + 3] or text
+    return as_param(value)
+
+
+def filter_params(queryset, filterset_class):
+    """
+    ``{filter name: sample value}`` for every declared filter.
+    """
+    params = {}
+    for name, declared in filterset_class.base_filters.items():
+        if declared.method:
+            continue
+        value = sample_param(queryset, declared.field_name, declared.lookup_expr)
+        if value is not None:
+            params[name] = value
+    return params
+
+
+def plan_nodes(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+def table_model(table):
+    table = PARTITION_SUFFIX.sub("", table)
+    for model in apps.get_models():
+        if model._meta.db_table == table:
+            return model
+    return None
+
+
+def problems(plan, min_rows):
+    """
+    Sequential scans and sorts touching at least ``min_rows`` rows, as
+    ``(kind, model or None, rows)``.
+    """
+    found = []
+    for node in plan_nodes(plan):
+        loops = node.get("Actual Loops", 1)
+        if node["Node Type"] == "Seq Scan":
+            rows = (
+                node.get("Actual Rows", 0) + node.get("Rows Removed by Filter", 0)
+            ) * loops
+            if rows >= min_rows:
+                found.append(("seq scan", table_model(node["Relation Name"]), rows))
+        elif node["Node Type"] in ("Sort", "Incremental Sort"):
+            rows = max(
+                (child.get("Actual Rows", 0) * loops for child in node["Plans"]),
+                default=0,
+            )
+            if rows >= min_rows:
+                found.append(("sort", None, rows))
+    return found
+
+
+def propose(model, filter_path, lookup, ordering, scope, kinds):
+    """
+    Indexes that would serve the flagged query, as ``(model, Index)``.
+
+    Equality columns go first (the store scope, exact filters), then one
+    range or sort column, which is all a b-tree can use: a range filter is
+    preferred over the ordering. Text searches get a trigram GIN index and
+    case-insensitive matches an UPPER() index.
+    """
+    leading = [scope] if scope else []
+    related, column = resolve(model, filter_path) if filter_path else (model, None)
+
+    if column is not None and lookup == "icontains":
+        name = f"{related._meta.db_table[:12]}_{column.name[:8]}_trgm"
+        index = GinIndex(fields=[column.name], opclasses=["gin_trgm_ops"], name=name)
+        return [(related, index)]
+    if column is not None and lookup == "iexact":
+        name = f"{related._meta.db_table[:12]}_{column.name[:8]}_upper"
+        return [(related, models.Index(Upper(column.name), name=name))]
+
+    columns = list(leading)
+    if column is not None and related is model:
+        if lookup in RANGE_LOOKUPS:
+            columns.append(column.name)
+            ordering = None
+        elif lookup in EQUALITY_LOOKUPS:
+            columns.append(column.name)
+    if ordering and "sort" in kinds:
+        columns.append(ordering)
+    columns = list(dict.fromkeys(columns))
+    if not columns or columns == leading and "seq scan" not in kinds:
+        return []
+    return [(model, models.Index(fields=columns))]
+
+
+def explain(queryset):
+    """
+    ``(plan, execution ms)`` of ``EXPLAIN (ANALYZE, BUFFERS)``.
+    """
+    output = json.loads(queryset.explain(format="json", analyze=True, buffers=True))
+    return output[0]["Plan"], output[0]["Execution Time"]
+
+
+_existing = {}
+
+
+def existing_indexes(model):
+    """
+    ``[(index type, [columns])]`` of ``model``'s table (its parent for
+    partitioned tables), read once per run.
+    """
+    if model in _existing:
+        return _existing[model]
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(
+            cursor, model._meta.db_table
+        )
+    _existing[model] = [
+        (info.get("type") or "btree", info["columns"])
+        for info in constraints.values()
+        if info["index"] or info["unique"] or info["primary_key"]
+    ]
+    return _existing[model]
+
+
+def is_covered(model, index):
+    """
+    Whether an existing index already starts with the proposed columns.
+    """
+    if index.expressions:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT indexdef FROM pg_indexes WHERE tablename = %s",
+                [model._meta.db_table],
+            )
+            definitions = [row[0].lower() for row in cursor.fetchall()]
+        column = index.expressions[0].source_expressions[0].name
+        return any(f"upper(({column})" in definition for definition in definitions)
+    columns = [model._meta.get_field(name.lstrip("-")).column for name in index.fields]
+    kind = "gin" if isinstance(index, GinIndex) else "btree"
+    return any(
+        existing_kind == kind and existing[: len(columns)] == columns
+        for existing_kind, existing in existing_indexes(model)
+    )
+
+
+def combinations(model, filterset_class, orderings, scope, store_id):
+    """
+    ``(params, ordering, scoped)`` for no filter and each declared filter,
+    each unordered and with each ordering, unscoped and scoped to a store.
+    """
+    samples = filter_params(model.objects.all(), filterset_class)
+    scopes = [False, True] if scope and store_id is not None else [False]
+    for name in [None, *samples]:
+        for ordering in [None, *orderings]:
+            for scoped in scopes:
+                params = {name: samples[name]} if name else {}
+                yield params, ordering, scoped
+
+
+def advise(min_rows=10000, targets=None):
+    """
+    EXPLAIN every filter/ordering combination of the TARGETS and return a
+    Finding per combination.
+    """
+    findings = []
+    _existing.clear()
+    for name, model, filterset_class, orderings, scope in TARGETS:
+        if targets and name not in targets:
+            continue
+        store_id = (
+            model.objects.values_list(f"{scope}_id", flat=True).first()
+            if scope
+            else None
+        )
+        for params, ordering, scoped in combinations(
+            model, filterset_class, orderings, scope, store_id
+        ):
+            queryset = model.objects.all()
+            if scoped:
+                queryset = queryset.filter(**{f"{scope}_id": store_id})
+            filterset = filterset_class(params, queryset=queryset)
+            if not filterset.is_valid():
+                continue
+            queryset = filterset.qs.prefetch_related(None)
+            if ordering:
+                queryset = queryset.order_by(ordering)
+            plan, milliseconds = explain(queryset[:PAGE_SIZE])
+            report = Finding(
+                name,
+                {**params, **({"ordering": ordering} if ordering else {})},
+                scoped,
+                milliseconds,
+            )
+            flagged = problems(plan, min_rows)
+            report.problems = [
+                f"{kind} over {rows:,} rows"
+                + (f" of {flagged_model._meta.db_table}" if flagged_model else "")
+                for kind, flagged_model, rows in flagged
+            ]
+            if flagged:
+                filter_name = next(iter(params), None)
+                declared = filterset_class.base_filters.get(filter_name)
+                for proposed_model, index in propose(
+                    model,
+                    declared.field_name if declared else None,
+                    declared.lookup_expr if declared else None,
+                    ordering,
+                    scope if scoped else None,
+                    {kind for kind, _, _ in flagged},
+                ):
+                    if not index.name:
+                        index.set_name_with_model(proposed_model)
+                    if not is_covered(proposed_model, index):
+                        report.proposals.append((proposed_model, index))
+            findings.append(report)
+    return findings
+
+
+def unique_proposals(findings):
+    """
+    Distinct proposals, leaving out b-tree indexes that are a prefix of
+    another proposed one.
+    """
+    proposals = {}
+    for finding in findings:
+        for model, index in finding.proposals:
+            proposals.setdefault((model, index.name), (model, index))
+
+    def is_prefix(model, index):
+        return any(
+            other is not index
+            and other_model is model
+            and type(other) is type(index)
+            and not index.expressions
+            and len(other.fields) > len(index.fields)
+            and other.fields[: len(index.fields)] == index.fields
+            for other_model, other in proposals.values()
+        )
+
+    return [
+        (model, index)
+        for model, index in proposals.values()
+        if not is_prefix(model, index)
+    ]
+
+
+def migration_stub(proposals):
+    """
+    Source of a migration adding ``proposals``, to be reviewed and saved
+    under api/migrations/.
+    """
+    operations, imports = [], {"from django.db import migrations, models"}
+    for model, index in proposals:
+        text, operation_imports = OperationWriter(
+            AddIndex(model_name=model._meta.model_name, index=index), indentation=2
+        ).serialize()
+        operations.append(text)
+        imports |= operation_imports
+    if any(isinstance(index, GinIndex) for _, index in proposals):
+        imports.add("from django.contrib.postgres.operations import TrigramExtension")
+        operations.insert(0, "        TrigramExtension(),")
+
+    leaf = MigrationLoader(None, ignore_no_migrations=True).graph.leaf_nodes("api")
+    return "\n".join(
+        [
+            "# Proposed by `advise_indexes`; review before applying. Indexes on",
+            "# the partitioned sales tables are created on every partition.",
+            "",
+            *sorted(imports),
+            "",
+            "",
+            "class Migration(migrations.Migration):",
+            "",
+            "    dependencies = [",
+            *[f"        {node!r}," for node in leaf],
+            "    ]",
+            "",
+            "    operations = [",
+            *operations,
+            "    ]",
+            "",
+        ]
+    )
+
+
+def seed(sales, stores=20, products=500, items_per_sale=3, days=365):
+    """
+    Insert a synthetic dataset of ``sales`` sales spread over the last
+    ``days`` days, with stores, products and inventory, then ANALYZE. Run it
+    inside a transaction that is rolled back afterwards. Returns the new
+    stores.
+    """
+    rng = random.Random(0)
+    tag = f"advisor-{rng.getrandbits(32):08x}"
+    addresses = Address.objects.bulk_create(
+        Address(country="Seed", city=tag, area=str(number)) for number in range(stores)
+    )
+    admins = StoreAdmin.objects.bulk_create(
+        StoreAdmin(username=f"{tag}-{number}", password="!") for number in range(stores)
+    )
+    store_rows = Store.objects.bulk_create(
+        Store(name=f"{tag} store {number}", admin=admin, address=address)
+        for number, (admin, address) in enumerate(zip(admins, addresses))
+    )
+    supplier = Supplier.objects.create(name=f"{tag} supplier", contact_no="0")
+    product_rows = Product.objects.bulk_create(
+        Product(
+            product_name=f"{tag} product {number:05d}",
+            cost_price=Decimal(rng.randint(100, 5000)) / 100,
+            sale_price=Decimal(rng.randint(5000, 9000)) / 100,
+            discount=Decimal(rng.randint(0, 2000)) / 100,
+        )
+        for number in range(products)
+    )
+    Inventory.objects.bulk_create(
+        Inventory(
+            store=store,
+            product=product,
+            supplier=supplier,
+            quantity=rng.randint(0, 500),
+            reorder_level=rng.randint(5, 50),
+        )
+        for store in store_rows
+        for product in rng.sample(product_rows, min(200, len(product_rows)))
+    )
+    for offset in range(0, sales, 5000):
+        batch = Sales.objects.bulk_create(
+            Sales(
+                store=rng.choice(store_rows),
+                total_quantity=rng.randint(1, 20),
+                total_price=Decimal(rng.randint(100, 100000)) / 100,
+                total_tax=Decimal("10.00"),
+            )
+            for _ in range(min(5000, sales - offset))
+        )
+        SalesItems.objects.bulk_create(
+            SalesItems(
+                sales=sale,
+                product=product,
+                quantity=rng.randint(1, 5),
+                unit_price=product.sale_price,
+                discount=product.discount,
+            )
+            for sale in batch
+            for product in rng.sample(product_rows, items_per_sale)
+        )
+    with connection.cursor() as cursor:
+        # Spread the new rows over the date range (rows move partitions)
+        cursor.execute(
+            "UPDATE api_sales SET created_at = now() - random() * %s "
+            "WHERE store_id = ANY(%s)",
+            [datetime.timedelta(days=days), [store.id for store in store_rows]],
+        )
+        # Without fresh statistics the join is planned as a nested loop
+        cursor.execute("ANALYZE api_sales, api_salesitems")
+        cursor.execute(
+            "UPDATE api_salesitems i SET created_at = s.created_at FROM api_sales s "
+            "WHERE s.id = i.sales_id AND s.store_id = ANY(%s)",
+            [[store.id for store in store_rows]],
+        )
+        cursor.execute("ANALYZE")
+    return store_rows
+
+
+def busiest_store():
+    row = (
+        Sales.objects.values("store_id")
+        .annotate(sales=Count("id"))
+        .order_by("-sales")
+        .first()
+    )
+    return row and row["store_id"]
+
+
+def _stocked_product_name(store_id):
+    return (
+        Inventory.objects.filter(store_id=store_id)
+        .values_list("product__product_name", flat=True)
+        .first()
+        or ""
+    )
+
+
+# (label, store id -> queryset): the store-scoped queries behind the sales and
+# inventory listings and the dashboard
+HOT_QUERIES = [
+    (
+        "sales, newest first",
+        lambda store_id: Sales.objects.filter(store_id=store_id).order_by(
+            "-created_at", "-pk"
+        )[:PAGE_SIZE],
+    ),
+    (
+        "sales totals, last 30 days",
+        lambda store_id: Sales.objects.filter(
+            store_id=store_id,
+            created_at__gte=timezone.now() - datetime.timedelta(days=30),
+        )
+        .values("store_id")
+        .annotate(revenue=Sum("total_price"), items=Sum("total_quantity")),
+    ),
+    (
+        "inventory by product name",
+        lambda store_id: Inventory.objects.filter(
+            store_id=store_id,
+            product__product_name__icontains=_stocked_product_name(store_id),
+        )[:PAGE_SIZE],
+    ),
+    (
+        "low stock count",
+        lambda store_id: Inventory.objects.filter(
+            store_id=store_id, quantity__lte=F("reorder_level")
+        )
+        .values("store_id")
+        .annotate(count=Count("id")),
+    ),
+]
+
+
+def parent_indexes():
+    """
+    ``{partition index: partitioned index}``, to report scans under the
+    index declared on the model.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT i.inhrelid::regclass::text, i.inhparent::regclass::text "
+            "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE c.relkind = 'i'"
+        )
+        return dict(cursor.fetchall())
+
+
+def scans(plan, parents):
+    """
+    The distinct scans and sorts of ``plan``, e.g.
+    ``"Index Only Scan using api_sales_store_recent"``.
+    """
+    found = []
+    for node in plan_nodes(plan):
+        kind = node["Node Type"]
+        if kind.endswith("Scan") and "Relation Name" in node:
+            if "Index Name" in node:
+                index = node["Index Name"]
+                found.append(f"{kind} using {parents.get(index, index)}")
+            else:
+                table = PARTITION_SUFFIX.sub("", node["Relation Name"])
+                found.append(f"{kind} on {table}")
+        elif kind in ("Sort", "Incremental Sort"):
+            found.append(kind)
+    return list(dict.fromkeys(found))
+
+
+def benchmark(store_id, repeat=5):
+    """
+    ``[(label, best execution ms, scans)]`` of the ``HOT_QUERIES`` for
+    ``store_id``.
+    """
+    parents = parent_indexes()
+    results = []
+    for label, build in HOT_QUERIES:
+        best = None
+        for _ in range(repeat):
+            plan, milliseconds = explain(build(store_id))
+            if best is None or milliseconds < best[0]:
+                best = (milliseconds, plan)
+        results.append((label, best[0], scans(best[1], parents)))
+    return results
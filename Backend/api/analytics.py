@@ -0,0 +1,316 @@
+import datetime
+import json
+import os
+import shutil
+import threading
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from .archive import iter_archived_sales
+from .models import Product, SalesItems
+
+MANIFEST_FILE = "manifest.json"
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+# Column name -> dtype of the on-disk columnar store. Money is kept as integer
+# cents and discounts as basis points, so every aggregate is exact.
+COLUMNS = {
+    "item_id": np.int64,
+    "sales_id": np.int64,
+    "store_id": np.int64,
+    "product_id": np.int64,
+    "created_at": np.int64,  # microseconds since the epoch (UTC)
+    "month": np.int32,  # year * 12 + month - 1
+    "quantity": np.int64,
+    "unit_price": np.int64,  # cents
+    "discount": np.int64,  # basis points (percent * 100)
+    "cost_price": np.int64,  # cents, Product.cost_price at extraction time
+}
+
+GROUP_COLUMNS = {"product": "product_id", "store": "store_id", "month": "month"}
+CENT = Decimal("0.01")
+
+
+def store_dir():
+    return os.fspath(settings.ANALYTICS_STORE["DIR"])
+
+
+def to_micros(value):
+    return (value - EPOCH) // datetime.timedelta(microseconds=1)
+
+
+def month_index(value):
+    value = value.astimezone(datetime.timezone.utc)
+    return value.year * 12 + value.month - 1
+
+
+def cents(value):
+    return int(value * 100)
+
+
+def _load_manifest():
+    try:
+        with open(os.path.join(store_dir(), MANIFEST_FILE)) as manifest:
+            return json.load(manifest)
+    except FileNotFoundError:
+        return {"watermark": None, "segments": [], "rows": 0}
+
+
+def _save_manifest(manifest):
+    path = os.path.join(store_dir(), MANIFEST_FILE)
+    with open(f"{path}.tmp", "w") as out:
+        json.dump(manifest, out, indent=2)
+        out.flush()
+        os.fsync(out.fileno())
+    os.replace(f"{path}.tmp", path)
+
+
+def _write_segment(columns):
+    name = f"seg-{timezone.now():%Y%m%d%H%M%S%f}"
+    path = os.path.join(store_dir(), name)
+    os.makedirs(path)
+    for column, dtype in COLUMNS.items():
+        np.save(os.path.join(path, f"{column}.npy"), np.asarray(columns[column], dtype))
+    return name
+
+
+def _extract_rows(watermark, upto):
+    """
+    ``(column -> list)`` of the sales items created in ``(watermark, upto]``,
+    from the live tables and the cold archive.
+    """
+    columns = {column: [] for column in COLUMNS}
+
+    def add(
+        item_id,
+        sales_id,
+        store_id,
+        product_id,
+        created_at,
+        quantity,
+        price,
+        discount,
+        cost,
+    ):
+        columns["item_id"].append(item_id)
+        columns["sales_id"].append(sales_id)
+        columns["store_id"].append(store_id)
+        columns["product_id"].append(product_id)
+        columns["created_at"].append(to_micros(created_at))
+        columns["month"].append(month_index(created_at))
+        columns["quantity"].append(quantity)
+        columns["unit_price"].append(cents(price))
+        columns["discount"].append(cents(discount))
+        columns["cost_price"].append(cents(cost))
+
+    items = SalesItems.objects.filter(created_at__lte=upto)
+    if watermark is not None:
+        items = items.filter(created_at__gt=watermark)
+    rows = items.order_by().values_list(
+        "id",
+        "sales_id",
+        "sales__store_id",
+        "product_id",
+        "created_at",
+        "quantity",
+        "unit_price",
+        "discount",
+        "product__cost_price",
+    )
+    for row in rows.iterator(chunk_size=10000):
+        add(*row)
+
+    costs = dict(Product.objects.values_list("id", "cost_price"))
+    for sale in iter_archived_sales(start=watermark):
+        for item in sale._prefetched_objects_cache["sales_item"]:
+            if watermark is not None and item.created_at <= watermark:
+                continue
+            if item.created_at > upto or item.product_id not in costs:
+                continue
+            add(
+                item.id,
+                sale.id,
+                sale.store_id,
+                item.product_id,
+                item.created_at,
+                item.quantity,
+                item.unit_price,
+                item.discount,
+                costs[item.product_id],
+            )
+    return columns
+
+
+def refresh(rebuild=False):
+    """
+    Append the sales items created since the last watermark as a new segment.
+
+    Items younger than ``ANALYTICS_STORE["SETTLE_SECONDS"]`` are left for the
+    next run so rows from transactions still in flight aren't skipped past.
+    Updates and deletes of already extracted rows are only picked up by a
+    ``rebuild``. Returns the number of rows added.
+    """
+    if rebuild and os.path.isdir(store_dir()):
+        shutil.rmtree(store_dir())
+    os.makedirs(store_dir(), exist_ok=True)
+    manifest = _load_manifest()
+    watermark = manifest["watermark"] and datetime.datetime.fromisoformat(
+        manifest["watermark"]
+    )
+    upto = timezone.now() - datetime.timedelta(
+        seconds=settings.ANALYTICS_STORE["SETTLE_SECONDS"]
+    )
+    if watermark is not None and upto <= watermark:
+        return 0
+
+    columns = _extract_rows(watermark, upto)
+    count = len(columns["item_id"])
+    if count:
+        manifest["segments"].append(_write_segment(columns))
+        manifest["rows"] += count
+    # Everything up to ``upto`` is extracted, even when nothing was found
+    manifest["watermark"] = upto.isoformat()
+    _save_manifest(manifest)
+    return count
+
+
+def compact():
+    """
+    Merge all segments into one.
+    """
+    manifest = _load_manifest()
+    if len(manifest["segments"]) < 2:
+        return
+    columns = load_columns()
+    old = manifest["segments"]
+    manifest["segments"] = [_write_segment(columns)]
+    _save_manifest(manifest)
+    for name in old:
+        shutil.rmtree(os.path.join(store_dir(), name), ignore_errors=True)
+
+
+_lock = threading.Lock()
+_loaded = {}
+
+
+def load_columns():
+    """
+    Every column of the store, memory-mapped and concatenated across segments.
+    Cached per process until the manifest changes.
+    """
+    path = os.path.join(store_dir(), MANIFEST_FILE)
+    try:
+        key = (path, os.stat(path).st_mtime_ns)
+    except FileNotFoundError:
+        return {column: np.empty(0, dtype) for column, dtype in COLUMNS.items()}
+    with _lock:
+        if _loaded.get("key") != key:
+            manifest = _load_manifest()
+            segments = [
+                {
+                    column: np.load(
+                        os.path.join(store_dir(), name, f"{column}.npy"), mmap_mode="r"
+                    )
+                    for column in COLUMNS
+                }
+                for name in manifest["segments"]
+            ]
+            if len(segments) == 1:
+                columns = segments[0]
+            else:
+                columns = {
+                    column: np.concatenate(
+                        [segment[column] for segment in segments]
+                        or [np.empty(0, dtype)]
+                    )
+                    for column, dtype in COLUMNS.items()
+                }
+            _loaded.update(key=key, columns=columns, manifest=manifest)
+        return _loaded["columns"]
+
+
+def refreshed_until():
+    """
+    Watermark of the last refresh: every item created up to it is extracted.
+    """
+    load_columns()
+    return _loaded.get("manifest", {}).get("watermark")
+
+
+def _group_sums(keys, values):
+    """
+    Exact int64 sums of ``values`` per distinct combination of ``keys``.
+    """
+    order = np.lexsort(keys[::-1])
+    keys = [key[order] for key in keys]
+    boundary = np.zeros(len(order), dtype=bool)
+    boundary[:1] = True
+    for key in keys:
+        boundary[1:] |= key[1:] != key[:-1]
+    starts = np.flatnonzero(boundary)
+    sums = {
+        name: np.add.reduceat(value[order], starts) for name, value in values.items()
+    }
+    return [key[starts] for key in keys], sums
+
+
+def aggregate(group_by=(), start=None, end=None, store_id=None):
+    """
+    Revenue, cost, margin, discount and quantity totals of the extracted sales
+    items in ``[start, end)``, grouped by any of ``product``, ``store`` and
+    ``month``. Money is returned as Decimal rounded to cents.
+    """
+    columns = load_columns()
+    mask = np.ones(len(columns["item_id"]), dtype=bool)
+    if start is not None:
+        mask &= columns["created_at"] >= to_micros(start)
+    if end is not None:
+        mask &= columns["created_at"] < to_micros(end)
+    if store_id is not None:
+        mask &= columns["store_id"] == store_id
+
+    quantity = columns["quantity"][mask]
+    gross = quantity * columns["unit_price"][mask]
+    # cents * basis points; divided by 10000 only once the groups are summed
+    discount = gross * columns["discount"][mask]
+    cost = quantity * columns["cost_price"][mask]
+    values = {
+        "quantity": quantity,
+        "gross": gross,
+        "discount": discount,
+        "cost": cost,
+    }
+
+    if not group_by:
+        keys, sums = [], {
+            name: np.array([value.sum()]) for name, value in values.items()
+        }
+    elif not len(quantity):
+        return []
+    else:
+        keys, sums = _group_sums(
+            [columns[GROUP_COLUMNS[name]][mask] for name in group_by], values
+        )
+
+    results = []
+    for index in range(len(sums["quantity"])):
+        gross_total = Decimal(int(sums["gross"][index]))
+        discount_total = Decimal(int(sums["discount"][index])) / 10000
+        revenue = gross_total - discount_total
+        cost_total = Decimal(int(sums["cost"][index]))
+        row = {name: int(key[index]) for name, key in zip(group_by, keys)}
+        if "month" in row:
+            year, month = divmod(row["month"], 12)
+            row["month"] = f"{year:04d}-{month + 1:02d}"
+        row.update(
+            quantity=int(sums["quantity"][index]),
+            revenue=(revenue / 100).quantize(CENT),
+            cost=(cost_total / 100).quantize(CENT),
+            margin=((revenue - cost_total) / 100).quantize(CENT),
+            discount=(discount_total / 100).quantize(CENT),
+        )
+        results.append(row)
+    return results
@@ -0,0 +1,459 @@
+import datetime
+import decimal
+import gzip
+import io
+import json
+import heapq
+import os
+from collections.abc import Sequence
+from functools import cmp_to_key
+from itertools import groupby, islice
+from operator import attrgetter, itemgetter
+
+from django.conf import settings
+from django.db import transaction
+from django.http import Http404
+from django.utils.functional import cached_property
+from rest_framework.filters import OrderingFilter
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+
+from .cache import store_id_for_user
+from .models import Product, Sales, SalesItems, Store
+from .partitions import add_months, month_start
+
+INDEX_FILE = "index.json"
+FILE_NAME = "sales-{month:%Y-%m}.ndjson.gz"
+
+
+def archive_dir():
+    return os.fspath(settings.SALES_ARCHIVE["DIR"])
+
+
+def _encode(value):
+    # Unlike DjangoJSONEncoder, keep microseconds so values round-trip exactly
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    raise TypeError(f"Can't archive {type(value).__name__}")
+
+
+def _write_atomic(path, write):
+    """
+    Call ``write`` with a binary file and move it to ``path`` once synced.
+    """
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as out:
+        write(out)
+        out.flush()
+        os.fsync(out.fileno())
+    os.replace(tmp, path)
+
+
+_index = {}
+
+
+def load_index():
+    """
+    ``{"YYYY-MM": {"file", "sales", "items", "min_id", "max_id"}}`` of every
+    archived month. Re-read only when the file changes.
+    """
+    path = os.path.join(archive_dir(), INDEX_FILE)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return {}
+    if _index.get("key") != (path, mtime):
+        with open(path) as index:
+            _index.update(key=(path, mtime), data=json.load(index))
+    return dict(_index["data"])
+
+
+def save_index(index):
+    def write(out):
+        out.write(json.dumps(index, indent=2, sort_keys=True).encode())
+
+    _write_atomic(os.path.join(archive_dir(), INDEX_FILE), write)
+
+
+def archived_months(index=None):
+    """
+    Start of every archived month, oldest first.
+    """
+    index = load_index() if index is None else index
+    return [
+        month_start(datetime.datetime.strptime(key, "%Y-%m")) for key in sorted(index)
+    ]
+
+
+def _delete_batches(sales, ids, start, batch_size):
+    for offset in range(0, len(ids), batch_size):
+        batch = ids[offset : offset + batch_size]
+        with transaction.atomic():
+            SalesItems.objects.filter(
+                sales_id__in=batch, created_at__gte=start
+            ).delete()
+            sales.filter(id__in=batch).delete()
+
+
+def archive_month(month, batch_size=1000):
+    """
+    Move the sales created in ``month`` (and their items) from the database
+    into ``sales-YYYY-MM.ndjson.gz``, one sale with its items per line.
+
+    The file is written and fsynced before anything is deleted; rows are then
+    deleted in batches of ``batch_size`` sales, each in its own short
+    transaction, so no lock is held for the whole month. The month stays
+    marked ``deleting`` in the index until the last batch is gone, and running
+    it again finishes an interrupted delete.
+
+    Each store's sales are a gzip member of their own, so the file is still
+    one gzip stream but a store's sales can be read without the others'. The
+    index records each member's byte range.
+    """
+    start, end = month, add_months(month, 1)
+    sale_fields = [field.attname for field in Sales._meta.concrete_fields]
+    item_fields = [field.attname for field in SalesItems._meta.concrete_fields]
+    sales = Sales.objects.filter(created_at__gte=start, created_at__lt=end)
+    index = load_index()
+    key = f"{month:%Y-%m}"
+    if index.get(key, {}).get("deleting"):
+        ids = list(sales.order_by("id").values_list("id", flat=True))
+        archived = {row["id"] for row in _rows(month, index[key])}
+        if not archived.issuperset(ids):
+            raise ValueError(f"{key} has sales that are not in its archive.")
+        _delete_batches(sales, ids, start, batch_size)
+        del index[key]["deleting"]
+        save_index(index)
+        return index[key]
+
+    rows = list(sales.order_by("store_id", "id").values_list("store_id", "id"))
+    if not rows:
+        return None
+    if key in index:
+        raise ValueError(f"{key} is already archived.")
+    path = os.path.join(archive_dir(), FILE_NAME.format(month=month))
+    stats = {"sales": 0, "items": 0}
+    members = {}
+
+    def write_sales(out, ids):
+        for offset in range(0, len(ids), batch_size):
+            batch = ids[offset : offset + batch_size]
+            items = {}
+            for item in (
+                SalesItems.objects.filter(sales_id__in=batch, created_at__gte=start)
+                .order_by("id")
+                .values(*item_fields)
+            ):
+                items.setdefault(item["sales_id"], []).append(item)
+                stats["items"] += 1
+            for sale in sales.filter(id__in=batch).order_by("id").values(*sale_fields):
+                sale["sales_item"] = items.get(sale["id"], [])
+                out.write(json.dumps(sale, default=_encode, separators=(",", ":")))
+                out.write("\n")
+                stats["sales"] += 1
+
+    def write(raw):
+        for store_id, group in groupby(rows, key=itemgetter(0)):
+            ids = [pk for _, pk in group]
+            offset = raw.tell()
+            with gzip.open(raw, "wt", encoding="utf-8") as out:
+                write_sales(out, ids)
+            members[str(store_id)] = [offset, raw.tell() - offset, len(ids)]
+
+    os.makedirs(archive_dir(), exist_ok=True)
+    _write_atomic(path, write)
+    ids = sorted(pk for _, pk in rows)
+    index[key] = {
+        "file": os.path.basename(path),
+        "min_id": ids[0],
+        "max_id": ids[-1],
+        "stores": members,
+        "deleting": True,
+        **stats,
+    }
+    save_index(index)
+
+    _delete_batches(sales, ids, start, batch_size)
+    del index[key]["deleting"]
+    save_index(index)
+    return index[key]
+
+
+def _from_row(model, row):
+    instance = model(
+        **{
+            # Months archived before a column was added get its default
+            field.attname: (
+                field.to_python(row[field.attname])
+                if field.attname in row
+                else field.get_default()
+            )
+            for field in model._meta.concrete_fields
+        }
+    )
+    instance._state.adding = False
+    return instance
+
+
+def _lines(path, entry, store_id):
+    members = entry.get("stores")
+    if store_id is None or members is None:
+        with gzip.open(path, "rt", encoding="utf-8") as archive:
+            yield from archive
+        return
+    if str(store_id) not in members:
+        return
+    offset, length, _ = members[str(store_id)]
+    with open(path, "rb") as raw:
+        raw.seek(offset)
+        member = io.BytesIO(raw.read(length))
+    with gzip.open(member, "rt", encoding="utf-8") as archive:
+        yield from archive
+
+
+def _rows(month, entry, store_id=None):
+    """
+    Parsed lines of an archived month, read and decompressed as they are
+    consumed: only the store's member when ``store_id`` is given.
+    """
+    path = os.path.join(archive_dir(), entry["file"])
+    for line in _lines(path, entry, store_id):
+        row = json.loads(line)
+        # Months archived before per-store members hold every store's sales
+        if store_id is None or row["store_id"] == store_id:
+            yield row
+
+
+def read_month(month, store_id=None):
+    """
+    Archived sales of ``month``, of one store when ``store_id`` is given, as
+    unsaved Sales instances with their items attached as if prefetched. Rows
+    are parsed as the caller consumes them.
+    """
+    entry = load_index().get(f"{month:%Y-%m}")
+    if entry is None:
+        return
+    live = set()
+    if entry.get("deleting"):
+        # Until an interrupted archive_month finishes, the rows it didn't
+        # delete yet are served by the live tables
+        live = set(
+            Sales.objects.filter(
+                created_at__gte=month, created_at__lt=add_months(month, 1)
+            ).values_list("id", flat=True)
+        )
+    for row in _rows(month, entry, store_id):
+        if row["id"] in live:
+            continue
+        sale = _from_row(Sales, row)
+        sale._prefetched_objects_cache = {
+            "sales_item": [_from_row(SalesItems, item) for item in row["sales_item"]]
+        }
+        yield sale
+
+
+def attach_related(sales):
+    """
+    Attach the (live) stores and products the archived rows point at with one
+    query each.
+    """
+    items = [
+        item for sale in sales for item in sale._prefetched_objects_cache["sales_item"]
+    ]
+    products = Product.objects.in_bulk({item.product_id for item in items})
+    stores = Store.objects.in_bulk({sale.store_id for sale in sales})
+    for item in items:
+        item.product = products.get(item.product_id)
+    for sale in sales:
+        if sale.store_id in stores:
+            sale.store = stores[sale.store_id]
+    return sales
+
+
+def iter_archived_sales(start=None, end=None, store_id=None):
+    """
+    Archived sales created in ``[start, end)``, oldest month first.
+    """
+    for month in archived_months():
+        if (end is not None and month >= end) or (
+            start is not None and add_months(month, 1) <= start
+        ):
+            continue
+        for sale in read_month(month, store_id):
+            if start is not None and sale.created_at < start:
+                continue
+            if end is not None and sale.created_at >= end:
+                continue
+            yield sale
+
+
+def find_archived_sale(pk, store_id=None):
+    """
+    Look up one archived sale by id, of one store when ``store_id`` is given,
+    reading only the months whose id range covers it.
+    """
+    for key, entry in sorted(load_index().items()):
+        if entry["min_id"] <= pk <= entry["max_id"]:
+            month = month_start(datetime.datetime.strptime(key, "%Y-%m"))
+            for sale in read_month(month, store_id):
+                if sale.pk == pk:
+                    return sale
+    return None
+
+
+def _count(results):
+    return len(results) if isinstance(results, list) else results.count()
+
+
+class ChainedResults(Sequence):
+    """
+    Two result sets (lists or querysets) back to back. The paginator can slice
+    it without evaluating more of either than the requested page.
+    """
+
+    def __init__(self, first, second):
+        self.first = first
+        self.second = second
+
+    @cached_property
+    def split(self):
+        return _count(self.first)
+
+    @cached_property
+    def total(self):
+        return self.split + _count(self.second)
+
+    def __len__(self):
+        return self.total
+
+    def count(self):
+        return self.total
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index : index + 1][0]
+        start, stop, _ = index.indices(self.total)
+        page = list(self.first[start:stop]) if start < self.split else []
+        if stop > self.split:
+            page += list(self.second[max(start - self.split, 0) : stop - self.split])
+        return page
+
+
+def ordering_key(ordering):
+    """
+    Sort key ordering instances like ``queryset.order_by(*ordering)``.
+    """
+
+    def compare(a, b):
+        for field in ordering:
+            get = attrgetter(field.lstrip("-"))
+            x, y = get(a), get(b)
+            if x != y:
+                result = -1 if x < y else 1
+                return -result if field.startswith("-") else result
+        return 0
+
+    return cmp_to_key(compare)
+
+
+class MergedResults(ChainedResults):
+    """
+    Two result sets, each sorted by ``key``, merged in that order. A slice
+    reads each only up to its end, so a queryset stays paginated in SQL.
+    """
+
+    def __init__(self, first, second, key):
+        super().__init__(first, second)
+        self.key = key
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index : index + 1][0]
+        start, stop, _ = index.indices(self.total)
+        merged = heapq.merge(self.first[:stop], self.second[:stop], key=self.key)
+        return list(islice(merged, start, stop))
+
+
+class ArchiveReadMixin:
+    """
+    Read sales moved to the cold archive (``archive_sales``) transparently.
+
+    Listings whose ``created_at`` filters reach back into archived months get
+    the matching archived sales, filtered in Python by
+    ``SalesFilter.filter_archived``, chained with the live queryset. Ordering by
+    ``created_at`` chains the two; other orderings merge a page's worth of
+    each, so the live part stays paginated in SQL either way. Detail lookups of
+    archived ids fall back to the archive for safe methods.
+    """
+
+    def get_archived_sales(self):
+        months = archived_months()
+        if not months:
+            return None
+        filterset = self.filterset_class(
+            self.request.query_params,
+            queryset=self.get_queryset(),
+            request=self.request,
+        )
+        if not filterset.is_valid():
+            return None
+        start, end = filterset.created_at_bounds()
+        if start is None or start >= add_months(months[-1], 1):
+            return None
+
+        store_id = None
+        if not self.request.user.is_superuser:
+            store_id = store_id_for_user(self.request.user)
+            if store_id is None:
+                # An admin without a store sees no sales, not every store's
+                return []
+        sales = list(iter_archived_sales(start, end, store_id))
+        return filterset.filter_archived(attach_related(sales))
+
+    def list(self, request, *args, **kwargs):
+        archived = self.get_archived_sales()
+        if archived is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        ordering = OrderingFilter().get_ordering(request, queryset, self) or []
+        field = ordering[0] if ordering else "created_at"
+        if field == "created_at":
+            archived.sort(key=attrgetter("created_at", "pk"))
+            results = ChainedResults(archived, queryset.order_by("created_at", "pk"))
+        elif field == "-created_at":
+            archived.sort(key=attrgetter("created_at", "pk"), reverse=True)
+            results = ChainedResults(queryset.order_by("-created_at", "-pk"), archived)
+        else:
+            ordering = [*ordering, "pk"]
+            key = ordering_key(ordering)
+            archived.sort(key=key)
+            results = MergedResults(archived, queryset.order_by(*ordering), key)
+
+        page = self.paginate_queryset(results)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        return Response(self.get_serializer(results, many=True).data)
+
+    def get_object(self):
+        try:
+            return super().get_object()
+        except Http404:
+            if self.request.method not in SAFE_METHODS:
+                raise
+            lookup = str(self.kwargs[self.lookup_url_kwarg or self.lookup_field])
+            store_id = None
+            if not self.request.user.is_superuser:
+                store_id = store_id_for_user(self.request.user)
+                if store_id is None:
+                    raise
+            sale = (
+                find_archived_sale(int(lookup), store_id) if lookup.isdigit() else None
+            )
+            if sale is None:
+                raise
+            self.check_object_permissions(self.request, sale)
+            return attach_related([sale])[0]
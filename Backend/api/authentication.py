@@ -0,0 +1,118 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils.functional import cached_property
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.serializers import (
+    TokenObtainPairSerializer,
+    TokenRefreshSerializer,
+)
+from rest_framework_simplejwt.settings import api_settings
+
+from .cache import store_id_for_user
+
+STORE_ID_CLAIM = "store_id"
+DENYLIST_KEY = "jwt:denylist:{jti}"
+REVOKED_BEFORE_KEY = "jwt:revoked_before:{user_id}"
+
+
+class StoreTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """
+    Embeds the claims StoreJWTAuthentication needs to skip the user lookup.
+    """
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token["username"] = user.username
+        token["is_superuser"] = user.is_superuser
+        token[STORE_ID_CLAIM] = store_id_for_user(user)
+        return token
+
+
+class StoreTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Refuses to refresh tokens that were revoked.
+    """
+
+    def validate(self, attrs):
+        if is_revoked(self.token_class(attrs["refresh"])):
+            raise InvalidToken("Token has been revoked.")
+        return super().validate(attrs)
+
+
+class StoreTokenUser(TokenUser):
+    """
+    Lightweight user built from verified token claims.
+    """
+
+    @property
+    def store_id(self):
+        return self.token.get(STORE_ID_CLAIM)
+
+    @cached_property
+    def full_user(self):
+        return get_user_model().objects.get(pk=self.pk)
+
+
+def revoke_token(token):
+    """
+    Deny a single token (access or refresh) until it expires.
+    """
+    timeout = max(int(token["exp"] - time.time()), 1)
+    cache.set(DENYLIST_KEY.format(jti=token[api_settings.JTI_CLAIM]), 1, timeout)
+
+
+def revoke_user_tokens(user_id):
+    """
+    Deny every token issued to ``user_id`` up to now.
+    """
+    cache.set(
+        REVOKED_BEFORE_KEY.format(user_id=user_id),
+        int(time.time()),
+        int(api_settings.REFRESH_TOKEN_LIFETIME.total_seconds()),
+    )
+
+
+def is_revoked(token):
+    jti_key = DENYLIST_KEY.format(jti=token.get(api_settings.JTI_CLAIM))
+    user_key = REVOKED_BEFORE_KEY.format(user_id=token.get(api_settings.USER_ID_CLAIM))
+    found = cache.get_many([jti_key, user_key])
+    if jti_key in found:
+        return True
+    return user_key in found and token.get("iat", 0) <= found[user_key]
+
+
+class StoreJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that builds the user from token claims.
+
+    Safe requests get a StoreTokenUser carrying ``store_id`` and
+    ``is_superuser`` from the token, so no ``StoreAdmin`` row is loaded. Writes,
+    views with ``requires_full_user = True`` and tokens issued without the store
+    claim load the full user as usual. Revocation goes through a denylist in the
+    shared cache.
+    """
+
+    def authenticate(self, request):
+        self.request = request
+        return super().authenticate(request)
+
+    def needs_full_user(self, validated_token):
+        if STORE_ID_CLAIM not in validated_token:
+            return True
+        if self.request.method not in SAFE_METHODS:
+            return True
+        view = self.request.parser_context.get("view")
+        return getattr(view, "requires_full_user", False)
+
+    def get_user(self, validated_token):
+        if is_revoked(validated_token):
+            raise InvalidToken("Token has been revoked.")
+        if self.needs_full_user(validated_token):
+            return super().get_user(validated_token)
+        return StoreTokenUser(validated_token)
@@ -0,0 +1,181 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+# Sentinel so that cached ``None`` values can be told apart from misses
+_MISSING = object()
+
+VERSION_KEY = "refcache:version:{namespace}"
+
+
+class LRUCache:
+    """
+    Thread-safe, bounded LRU cache whose entries also expire after ``ttl`` seconds.
+    """
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class ReferenceCache:
+    """
+    Per-process cache for rarely changing reference rows (stores, addresses,
+    store admins, suppliers).
+
+    Entries are keyed by ``(namespace, version, pk)``. The version of each
+    namespace lives in the shared Django cache, so bumping it from any process
+    makes every other process miss on its stale entries, which then age out of
+    the LRU. The shared version is re-read at most once per
+    ``version_check_interval`` seconds to keep lookups off the network.
+    """
+
+    def __init__(self, maxsize=2048, ttl=300, version_check_interval=1.0):
+        self.entries = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.version_check_interval = version_check_interval
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def version(self, namespace):
+        now = time.monotonic()
+        checked_at, version = self._versions.get(namespace, (0.0, None))
+        if version is not None and now - checked_at < self.version_check_interval:
+            return version
+
+        version = cache.get(VERSION_KEY.format(namespace=namespace))
+        if version is None:
+            cache.add(VERSION_KEY.format(namespace=namespace), 1, timeout=None)
+            version = cache.get(VERSION_KEY.format(namespace=namespace), 1)
+        with self._lock:
+            self._versions[namespace] = (now, version)
+        return version
+
+    def bump(self, *namespaces):
+        """
+        Invalidate every cached entry of the given namespaces in all processes.
+        """
+        for namespace in namespaces:
+            key = VERSION_KEY.format(namespace=namespace)
+            try:
+                version = cache.incr(key)
+            except ValueError:
+                # Key is missing (never read or evicted): start a fresh counter
+                # that cannot collide with versions other processes still hold.
+                version = time.time_ns()
+                cache.set(key, version, timeout=None)
+            with self._lock:
+                self._versions[namespace] = (time.monotonic(), version)
+
+    def get(self, namespace, pk, loader):
+        """
+        Return the cached value for ``pk``, calling ``loader(pk)`` on a miss.
+        """
+        if pk is None:
+            return None
+        key = (namespace, self.version(namespace), pk)
+        value = self.entries.get(key, _MISSING)
+        if value is _MISSING:
+            value = loader(pk)
+            self.entries.set(key, value)
+        return value
+
+    def clear(self):
+        self.entries.clear()
+        with self._lock:
+            self._versions.clear()
+
+    def stats(self):
+        return self.entries.stats()
+
+
+_config = getattr(settings, "REFERENCE_CACHE", {})
+
+reference_cache = ReferenceCache(
+    maxsize=_config.get("MAX_SIZE", 2048),
+    ttl=_config.get("TTL", 300),
+    version_check_interval=_config.get("VERSION_CHECK_INTERVAL", 1.0),
+)
+
+
+def admin_username(admin_id):
+    """
+    Username of a store admin, served from the reference cache.
+    """
+
+    def load(pk):
+        from .models import StoreAdmin
+
+        return (
+            StoreAdmin.objects.filter(pk=pk).values_list("username", flat=True).first()
+        )
+
+    return reference_cache.get("storeadmin", admin_id, load)
+
+
+def store_id_for_user(user):
+    """
+    Id of the store managed by ``user`` (None when they manage none), without
+    a database hit once cached.
+    """
+    store_id = getattr(user, "store_id", None)
+    if store_id is not None:
+        return store_id
+
+    def load(pk):
+        from .models import Store
+
+        return Store.objects.filter(admin_id=pk).values_list("id", flat=True).first()
+
+    return reference_cache.get("store_by_admin", user.pk, load)
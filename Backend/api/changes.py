@@ -0,0 +1,101 @@
+import datetime
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Inventory, Product, Store, Supplier, Tombstone
+
+# Models whose deletes are logged as tombstones (api/signals.py) -> the column
+# scoping their rows to a store, or None for shared rows
+TRACKED = {
+    Product: None,
+    Store: "id",
+    Supplier: None,
+    Inventory: "store_id",
+}
+
+
+def tombstone_store_id(instance):
+    if isinstance(instance, Store):
+        return instance.pk
+    return getattr(instance, "store_id", None)
+
+
+def after(mark, field):
+    """
+    Rows past the ``(timestamp, id)`` watermark ``mark`` in ``(field, id)``
+    order.
+    """
+    if mark is None:
+        return Q()
+    at, pk = mark
+    return Q(**{f"{field}__gt": at}) | Q(**{field: at, "id__gt": pk})
+
+
+def settled_before():
+    """
+    Changes are only handed out once older than ``CHANGES["SETTLE_SECONDS"]``,
+    so a write committing shortly after its ``updated_at`` isn't skipped by a
+    watermark already past it.
+    """
+    return timezone.now() - datetime.timedelta(
+        seconds=settings.CHANGES["SETTLE_SECONDS"]
+    )
+
+
+def oldest_mark():
+    # Deletes before this may have been purged
+    return timezone.now() - datetime.timedelta(days=settings.CHANGES["TOMBSTONE_DAYS"])
+
+
+def changes_since(model, mark=None, limit=500, store_id=None, columns=("id",)):
+    """
+    Rows of ``model`` changed and ids deleted past ``mark``, oldest first, as
+    ``(rows, deleted ids, new mark)``. Rows are ``columns`` tuples; ``mark``
+    is ``{"changed"|"deleted": (timestamp, id)}``, as returned last time, or
+    None for everything. Store scoped models only return the rows of
+    ``store_id``, none at all when it is None.
+
+    At most ``limit`` of each come back; call again with the new mark while
+    either list is full.
+    """
+    scope = TRACKED[model]
+    mark = dict(mark or {})
+    # values_list() drops repeated names
+    names = list(dict.fromkeys(("updated_at", "id", *columns)))
+    picks = [names.index(column) for column in columns]
+    until = settled_before()
+    rows = model.objects.filter(after(mark.get("changed"), "updated_at"))
+    deletes = Tombstone.objects.filter(
+        after(mark.get("deleted"), "deleted_at"), model=model._meta.model_name
+    )
+    if scope is not None and store_id is None:
+        rows, deletes = rows.none(), deletes.none()
+    elif scope is not None:
+        rows = rows.filter(**{scope: store_id})
+        deletes = deletes.filter(store_id=store_id)
+    rows = list(
+        rows.filter(updated_at__lt=until)
+        .order_by("updated_at", "id")
+        .values_list(*names)[:limit]
+    )
+    deletes = list(
+        deletes.filter(deleted_at__lt=until)
+        .order_by("deleted_at", "id")
+        .values_list("deleted_at", "id", "object_id")[:limit]
+    )
+    if rows:
+        mark["changed"] = rows[-1][:2]
+    if deletes:
+        mark["deleted"] = deletes[-1][:2]
+    return (
+        [tuple(row[i] for i in picks) for row in rows],
+        [object_id for *_, object_id in deletes],
+        mark,
+    )
+
+
+def purge_tombstones():
+    deleted, _ = Tombstone.objects.filter(deleted_at__lt=oldest_mark()).delete()
+    return deleted
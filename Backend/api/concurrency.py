@@ -0,0 +1,94 @@
+from django.db import transaction
+from django.db.models import F
+from django.utils.http import quote_etag
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+
+class VersionConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "The object was changed by another request; reload it and retry."
+    default_code = "conflict"
+
+    def __init__(self, current):
+        super().__init__()
+        # Set directly so the version stays a number in the response
+        self.detail = {"detail": self.detail, "version": current}
+
+
+def version_etag(instance):
+    return quote_etag(str(instance.version))
+
+
+def parse_version(etag):
+    """
+    The version an ``If-Match`` entity tag was issued for, or None. Detail
+    ETags are ``"<version>"`` or ``"<version>.<digest>"``.
+    """
+    etag = etag.strip().removeprefix("W/").strip('"')
+    try:
+        return int(etag.split(".")[0])
+    except ValueError:
+        return None
+
+
+class OptimisticLockMixin:
+    """
+    Version-checked updates.
+
+    Clients send the version they read, as ``If-Match`` with the object's
+    ETag or as ``version`` in the body. The write is a compare-and-set on the
+    version column: a mismatch (someone saved in between) returns 409 with
+    the current version, and no row is locked beyond the update's own
+    transaction. Updates without either still bump the version.
+    """
+
+    def get_expected_version(self, instance):
+        """
+        The version the client read: from ``If-Match``, else from the body's
+        ``version``, else the one just loaded (nothing to check against).
+        """
+        header = self.request.headers.get("If-Match", "").strip()
+        if header == "*":
+            return instance.version
+        if header:
+            versions = [parse_version(tag) for tag in header.split(",")]
+            # Any of the listed tags may match
+            return instance.version if instance.version in versions else versions[0]
+        if "version" in self.request.data:
+            try:
+                return int(self.request.data["version"])
+            except (TypeError, ValueError):
+                raise ValidationError({"version": ["A valid integer is required."]})
+        return instance.version
+
+    def perform_update(self, serializer):
+        instance = serializer.instance
+        if self.get_expected_version(instance) != instance.version:
+            raise VersionConflict(instance.version)
+        model = type(instance)
+        with transaction.atomic():
+            # Compare and set, in case another request saved since get_object()
+            if not model.objects.filter(
+                pk=instance.pk, version=instance.version
+            ).update(version=F("version") + 1):
+                raise VersionConflict(
+                    model.objects.filter(pk=instance.pk)
+                    .values_list("version", flat=True)
+                    .first()
+                )
+            instance.version += 1
+            super().perform_update(serializer)
+        self.saved_instance = instance
+
+    def update(self, request, *args, **kwargs):
+        response = super().update(request, *args, **kwargs)
+        response["ETag"] = version_etag(self.saved_instance)
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        response = super().retrieve(request, *args, **kwargs)
+        # ConditionalGetMixin sets its own, version-prefixed ETag
+        if "ETag" not in response and "version" in getattr(response, "data", {}):
+            response["ETag"] = quote_etag(str(response.data["version"]))
+        return response
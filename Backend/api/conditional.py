@@ -0,0 +1,96 @@
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+from .cache import reference_cache
+
+
+class ConditionalGetMixin:
+    """
+    ETag and Last-Modified support for ``list`` and ``retrieve``.
+
+    List ETags come from ``list_etag_parts``, by default a single
+    ``MAX(updated_at)``/``COUNT(*)`` query on the filtered queryset; detail ETags from the object's ``updated_at``. Both are
+    combined with the shared versions of ``conditional_namespaces``, which
+    cover nested data whose changes don't touch the listed rows. When the
+    client's validators still match, a 304 is returned before serialization.
+
+    Last-Modified is only sent for details without nested data. A list's
+    latest ``updated_at`` doesn't move when a row is deleted, nor does a row's
+    when its nested data changes, so If-Modified-Since would get a stale 304.
+    """
+
+    conditional_namespaces = ()
+
+    def get_conditional_namespaces(self):
+        return self.conditional_namespaces
+
+    def make_validators(self, *parts, last_modified=None, version=None):
+        versions = [
+            reference_cache.version(namespace)
+            for namespace in self.get_conditional_namespaces()
+        ]
+        user = self.request.user
+        scope = "all" if user.is_superuser else user.pk
+        key = repr(
+            (
+                self.request.get_full_path(),
+                scope,
+                versions,
+                last_modified and last_modified.isoformat(),
+                *parts,
+            )
+        )
+        digest = hashlib.md5(key.encode()).hexdigest()
+        # Versioned objects lead with their version, which If-Match checks
+        etag = quote_etag(digest if version is None else f"{version}.{digest}")
+        return etag, None if versions else last_modified
+
+    def not_modified(self, etag, last_modified):
+        response = get_conditional_response(
+            self.request,
+            etag=etag,
+            last_modified=last_modified and int(last_modified.timestamp()),
+        )
+        if response is not None:
+            self.set_validators(response, etag, last_modified)
+        return response
+
+    def set_validators(self, response, etag, last_modified):
+        if response.status_code in (200, 304):
+            response["ETag"] = etag
+            if last_modified is not None:
+                response["Last-Modified"] = http_date(last_modified.timestamp())
+            patch_vary_headers(response, ("Authorization", "Cookie"))
+        return response
+
+    def list_etag_parts(self, queryset):
+        """
+        What the ETag of the filtered ``queryset`` depends on besides the request
+        and the namespace versions.
+        """
+        stats = queryset.aggregate(last_modified=Max("updated_at"), count=Count("pk"))
+        return stats["count"], stats["last_modified"]
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        etag, last_modified = self.make_validators(*self.list_etag_parts(queryset))
+        response = self.not_modified(etag, last_modified)
+        if response is None:
+            response = super().list(request, *args, **kwargs)
+        return self.set_validators(response, etag, last_modified)
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        etag, last_modified = self.make_validators(
+            instance.pk,
+            last_modified=instance.updated_at,
+            version=getattr(instance, "version", None),
+        )
+        response = self.not_modified(etag, last_modified)
+        if response is None:
+            response = Response(self.get_serializer(instance).data)
+        return self.set_validators(response, etag, last_modified)
@@ -0,0 +1,221 @@
+import datetime
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import ExtractHour
+from django.utils import timezone
+
+from .models import Inventory, Product, Sales, SalesItems, Store, StoreKPI
+from .reconcile import SUBTOTAL_X100
+
+TOP_PRODUCTS = 10
+# Materialized views created by migration 0004 on PostgreSQL, refreshed by
+# `refresh_store_kpis`. Both are bucketed by hour so any time zone's day can be
+# summed from them.
+HOURLY_VIEW = "api_store_hourly_sales"
+PRODUCT_VIEW = "api_store_product_sales"
+
+
+def day_bounds(day):
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.datetime.combine(day, datetime.time.min), tz)
+    end = timezone.make_aware(
+        datetime.datetime.combine(day + datetime.timedelta(days=1), datetime.time.min),
+        tz,
+    )
+    return start, end
+
+
+def materialized_views_available():
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT to_regclass(%s), to_regclass(%s)", [HOURLY_VIEW, PRODUCT_VIEW]
+        )
+        return all(cursor.fetchone())
+
+
+def _summary(hours, products):
+    """
+    KPI fields from ``[(hour, sales, revenue, items)]`` and
+    ``[(product id, quantity, revenue)]`` rows.
+    """
+    per_hour = {
+        hour: {"hour": hour, "sales": 0, "revenue": Decimal("0.00")}
+        for hour in range(24)
+    }
+    revenue, items_sold, sales_count = Decimal("0.00"), 0, 0
+    for hour, sales, hour_revenue, items in hours:
+        per_hour[hour]["sales"] += sales
+        per_hour[hour]["revenue"] += hour_revenue or 0
+        revenue += hour_revenue or 0
+        items_sold += int(items or 0)
+        sales_count += sales
+
+    names = dict(
+        Product.objects.filter(id__in=[row[0] for row in products]).values_list(
+            "id", "product_name"
+        )
+    )
+    return {
+        "revenue": revenue,
+        "items_sold": items_sold,
+        "sales_count": sales_count,
+        "sales_per_hour": [
+            {**entry, "revenue": str(entry["revenue"])} for entry in per_hour.values()
+        ],
+        "top_products": [
+            {
+                "product": product_id,
+                "product_name": names.get(product_id),
+                "quantity": int(quantity),
+                "revenue": str(Decimal(revenue).quantize(Decimal("0.01"))),
+            }
+            for product_id, quantity, revenue in products
+        ],
+    }
+
+
+def live_sales_kpis(store_id, day):
+    """
+    Sales figures of ``day`` straight from the sales tables; only ``day``'s
+    partition of each is read.
+    """
+    start, end = day_bounds(day)
+    hours = (
+        Sales.objects.filter(
+            store_id=store_id, created_at__gte=start, created_at__lt=end
+        )
+        .annotate(hour=ExtractHour("created_at"))
+        .values("hour")
+        .annotate(
+            sales=Count("id"), revenue=Sum("total_price"), items=Sum("total_quantity")
+        )
+        .values_list("hour", "sales", "revenue", "items")
+        .order_by()
+    )
+    products = (
+        SalesItems.objects.filter(
+            sales__store_id=store_id,
+            sales__created_at__gte=start,
+            sales__created_at__lt=end,
+            created_at__gte=start,
+        )
+        .values("product_id")
+        .annotate(sold=Sum("quantity"), subtotal_x100=Sum(SUBTOTAL_X100))
+        .order_by("-sold", "product_id")
+        .values_list("product_id", "sold", "subtotal_x100")[:TOP_PRODUCTS]
+    )
+    return _summary(
+        list(hours),
+        [(pk, sold, Decimal(total) / 100) for pk, sold, total in products],
+    )
+
+
+def materialized_sales_kpis(store_id, day):
+    """
+    Sales figures of ``day`` from the hourly materialized views, as of their
+    last refresh.
+    """
+    start, end = day_bounds(day)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT hour, sales_count, revenue, items_sold FROM {HOURLY_VIEW} "
+            "WHERE store_id = %s AND hour >= %s AND hour < %s",
+            [store_id, start, end],
+        )
+        hours = [
+            (timezone.localtime(hour).hour, sales, revenue, items)
+            for hour, sales, revenue, items in cursor.fetchall()
+        ]
+        cursor.execute(
+            f"SELECT product_id, SUM(quantity), SUM(revenue) FROM {PRODUCT_VIEW} "
+            "WHERE store_id = %s AND hour >= %s AND hour < %s "
+            "GROUP BY product_id ORDER BY 2 DESC, 1 LIMIT %s",
+            [store_id, start, end, TOP_PRODUCTS],
+        )
+        products = cursor.fetchall()
+    return _summary(hours, products)
+
+
+def low_stock_count(store_id):
+    return Inventory.objects.filter(
+        store_id=store_id, quantity__lte=F("reorder_level")
+    ).count()
+
+
+def refresh_store_kpi(store_id, materialized=False):
+    """
+    Rebuild a store's KPI record for today in full.
+    """
+    day = timezone.localdate()
+    compute = materialized_sales_kpis if materialized else live_sales_kpis
+    fields = {
+        "day": day,
+        "source": "materialized" if materialized else "live",
+        **compute(store_id, day),
+        "low_stock_count": low_stock_count(store_id),
+    }
+    kpi, _ = StoreKPI.objects.update_or_create(store_id=store_id, defaults=fields)
+    return kpi
+
+
+def apply_deltas(store_id, **deltas):
+    """
+    Add the changes of one event to the store's record for today. The first
+    event of a day finds no record of today and rebuilds it in full instead,
+    which counts the event already.
+    """
+    changes = {name: F(name) + value for name, value in deltas.items() if value}
+    if not changes:
+        return
+    day = timezone.localdate()
+    if StoreKPI.objects.filter(store_id=store_id, day=day).update(**changes):
+        return
+    # A store deleted since took its record with it
+    if Store.objects.filter(pk=store_id).exists():
+        refresh_store_kpi(store_id)
+
+
+def count_on_commit(store_id, **deltas):
+    """
+    Apply ``deltas`` to the store's KPI record once the current transaction
+    commits. Each event registers its own callback so that a rolled back
+    savepoint drops its changes along with it.
+    """
+    if any(deltas.values()):
+        transaction.on_commit(lambda: apply_deltas(store_id, **deltas))
+
+
+def get_store_kpi(store_id):
+    """
+    Today's KPI record of a store. When no event refreshed it yet today, it is
+    built from the materialized views where they exist.
+    """
+    kpi = StoreKPI.objects.filter(store_id=store_id, day=timezone.localdate()).first()
+    if kpi is None:
+        kpi = refresh_store_kpi(store_id, materialized=materialized_views_available())
+    return kpi
+
+
+def refresh_materialized_views():
+    with connection.cursor() as cursor:
+        for view in (HOURLY_VIEW, PRODUCT_VIEW):
+            cursor.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view}")
+
+
+def rebuild_store_kpis():
+    """
+    Scheduled fallback: refresh the views and rebuild every store's record
+    from them (or live without them). Catches bulk writes that bypass signals
+    and rolls the records over to a new day.
+    """
+    materialized = materialized_views_available()
+    if materialized:
+        refresh_materialized_views()
+    store_ids = list(Store.objects.values_list("id", flat=True))
+    for store_id in store_ids:
+        refresh_store_kpi(store_id, materialized=materialized)
+    return len(store_ids)
@@ -0,0 +1,200 @@
+from collections import defaultdict
+from functools import partial
+
+from django.conf import settings
+from django.db.models import Prefetch
+from rest_framework import serializers
+from rest_framework.response import Response
+
+from .serializers import CachedReferenceField
+
+# DRF fields whose representation of a non-null database value is the value itself
+PASSTHROUGH_FIELDS = (
+    serializers.IntegerField,
+    serializers.BooleanField,
+    serializers.CharField,
+    serializers.PrimaryKeyRelatedField,
+)
+
+
+def _no_children(row):
+    return []
+
+
+def fast_read_enabled():
+    return getattr(settings, "API_FAST_READ_PATH", False)
+
+
+class ReadPlan:
+    """
+    Precompiled mapping from ``values()`` rows to the representation produced by
+    a read-only ModelSerializer.
+
+    The serializer is introspected once: plain fields become a column plus the
+    DRF field's own ``to_representation``, nested serializers become joined
+    columns, ``many=True`` children become one extra ``values()`` query per page,
+    and cached reference fields only read their foreign key. Model properties
+    have no column, so they must be given in ``computed`` as
+    ``name -> (columns, function(row, prefix))``.
+    """
+
+    def __init__(self, serializer_class, computed=None, prefix=""):
+        self.model = serializer_class.Meta.model
+        self.columns = []
+        # (output name, column or None for whole-row functions, converter)
+        self.steps = []
+        self.children = []
+        computed = computed or {}
+
+        for name, field in serializer_class().fields.items():
+            if field.write_only:
+                continue
+            source = prefix + field.source.replace(".", "__")
+            if name in computed:
+                columns, function = computed[name]
+                self._add_columns(prefix + column for column in columns)
+                self.steps.append((name, None, partial(function, prefix=prefix)))
+            elif isinstance(field, CachedReferenceField):
+                self._add_columns([source])
+                self.steps.append((name, source, field.to_representation))
+            elif isinstance(field, serializers.ListSerializer):
+                relation = self.model._meta.get_field(field.source)
+                self.children.append((name, relation, ReadPlan(type(field.child))))
+                # Placeholder keeps the serializer's key order; filled in render()
+                self.steps.append((name, None, _no_children))
+            elif isinstance(field, serializers.BaseSerializer):
+                nested = ReadPlan(type(field), prefix=source + "__")
+                self._add_columns(nested.columns)
+                self.steps.append((name, None, nested.build))
+            elif isinstance(field, serializers.ReadOnlyField):
+                raise ValueError(
+                    f"{serializer_class.__name__}.{name} has no column; "
+                    "pass it in `computed`."
+                )
+            else:
+                self._add_columns([source])
+                convert = (
+                    None
+                    if isinstance(field, PASSTHROUGH_FIELDS)
+                    else field.to_representation
+                )
+                self.steps.append((name, source, convert))
+
+    def _add_columns(self, columns):
+        for column in columns:
+            if column not in self.columns:
+                self.columns.append(column)
+
+    def build(self, row):
+        data = {}
+        for name, column, convert in self.steps:
+            if column is None:
+                data[name] = convert(row)
+                continue
+            value = row[column]
+            if value is None or convert is None:
+                data[name] = value
+            else:
+                data[name] = convert(value)
+        return data
+
+    def values(self, queryset):
+        """
+        Restrict ``queryset`` to the columns the plan needs.
+        """
+        pk = self.model._meta.pk.attname
+        columns = self.columns if pk in self.columns else [pk, *self.columns]
+        return queryset.prefetch_related(None).values(*columns)
+
+    def render(self, rows, prefetches=None):
+        """
+        Build the representation of an already fetched page of ``values()`` rows.
+
+        ``prefetches`` maps child accessors to the base querysets to read them
+        from, as returned by ``prefetch_querysets()``.
+        """
+        prefetches = prefetches or {}
+        rows = list(rows)
+        pk = self.model._meta.pk.attname
+        ids = [row[pk] for row in rows]
+        results = [self.build(row) for row in rows]
+
+        for name, relation, child in self.children:
+            link = relation.field.attname
+            grouped = defaultdict(list)
+            base = prefetches.get(relation.get_accessor_name())
+            if base is None:
+                base = relation.related_model.objects.all()
+            child_rows = (
+                base.filter(**{f"{link}__in": ids})
+                .values(link, *child.columns)
+                .order_by("pk")
+            )
+            for child_row in child_rows:
+                grouped[child_row[link]].append(child.build(child_row))
+            for data, parent_id in zip(results, ids):
+                data[name] = grouped.get(parent_id, data[name])
+        return results
+
+
+def _grand_total(row, prefix=""):
+    total_price = row[prefix + "total_price"]
+    return (
+        total_price
+        + (total_price * (row[prefix + "total_tax"] / 100))
+        - total_price * (row[prefix + "overall_discount"] / 100)
+    )
+
+
+def prefetch_querysets(queryset):
+    """
+    Custom ``Prefetch`` querysets of ``queryset`` keyed by accessor, so the
+    child queries keep their filters (e.g. partition bounds).
+    """
+    return {
+        lookup.prefetch_to: lookup.queryset
+        for lookup in queryset._prefetch_related_lookups
+        if isinstance(lookup, Prefetch) and lookup.queryset is not None
+    }
+
+
+# Sales.grand_total computed from a values() row
+GRAND_TOTAL = (("total_price", "total_tax", "overall_discount"), _grand_total)
+
+_plans = {}
+
+
+def get_plan(serializer_class, computed=None):
+    """
+    Compile the read plan of ``serializer_class`` once per process.
+    """
+    plan = _plans.get(serializer_class)
+    if plan is None:
+        plan = _plans[serializer_class] = ReadPlan(serializer_class, computed)
+    return plan
+
+
+class FastListMixin:
+    """
+    Serve ``list`` through the compiled read plan of ``serializer_class`` when
+    ``API_FAST_READ_PATH`` is enabled. The response body is identical to the
+    ModelSerializer path.
+    """
+
+    fast_read_computed = {}
+
+    def use_fast_path(self):
+        return fast_read_enabled()
+
+    def list(self, request, *args, **kwargs):
+        if not self.use_fast_path():
+            return super().list(request, *args, **kwargs)
+
+        plan = get_plan(self.serializer_class, self.fast_read_computed)
+        queryset = self.filter_queryset(self.get_queryset())
+        prefetches = prefetch_querysets(queryset)
+        queryset = plan.values(queryset)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(plan.render(page, prefetches))
+        return Response(plan.render(queryset, prefetches))
@@ -0,0 +1,200 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
+
+from .fastpath import prefetch_querysets
+from .serializers import CachedReferenceField
+
+
+def parse_paths(value):
+    """
+    ``"a,b.c,b.d"`` -> ``{"a": {}, "b": {"c": {}, "d": {}}}``.
+    """
+    tree = {}
+    for path in value.split(","):
+        node = tree
+        for part in filter(None, path.strip().split(".")):
+            node = node.setdefault(part, {})
+    return tree
+
+
+def _fields(serializer):
+    if isinstance(serializer, serializers.ListSerializer):
+        serializer = serializer.child
+    return serializer.fields
+
+
+def is_nested(field):
+    return isinstance(field, (serializers.BaseSerializer, CachedReferenceField))
+
+
+def collapse(name, field):
+    """
+    Read-only field rendering only the primary key(s) of a nested relation.
+    """
+    # DRF rejects a source equal to the field name
+    kwargs = {"read_only": True}
+    if field.source != name:
+        kwargs["source"] = field.source
+    if isinstance(field, CachedReferenceField):
+        return serializers.IntegerField(**kwargs)
+    if isinstance(field, serializers.ListSerializer):
+        return serializers.PrimaryKeyRelatedField(many=True, **kwargs)
+    return serializers.PrimaryKeyRelatedField(**kwargs)
+
+
+def prune(serializer, fields=None, expand=None, path=""):
+    """
+    Drop the fields of ``serializer`` not in the ``fields`` tree and render
+    nested relations missing from the ``expand`` tree as primary keys. ``None``
+    keeps every field, respectively expands every relation. Selecting subfields
+    of a relation (``fields=product.product_name``) implies expanding it.
+    """
+    bound = _fields(serializer)
+    if fields:
+        unknown = set(fields) - set(bound)
+        if unknown:
+            raise ValidationError(
+                {"fields": [f"Unknown field {path}{name}." for name in sorted(unknown)]}
+            )
+    for name in list(bound):
+        field = bound[name]
+        if fields and name not in fields:
+            del bound[name]
+            continue
+        if not is_nested(field):
+            continue
+        subfields = fields.get(name) if fields else None
+        subexpand = expand.get(name) if expand is not None else None
+        if expand is not None and name not in expand and not subfields:
+            bound[name] = collapse(name, field)
+        elif isinstance(field, serializers.BaseSerializer):
+            prune(field, subfields or None, subexpand, f"{path}{name}.")
+
+
+def _concrete_column(model, source):
+    """
+    The model field (or foreign key attname) ``source`` reads, if it is one.
+    """
+    try:
+        return model._meta.get_field(source)
+    except FieldDoesNotExist:
+        for field in model._meta.concrete_fields:
+            if field.attname == source:
+                return field
+    return None
+
+
+def _plan(model, serializer, computed, prefix=""):
+    """
+    ``(only paths, select_related paths, {accessor: (related model, child)})``
+    of what ``serializer`` renders, or None when some field can't be mapped to
+    columns (then the queryset is left alone).
+    """
+    only, select, children = {prefix + model._meta.pk.name}, [], {}
+    for name, field in _fields(serializer).items():
+        if field.write_only:
+            continue
+        if name in computed:
+            only.update(prefix + column for column in computed[name][0])
+            continue
+        column = _concrete_column(model, field.source)
+        if column is None:
+            return None
+        if column.auto_created and not column.concrete:
+            # Reverse foreign key, e.g. Sales.sales_item: prefetched
+            children[column.get_accessor_name()] = (column.related_model, field)
+        elif column.is_relation and isinstance(field, serializers.BaseSerializer):
+            # Forward foreign key rendered nested: joined
+            nested = _plan(column.related_model, field, {}, f"{prefix}{column.name}__")
+            if nested is None or nested[2]:
+                return None
+            only.update(nested[0])
+            select += [f"{prefix}{column.name}", *nested[1]]
+        else:
+            only.add(prefix + column.name)
+    return only, select, children
+
+
+def narrow(queryset, serializer, computed=None, required=()):
+    """
+    Restrict ``queryset`` to the columns, joins and prefetches a pruned
+    ``serializer`` needs, plus the ``required`` columns. Custom ``Prefetch``
+    querysets (e.g. partition bounds added by a filter) are kept as the base
+    of the child queries.
+    """
+    if isinstance(serializer, serializers.ManyRelatedField):
+        # Collapsed to ids: nothing but the keys
+        plan = ({queryset.model._meta.pk.name}, [], {})
+    else:
+        plan = _plan(queryset.model, serializer, computed or {})
+    if plan is None:
+        return queryset
+    only, select, children = plan
+    bases = prefetch_querysets(queryset)
+    lookups = []
+    for accessor, (model, field) in children.items():
+        base = bases.get(accessor, model.objects.all())
+        link = queryset.model._meta.get_field(accessor).field
+        lookups.append(Prefetch(accessor, narrow(base, field, required=[link.name])))
+    queryset = queryset.prefetch_related(None).prefetch_related(*lookups)
+    queryset = queryset.select_related(None)
+    if select:
+        queryset = queryset.select_related(*select)
+    return queryset.only(*only, *required)
+
+
+class SparseFieldsMixin:
+    """
+    ``?fields=`` and ``?expand=`` for safe requests.
+
+    ``fields`` lists the fields to return, with dotted paths for nested ones
+    (``fields=quantity,product.product_name``). ``expand`` lists the nested
+    relations to embed; the others are returned as primary keys
+    (``expand=`` returns ids only). Without either parameter responses are
+    unchanged. The queryset is narrowed to match: ``only()`` the rendered
+    columns, joins and prefetches only for embedded relations.
+    """
+
+    # Columns read outside the serializer, e.g. ``updated_at`` for ETags
+    sparse_required_columns = ()
+
+    def get_sparse_fields(self):
+        """
+        ``(fields tree or None, expand tree or None)`` of the request.
+        """
+        request = getattr(self, "request", None)
+        if request is None or request.method not in SAFE_METHODS:
+            return None, None
+        params = request.query_params
+        fields = parse_paths(params["fields"]) if "fields" in params else None
+        expand = parse_paths(params["expand"]) if "expand" in params else None
+        return fields or None, expand
+
+    def sparse_fields_requested(self):
+        return self.get_sparse_fields() != (None, None)
+
+    def use_fast_path(self):
+        # The compiled read plans always render every field
+        return not self.sparse_fields_requested() and super().use_fast_path()
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        fields, expand = self.get_sparse_fields()
+        if fields is not None or expand is not None:
+            prune(serializer, fields, expand)
+        return serializer
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if not self.sparse_fields_requested():
+            return queryset
+        serializer = self.get_serializer(many=True)
+        return narrow(
+            queryset,
+            serializer,
+            getattr(self, "fast_read_computed", {}),
+            self.sparse_required_columns,
+        )
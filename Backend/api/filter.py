@@ -1,5 +1,23 @@
+import datetime
+import operator
+from functools import reduce
+
 import django_filters
-from .models import Product, Sales, Inventory, Address, StoreAdmin, Store, Supplier
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import Prefetch
+from django_filters.constants import EMPTY_VALUES
+from .models import (
+    Product,
+    Sales,
+    SalesItems,
+    Inventory,
+    Address,
+    StoreAdmin,
+    Store,
+    Supplier,
+    Task,
+)
+from .partitions import month_range
 
 
 class ProductFilter(django_filters.FilterSet):
@@ -16,7 +34,35 @@ class ProductFilter(django_filters.FilterSet):
         }
 
 
+MICROSECOND = datetime.timedelta(microseconds=1)
+
+# Python equivalents of the lookups SalesFilter uses, for archived sales
+ARCHIVE_LOOKUPS = {
+    "exact": operator.eq,
+    "iexact": lambda value, wanted: str(value).lower() == str(wanted).lower(),
+    "icontains": lambda value, wanted: str(wanted).lower() in str(value).lower(),
+    "lte": operator.le,
+    "gte": operator.ge,
+    "lt": operator.lt,
+    "range": lambda value, wanted: wanted[0] <= value <= wanted[1],
+}
+
+
 class SalesFilter(django_filters.FilterSet):
+    """
+    Sales filters that keep PostgreSQL partition pruning working.
+
+    ``month=YYYY-MM`` becomes a constant ``created_at`` range, and the lowest
+    ``created_at`` bound is also applied to the prefetched sales items (which
+    are never older than their sale), so both tables only scan the partitions
+    covering the requested dates. The same filters can be applied to archived
+    sales with ``filter_archived``.
+    """
+
+    month = django_filters.DateFilter(
+        field_name="created_at", method="filter_month", input_formats=["%Y-%m"]
+    )
+
     class Meta:
         model = Sales
         fields = {
@@ -29,6 +75,73 @@ class SalesFilter(django_filters.FilterSet):
             "updated_at": ["exact", "lte", "gte", "range"],
         }
 
+    def filter_month(self, queryset, name, value):
+        start, end = month_range(value)
+        return queryset.filter(**{f"{name}__gte": start, f"{name}__lt": end})
+
+    def created_at_bounds(self):
+        """
+        Tightest ``[start, end)`` of created_at the filters allow (None if open).
+        """
+        data = self.form.cleaned_data
+        starts, ends = [data.get("created_at__gte")], []
+        if data.get("created_at__lte"):
+            ends.append(data["created_at__lte"] + MICROSECOND)
+        if data.get("created_at"):
+            starts.append(data["created_at"])
+            ends.append(data["created_at"] + MICROSECOND)
+        if data.get("created_at__range"):
+            starts.append(data["created_at__range"][0])
+            ends.append(data["created_at__range"][1] + MICROSECOND)
+        if data.get("month"):
+            start, end = month_range(data["month"])
+            starts.append(start)
+            ends.append(end)
+        starts = [start for start in starts if start is not None]
+        return (max(starts) if starts else None, min(ends) if ends else None)
+
+    def filter_archived(self, sales):
+        """
+        Apply the same filters in Python to archived Sales instances.
+        """
+        checks = []
+        for name, value in self.form.cleaned_data.items():
+            if value in EMPTY_VALUES:
+                continue
+            if name == "month":
+                start, end = month_range(value)
+                checks += [("created_at", "gte", start), ("created_at", "lt", end)]
+            else:
+                checks.append(
+                    (
+                        self.filters[name].field_name,
+                        self.filters[name].lookup_expr,
+                        value,
+                    )
+                )
+
+        def matches(sale):
+            for field_name, lookup, wanted in checks:
+                try:
+                    value = reduce(getattr, field_name.split("__"), sale)
+                except ObjectDoesNotExist:
+                    return False
+                if value is None or not ARCHIVE_LOOKUPS[lookup](value, wanted):
+                    return False
+            return True
+
+        return [sale for sale in sales if matches(sale)]
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        lower = self.created_at_bounds()[0]
+        if lower is not None:
+            items = SalesItems.objects.filter(created_at__gte=lower)
+            queryset = queryset.prefetch_related(None).prefetch_related(
+                Prefetch("sales_item", queryset=items.select_related("product"))
+            )
+        return queryset
+
 
 class InventoryFilters(django_filters.FilterSet):
     class Meta:
@@ -82,3 +195,13 @@ class SupplierFilters(django_filters.FilterSet):
         fields = {
             "name": ["iexact", "icontains"],
         }
+
+
+class TaskFilters(django_filters.FilterSet):
+    class Meta:
+        model = Task
+        fields = {
+            "name": ["exact"],
+            "status": ["exact"],
+            "created_at": ["exact", "lte", "gte", "range"],
+        }
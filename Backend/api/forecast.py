@@ -0,0 +1,243 @@
+import datetime
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+import numpy as np
+from django.conf import settings
+from django.db import connections
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from . import rankings
+from .cache import reference_cache
+from .models import Inventory, ProductSalesDay, ReorderSuggestion, Store
+
+
+def store_chunks(chunk_size):
+    """
+    Lists of up to ``chunk_size`` store ids covering every store.
+    """
+    ids = list(Store.objects.order_by("id").values_list("id", flat=True))
+    return [ids[index : index + chunk_size] for index in range(0, len(ids), chunk_size)]
+
+
+def smooth(demand, alpha):
+    """
+    Simple exponential smoothing of every series of ``demand`` (days x
+    series) at once, one vectorized step per day. Returns the smoothed daily
+    demand of each series and the standard deviation of its one-day-ahead
+    errors.
+    """
+    level = demand[:7].mean(axis=0)
+    squared = np.zeros_like(level)
+    error = np.empty_like(level)
+    for day in demand:
+        np.subtract(day, level, out=error)
+        squared += error * error
+        level += alpha * error
+    return level, np.sqrt(squared / max(len(demand), 1))
+
+
+def suggest(demand, on_hand):
+    """
+    ``(daily demand, reorder level, reorder quantity)`` of every series: reorder
+    at the demand expected over ``FORECAST["LEAD_TIME_DAYS"]`` plus safety
+    stock for ``FORECAST["SERVICE_Z"]`` standard deviations, up to what's
+    expected over the lead time and ``FORECAST["REVIEW_DAYS"]``. Series above
+    their reorder level get a quantity of 0.
+    """
+    options = settings.FORECAST
+    level, sigma = smooth(demand, options["ALPHA"])
+    z, lead = options["SERVICE_Z"], options["LEAD_TIME_DAYS"]
+    cover = lead + options["REVIEW_DAYS"]
+    reorder_level = np.ceil(level * lead + z * sigma * math.sqrt(lead))
+    order_up_to = np.ceil(level * cover + z * sigma * math.sqrt(cover))
+    quantity = np.where(
+        on_hand <= reorder_level, np.maximum(order_up_to - on_hand, 0), 0
+    )
+    return level, reorder_level.astype(np.int64), quantity.astype(np.int64)
+
+
+def daily_demand(store_ids, keys, start, days):
+    """
+    Units sold per day (days x series) from the date ``start`` on, for the
+    ``(store id << 32) | product id`` series in sorted ``keys``, read from the
+    daily totals ``refresh_rankings`` keeps.
+    """
+    rows = list(
+        ProductSalesDay.objects.filter(
+            store_id__in=store_ids,
+            day__gte=start,
+            day__lt=start + datetime.timedelta(days=days),
+        ).values_list("store_id", "product_id", "day", "quantity")
+    )
+    demand = np.zeros((days, len(keys)), dtype=np.float32)
+    if not rows:
+        return demand
+    store, product, day, sold = zip(*rows)
+    row_keys = np.array(store, dtype=np.int64) << 32 | np.array(product)
+    day = (np.array(day, dtype="datetime64[D]") - np.datetime64(start, "D")).astype(
+        np.int64
+    )
+    positions = np.minimum(np.searchsorted(keys, row_keys), len(keys) - 1)
+    # Products sold but no longer stocked get no suggestion
+    stocked = keys[positions] == row_keys
+    np.add.at(demand, (day[stocked], positions[stocked]), np.array(sold)[stocked])
+    return demand
+
+
+def write_levels(store_ids, keys, levels, now):
+    """
+    Set ``Inventory.reorder_level`` of the rows of the ``(store id << 32) |
+    product id`` series in sorted ``keys`` to their forecast ``levels``, with
+    one UPDATE per distinct level over the rows not there yet. The version is
+    bumped like any other write. Returns the number of rows changed.
+    """
+    rows = list(
+        Inventory.objects.filter(store_id__in=store_ids).values_list(
+            "id", "store_id", "product_id", "reorder_level"
+        )
+    )
+    if not rows or not len(keys):
+        return 0
+    pk, store, product, current = np.array(rows, dtype=np.int64).T
+    row_keys = store << 32 | product
+    positions = np.minimum(np.searchsorted(keys, row_keys), len(keys) - 1)
+    wanted = levels[positions]
+    change = np.flatnonzero((keys[positions] == row_keys) & (wanted != current))
+    # Row ids grouped by their new level
+    change = change[np.argsort(wanted[change], kind="stable")]
+    new_levels, starts = np.unique(wanted[change], return_index=True)
+    groups = np.split(pk[change], starts[1:])
+    changed = dict(zip(new_levels.tolist(), (ids.tolist() for ids in groups)))
+    for level, ids in changed.items():
+        Inventory.objects.filter(id__in=ids).update(
+            reorder_level=level, version=F("version") + 1, updated_at=now
+        )
+    if changed:
+        reference_cache.bump("inventory")
+    return sum(map(len, changed.values()))
+
+
+def forecast_stores(store_ids, today=None):
+    """
+    Forecast the demand of every product stocked by ``store_ids`` from their
+    last ``FORECAST["HISTORY_DAYS"]`` complete days of sales. The suggested
+    reorder level replaces ``Inventory.reorder_level`` of every product sold
+    in that time; products without sales keep theirs. ReorderSuggestion rows
+    are written for the products to reorder only, and the chunk's other rows
+    are deleted. Returns the number of suggestions written.
+    """
+    options = settings.FORECAST
+    today = today or timezone.localdate()
+    days = options["HISTORY_DAYS"]
+    start = today - datetime.timedelta(days=days)
+
+    stock = list(
+        Inventory.objects.filter(store_id__in=store_ids)
+        .values("store_id", "product_id")
+        .annotate(on_hand=Sum("quantity"))
+        .values_list("store_id", "product_id", "on_hand")
+        .order_by("store_id", "product_id")
+    )
+    computed_at = timezone.now()
+    written = 0
+    if stock:
+        stock = np.array(stock, dtype=np.int64)
+        keys = stock[:, 0] << 32 | stock[:, 1]
+        demand = daily_demand(store_ids, keys, start, days)
+        level, reorder_level, quantity = suggest(demand, stock[:, 2])
+        sold = demand.any(axis=0)
+        write_levels(store_ids, keys[sold], reorder_level[sold], computed_at)
+        to_order = np.flatnonzero(quantity)
+        written = len(to_order)
+        columns = zip(
+            *stock[to_order].T.tolist(),
+            level[to_order].tolist(),
+            reorder_level[to_order].tolist(),
+            quantity[to_order].tolist(),
+        )
+        ReorderSuggestion.objects.bulk_create(
+            (
+                ReorderSuggestion(
+                    store_id=store,
+                    product_id=product,
+                    on_hand=on_hand,
+                    daily_demand=round(units, 3),
+                    reorder_level=reorder_at,
+                    reorder_quantity=to_order,
+                    computed_at=computed_at,
+                )
+                for store, product, on_hand, units, reorder_at, to_order in columns
+            ),
+            batch_size=options["BATCH_SIZE"],
+            update_conflicts=True,
+            unique_fields=["store", "product"],
+            update_fields=[
+                "on_hand",
+                "daily_demand",
+                "reorder_level",
+                "reorder_quantity",
+                "computed_at",
+            ],
+        )
+    # Products no longer to reorder or no longer stocked
+    ReorderSuggestion.objects.filter(
+        store_id__in=store_ids, computed_at__lt=computed_at
+    ).delete()
+    return written
+
+
+def forecast_chunk(store_ids):
+    """
+    ``forecast_stores`` for a process pool.
+    """
+    try:
+        return forecast_stores(store_ids)
+    finally:
+        # Pool workers keep running between chunks; don't hold connections idle
+        connections.close_all()
+
+
+def forecast_all(workers=None, chunk_stores=None):
+    """
+    Bring the daily totals up to date with ``refresh_rankings``, then run
+    ``forecast_stores`` over every store, ``chunk_stores`` (default
+    ``FORECAST["CHUNK_STORES"]``) at a time, spread over ``workers`` (default
+    ``FORECAST["WORKERS"]``) processes; 1 runs them in this process. Returns
+    ``(suggestions written, chunks)``.
+    """
+    options = settings.FORECAST
+    workers = workers or options["WORKERS"]
+    rankings.refresh()
+    # Days the next forecasts no longer fit
+    history = timezone.localdate() - datetime.timedelta(days=options["HISTORY_DAYS"])
+    ProductSalesDay.objects.filter(day__lt=history).delete()
+    chunks = store_chunks(chunk_stores or options["CHUNK_STORES"])
+    if workers == 1:
+        return sum(forecast_stores(store_ids) for store_ids in chunks), len(chunks)
+    # Forked workers must not share the parent's database connections
+    connections.close_all()
+    with ProcessPoolExecutor(workers, initializer=django.setup) as pool:
+        return sum(pool.map(forecast_chunk, chunks)), len(chunks)
+
+
+def bench_chunk(stores, products, seed):
+    """
+    Seconds ``suggest`` takes for ``stores`` x ``products`` series of
+    synthetic demand, plus the seconds spent generating it. The fit costs the
+    same whatever the values, so a rate per series times uniform noise will
+    do (it is far cheaper to draw than Poisson counts).
+    """
+    started = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    series = stores * products
+    rates = rng.gamma(0.5, 4.0, series).astype(np.float32)
+    demand = rng.random((settings.FORECAST["HISTORY_DAYS"], series), np.float32)
+    np.floor(demand * rates, out=demand)
+    on_hand = rng.integers(0, 50, series)
+    generated = time.perf_counter()
+    suggest(demand, on_hand)
+    return time.perf_counter() - generated, generated - started
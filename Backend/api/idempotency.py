@@ -0,0 +1,142 @@
+import datetime
+import hashlib
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from .models import IdempotencyKey
+
+HEADER = "Idempotency-Key"
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+# Response headers replayed with the stored body
+KEPT_HEADERS = ("Content-Type", "Location", "ETag")
+
+
+def fingerprint(request):
+    digest = hashlib.sha256()
+    for part in (request.method, request.get_full_path()):
+        digest.update(part.encode())
+        digest.update(b"\0")
+    digest.update(request.body)
+    return digest.hexdigest()
+
+
+def request_user_id(request):
+    """
+    The id of the user the API would authenticate ``request`` as, or None.
+    """
+    drf_request = Request(
+        request,
+        authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES],
+    )
+    try:
+        user = drf_request.user
+    except APIException:
+        return None
+    return user.pk if user and user.is_authenticated else None
+
+
+@contextmanager
+def key_lock(user_id, key):
+    """
+    Serialize requests carrying the same key with a PostgreSQL session
+    advisory lock: no row or transaction is held while the view runs, and the
+    lock goes away with the connection if the process dies. Other databases
+    run duplicates unlocked.
+    """
+    if connection.vendor != "postgresql":
+        yield
+        return
+    digest = hashlib.sha256(f"{user_id}:{key}".encode()).digest()
+    lock_id = int.from_bytes(digest[:8], "big", signed=True)
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_lock(%s)", [lock_id])
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", [lock_id])
+
+
+def expiry_cutoff():
+    return timezone.now() - datetime.timedelta(seconds=settings.IDEMPOTENCY["TTL"])
+
+
+def replay(stored):
+    response = HttpResponse(bytes(stored.body), status=stored.status_code)
+    for name, value in stored.headers.items():
+        response[name] = value
+    response["Idempotent-Replayed"] = "true"
+    return response
+
+
+def purge_expired():
+    deleted, _ = IdempotencyKey.objects.filter(created_at__lt=expiry_cutoff()).delete()
+    return deleted
+
+
+class IdempotencyMiddleware:
+    """
+    Make writes sent with an ``Idempotency-Key`` header safe to retry.
+
+    The first request with a key runs normally and, if it succeeds (2xx), its
+    response is stored for ``IDEMPOTENCY["TTL"]`` seconds together with a
+    fingerprint of the request. Retries get the stored response back without
+    running the view again; a retry still in flight when the first finishes
+    waits on the key's lock instead of running in parallel. Reusing a key for
+    a different request is a 422. Keys are scoped to the authenticated user;
+    anonymous requests pass through untouched.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        key = request.headers.get(HEADER)
+        if not key or request.method not in WRITE_METHODS:
+            return self.get_response(request)
+        if len(key) > IdempotencyKey._meta.get_field("key").max_length:
+            return JsonResponse({"detail": f"{HEADER} is too long."}, status=400)
+        # Read the body before authentication can consume the stream
+        request_fingerprint = fingerprint(request)
+        user_id = request_user_id(request)
+        if user_id is None:
+            return self.get_response(request)
+
+        with key_lock(user_id, key):
+            stored = IdempotencyKey.objects.filter(
+                user_id=user_id, key=key, created_at__gte=expiry_cutoff()
+            ).first()
+            if stored is not None:
+                if stored.fingerprint != request_fingerprint:
+                    return JsonResponse(
+                        {"detail": f"{HEADER} was already used for another request."},
+                        status=422,
+                    )
+                return replay(stored)
+
+            response = self.get_response(request)
+            # Failed writes changed nothing, so retrying them is safe
+            if 200 <= response.status_code < 300 and not response.streaming:
+                IdempotencyKey.objects.update_or_create(
+                    user_id=user_id,
+                    key=key,
+                    defaults={
+                        "fingerprint": request_fingerprint,
+                        "status_code": response.status_code,
+                        "headers": {
+                            name: response[name]
+                            for name in KEPT_HEADERS
+                            if response.has_header(name)
+                        },
+                        "body": response.content,
+                        "created_at": timezone.now(),
+                    },
+                )
+            return response
@@ -0,0 +1,87 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from api.advisor import TARGETS, advise, migration_stub, seed, unique_proposals
+
+
+class Command(BaseCommand):
+    help = (
+        "EXPLAIN (ANALYZE, BUFFERS) every declared filter and ordering of the "
+        "sales, inventory and product listings, flag sequential scans and sorts "
+        "over --min-rows rows and propose indexes as a migration stub."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--target",
+            action="append",
+            choices=[name for name, *_ in TARGETS],
+            help="Only check these listings (repeatable).",
+        )
+        parser.add_argument(
+            "--min-rows",
+            type=int,
+            default=10000,
+            help="Flag scans and sorts of at least this many rows (default 10000).",
+        )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=0,
+            metavar="SALES",
+            help="Run against this many synthetic sales (plus stores, products "
+            "and inventory) inserted in a transaction that is rolled back.",
+        )
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="List every combination, not only the flagged ones.",
+        )
+        parser.add_argument(
+            "--output",
+            help="Write the proposed migration here instead of printing it.",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("The index advisor needs PostgreSQL.")
+        with transaction.atomic():
+            if options["seed"]:
+                self.stdout.write(f"Seeding {options['seed']} sales...")
+                seed(options["seed"])
+            findings = advise(options["min_rows"], options["target"])
+            # Never keep the seeded rows
+            transaction.set_rollback(True)
+
+        flagged = [finding for finding in findings if finding.problems]
+        for finding in findings if options["all"] else flagged:
+            params = "&".join(f"{key}={value}" for key, value in finding.params.items())
+            scope = " (one store)" if finding.scoped else ""
+            self.stdout.write(
+                f"{finding.target}?{params}{scope}: {finding.milliseconds:.2f} ms"
+            )
+            for problem in finding.problems:
+                self.stdout.write(self.style.WARNING(f"    {problem}"))
+            for model, index in finding.proposals:
+                self.stdout.write(f"    -> {model.__name__}: {index!r}")
+
+        proposals = unique_proposals(findings)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{len(findings)} combinations, {len(flagged)} flagged, "
+                f"{len(proposals)} indexes proposed"
+            )
+        )
+        if not proposals:
+            return
+        stub = migration_stub(proposals)
+        if options["output"]:
+            with open(options["output"], "w") as out:
+                out.write(stub)
+            self.stdout.write(
+                f"Migration stub written to {os.path.abspath(options['output'])}"
+            )
+        else:
+            self.stdout.write(stub)
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from api.archive import archive_dir, archive_month
+from api.models import Sales
+from api.partitions import add_months, month_start
+
+
+class Command(BaseCommand):
+    help = (
+        "Move sales (and their items) older than --months months out of the "
+        "database into gzipped NDJSON files under SALES_ARCHIVE['DIR']. The "
+        "API keeps serving them when a date filter reaches that far back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--months", type=int, required=True)
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        if options["months"] < 1:
+            raise CommandError("--months must be at least 1.")
+        cutoff = add_months(month_start(timezone.now()), -options["months"])
+        oldest = (
+            Sales.objects.filter(created_at__lt=cutoff)
+            .order_by("created_at")
+            .values_list("created_at", flat=True)
+            .first()
+        )
+        if oldest is None:
+            self.stdout.write("Nothing to archive.")
+            return
+
+        month = month_start(oldest)
+        while month < cutoff:
+            if options["dry_run"]:
+                count = Sales.objects.filter(
+                    created_at__gte=month, created_at__lt=add_months(month, 1)
+                ).count()
+                self.stdout.write(f"would archive {month:%Y-%m}: {count} sales")
+            else:
+                try:
+                    entry = archive_month(month, options["batch_size"])
+                except ValueError as error:
+                    raise CommandError(str(error))
+                if entry:
+                    self.stdout.write(
+                        f"archived {month:%Y-%m}: {entry['sales']} sales, "
+                        f"{entry['items']} items"
+                    )
+            month = add_months(month, 1)
+
+        self.stdout.write(self.style.SUCCESS(f"Archive: {archive_dir()}"))
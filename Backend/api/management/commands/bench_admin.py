@@ -0,0 +1,92 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from api.advisor import busiest_store, seed
+from api.models import StoreAdmin
+
+# Changelist -> the store filter's parameter
+CHANGELISTS = {
+    "sales": "store__id__exact",
+    "salesitems": "sales__store__id__exact",
+    "inventory": "store__id__exact",
+    "inventorymovement": "inventory__store__id__exact",
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the admin changelists of the large tables (unfiltered, by store, "
+        "drilled down to this year and on page 5) against "
+        "ADMIN_PERFORMANCE['BUDGET_MS']."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=0,
+            metavar="SALES",
+            help="Run against this many synthetic sales inserted in a "
+            "transaction that is rolled back.",
+        )
+
+    def handle(self, *args, **options):
+        user = StoreAdmin.objects.filter(is_superuser=True).first()
+        if user is None:
+            raise CommandError("No superuser to open the admin as.")
+        budget = settings.ADMIN_PERFORMANCE["BUDGET_MS"]
+        over = []
+
+        with transaction.atomic():
+            if options["seed"]:
+                self.stdout.write(f"Seeding {options['seed']} sales...")
+                seed(options["seed"])
+            store_id = busiest_store()
+            client = Client()
+            client.force_login(user)
+
+            self.stdout.write(f"{'ms':>8}{'queries':>9}  changelist")
+            with override_settings(ALLOWED_HOSTS=["testserver"]):
+                for model, store_param in CHANGELISTS.items():
+                    url = reverse(f"admin:api_{model}_changelist")
+                    for query in (
+                        "",
+                        f"{store_param}={store_id}",
+                        f"created_at__year={timezone.now().year}",
+                        "p=5",
+                    ):
+                        path = f"{url}?{query}" if query else url
+                        elapsed, queries = self.time(client, path, options["repeat"])
+                        self.stdout.write(f"{elapsed:>8.1f}{queries:>9}  {path}")
+                        if elapsed > budget:
+                            over.append(path)
+            # Never keep the seeded rows
+            transaction.set_rollback(True)
+
+        if over:
+            raise CommandError(f"{len(over)} changelists took over {budget} ms.")
+        self.stdout.write(self.style.SUCCESS(f"All within {budget} ms"))
+
+    def time(self, client, path, repeat):
+        """
+        Median ms of ``repeat`` GETs of ``path`` and the queries one runs.
+        """
+        times = []
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = client.get(path)
+                times.append((time.perf_counter() - started) * 1000)
+            # A bad page number or filter redirects to ?e=1
+            if response.status_code != 200:
+                raise CommandError(f"GET {path} returned {response.status_code}.")
+        return statistics.median(times), len(queries)
@@ -0,0 +1,132 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from api.advisor import seed
+from api.forecast import bench_chunk, forecast_stores
+from api.models import Inventory
+from api.rankings import accumulate
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the vectorized forecast (api/forecast.py) over --stores x "
+        "--products series of synthetic daily demand, FORECAST['HISTORY_DAYS'] "
+        "days each, a chunk of stores per worker process. With --db-stores, "
+        "also time forecast_stores end to end (daily totals, fit and "
+        "writes) on seeded stores and project it to --stores x --products."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--stores", type=int, default=10000)
+        parser.add_argument("--products", type=int, default=10000)
+        parser.add_argument(
+            "--chunk-stores",
+            type=int,
+            default=settings.FORECAST["CHUNK_STORES"],
+            help="Stores fitted together (default FORECAST['CHUNK_STORES']).",
+        )
+        parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1))
+        parser.add_argument(
+            "--db-stores",
+            type=int,
+            default=0,
+            metavar="STORES",
+            help="Seed this many stores, in a transaction that is rolled back, "
+            "and time forecast_stores on them as one chunk.",
+        )
+        parser.add_argument(
+            "--db-sales",
+            type=int,
+            default=100000,
+            help="Sales seeded over the --db-stores (default 100000).",
+        )
+
+    def handle(self, *args, **options):
+        stores, chunk = options["stores"], options["chunk_stores"]
+        if min(stores, options["products"], chunk, options["workers"]) < 1:
+            raise CommandError("All options must be positive.")
+        sizes = [min(chunk, stores - first) for first in range(0, stores, chunk)]
+
+        started = time.perf_counter()
+        with ProcessPoolExecutor(options["workers"], initializer=django.setup) as pool:
+            results = list(
+                pool.map(
+                    bench_chunk,
+                    sizes,
+                    [options["products"]] * len(sizes),
+                    range(len(sizes)),
+                )
+            )
+        elapsed = time.perf_counter() - started
+
+        series = stores * options["products"]
+        fitted = sum(fit for fit, _ in results)
+        generated = sum(generate for _, generate in results)
+        self.stdout.write(
+            f"{series:,} series x {settings.FORECAST['HISTORY_DAYS']} days in "
+            f"{len(sizes)} chunks on {options['workers']} workers\n"
+            f"  fitting    {fitted:8.1f}s of worker time "
+            f"({series / fitted if fitted else 0:,.0f} series/s per worker)\n"
+            f"  generating {generated:8.1f}s of worker time (synthetic data)"
+        )
+        if options["db_stores"] > 0:
+            self.bench_database(options)
+        self.stdout.write(self.style.SUCCESS(f"Fitted in {elapsed:.1f}s wall time"))
+
+    def bench_database(self, options):
+        """
+        Time two runs of forecast_stores over freshly seeded stores: the first
+        inserts its suggestions, the second upserts over them like a daily
+        run does.
+        """
+        with transaction.atomic():
+            self.stdout.write(
+                f"Seeding {options['db_sales']} sales in "
+                f"{options['db_stores']} stores..."
+            )
+            store_ids = [
+                store.id
+                for store in seed(
+                    options["db_sales"],
+                    stores=options["db_stores"],
+                    products=options["products"],
+                    days=settings.FORECAST["HISTORY_DAYS"],
+                )
+            ]
+            started = time.perf_counter()
+            accumulate(None, timezone.now())
+            self.stdout.write(
+                f"  rollup     {time.perf_counter() - started:8.1f}s counting every "
+                "seeded sale into the daily totals (a daily run adds one day)"
+            )
+            pairs = (
+                Inventory.objects.filter(store_id__in=store_ids)
+                .values("store_id", "product_id")
+                .distinct()
+                .count()
+            )
+            for run in ("first", "second"):
+                started = time.perf_counter()
+                written = forecast_stores(store_ids)
+                seconds = time.perf_counter() - started
+                self.stdout.write(
+                    f"  database   {seconds:8.1f}s {run} run over {pairs:,} stocked "
+                    f"pairs ({pairs / seconds:,.0f} pairs/s), {written:,} "
+                    "suggestions written"
+                )
+            # Never keep the seeded rows
+            transaction.set_rollback(True)
+
+        series = options["stores"] * options["products"]
+        self.stdout.write(
+            f"  projected  {series / (pairs / seconds) / options['workers']:8.1f}s "
+            f"wall time for {series:,} stocked pairs on {options['workers']} "
+            "workers at that rate"
+        )
@@ -0,0 +1,83 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.migrations.exceptions import AmbiguityError
+from django.db.migrations.executor import MigrationExecutor
+
+from api.advisor import benchmark, busiest_store, seed
+
+
+class Command(BaseCommand):
+    help = (
+        "EXPLAIN ANALYZE the store-scoped sales and inventory queries and report "
+        "their execution time and the indexes they scan. With --baseline, "
+        "compare against the indexes of an earlier api migration."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=0,
+            metavar="SALES",
+            help="Run against this many synthetic sales (plus stores, products "
+            "and inventory) inserted in a transaction that is rolled back.",
+        )
+        parser.add_argument(
+            "--store",
+            type=int,
+            help="Store to query (default: the one with the most sales).",
+        )
+        parser.add_argument(
+            "--baseline",
+            metavar="MIGRATION",
+            help="Also measure with the api app migrated back to this migration "
+            "(e.g. 0006), inside the rolled back transaction.",
+        )
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("The index benchmark needs PostgreSQL.")
+        executor = MigrationExecutor(connection)
+        if options["baseline"]:
+            try:
+                baseline = executor.loader.get_migration_by_prefix(
+                    "api", options["baseline"]
+                )
+            except (AmbiguityError, KeyError) as error:
+                raise CommandError(error)
+
+        with transaction.atomic():
+            if options["seed"]:
+                self.stdout.write(f"Seeding {options['seed']} sales...")
+                seed(options["seed"])
+            store_id = options["store"] or busiest_store()
+            if store_id is None:
+                raise CommandError("No sales to query; seed the database first.")
+            current = benchmark(store_id, options["repeat"])
+            before = None
+            if options["baseline"]:
+                # Schema changes are transactional on PostgreSQL, but can't
+                # run with the seeded rows' foreign key checks still deferred
+                connection.check_constraints()
+                executor.migrate([("api", baseline.name)])
+                with connection.cursor() as cursor:
+                    cursor.execute("ANALYZE")
+                before = benchmark(store_id, options["repeat"])
+            # Never keep the seeded rows or the reverted schema
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"Store {store_id}")
+        for position, (label, milliseconds, scans) in enumerate(current):
+            if before is None:
+                self.stdout.write(f"{label}: {milliseconds:.2f} ms")
+                self.stdout.write(f"    {', '.join(scans)}")
+                continue
+            _, baseline_ms, baseline_scans = before[position]
+            self.stdout.write(
+                f"{label}: {baseline_ms:.2f} ms -> {milliseconds:.2f} ms "
+                f"({baseline_ms / max(milliseconds, 0.001):.1f}x)"
+            )
+            self.stdout.write(f"    {baseline.name}: {', '.join(baseline_scans)}")
+            self.stdout.write(f"    current: {', '.join(scans)}")
+        self.stdout.write(self.style.SUCCESS(f"{len(current)} queries measured"))
@@ -0,0 +1,59 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from api.fastpath import GRAND_TOTAL, get_plan
+from api.models import Sales
+from api.renderers import FastJSONRenderer
+from api.serializers import SalesReadSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare serialization CPU time per 1k sales between SalesReadSerializer "
+        "and the compiled read plan (api/fastpath.py)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sales", type=int, default=1000)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        count = options["sales"]
+        ids = list(Sales.objects.order_by("id").values_list("id", flat=True)[:count])
+        if not ids:
+            raise CommandError("No sales to serialize; seed the database first.")
+
+        queryset = Sales.objects.filter(id__in=ids).order_by("id")
+        plan = get_plan(SalesReadSerializer, {"grand_total": GRAND_TOTAL})
+
+        def serializer_path():
+            rows = queryset.prefetch_related("sales_item", "sales_item__product")
+            return JSONRenderer().render(SalesReadSerializer(rows, many=True).data)
+
+        def fast_path():
+            return FastJSONRenderer().render(plan.render(plan.values(queryset)))
+
+        if (
+            JSONRenderer().render(plan.render(plan.values(queryset)))
+            != serializer_path()
+        ):
+            raise CommandError("Fast path output differs from SalesReadSerializer.")
+
+        results = {}
+        for name, run in (("serializer", serializer_path), ("fast path", fast_path)):
+            run()  # warm up caches and the plan
+            best = None
+            for _ in range(options["repeat"]):
+                started = time.process_time()
+                run()
+                elapsed = time.process_time() - started
+                best = elapsed if best is None else min(best, elapsed)
+            results[name] = best * 1000 * 1000 / len(ids)
+            self.stdout.write(f"{name:<12} {results[name]:8.1f} ms CPU per 1k sales")
+
+        speedup = results["serializer"] / results["fast path"]
+        self.stdout.write(
+            self.style.SUCCESS(f"{len(ids)} sales, fast path {speedup:.1f}x faster")
+        )
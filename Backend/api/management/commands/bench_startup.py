@@ -0,0 +1,60 @@
+import statistics
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.authentication import StoreTokenObtainPairSerializer
+from api.models import StoreAdmin
+from api.startup import first_request
+
+
+class Command(BaseCommand):
+    help = (
+        "Start --runs fresh worker processes, with and without the preload "
+        "hook (api/startup.py), and report the median time to boot and to "
+        "serve the first and second request."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=5)
+        parser.add_argument(
+            "--path", default="/api/products/", help="GET this path (an API list)."
+        )
+        parser.add_argument(
+            "--user", help="Authenticate as this user (default: the first store admin)."
+        )
+
+    def handle(self, *args, **options):
+        users = StoreAdmin.objects.order_by("id")
+        user = (
+            users.filter(username=options["user"]).first()
+            if options["user"]
+            else users.filter(store__isnull=False).first()
+        )
+        if user is None:
+            raise CommandError("No user to authenticate as.")
+        token = str(StoreTokenObtainPairSerializer.get_token(user).access_token)
+
+        self.stdout.write(
+            f"{'':<10}{'boot':>9}{'preload':>9}{'1st req':>9}{'2nd req':>9}"
+            f"{'to 1st':>9}  (median ms of {options['runs']} workers)"
+        )
+        for name, preloaded in (("cold", False), ("preloaded", True)):
+            runs = [
+                first_request(options["path"], token, preloaded)
+                for _ in range(options["runs"])
+            ]
+            if runs[0]["status"] != 200:
+                raise CommandError(
+                    f"GET {options['path']} returned {runs[0]['status']}."
+                )
+            for run in runs:
+                run["total"] = run["boot"] + run["preload"] + run["first"]
+            median = {
+                key: statistics.median(run[key] for run in runs) * 1000
+                for key in ("boot", "preload", "first", "second", "total")
+            }
+            self.stdout.write(
+                f"{name:<10}{median['boot']:>9.1f}{median['preload']:>9.1f}"
+                f"{median['first']:>9.1f}{median['second']:>9.1f}{median['total']:>9.1f}"
+            )
+        self.stdout.write(self.style.SUCCESS("Done"))
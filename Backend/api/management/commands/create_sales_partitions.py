@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from api.partitions import ensure_partitions
+
+
+class Command(BaseCommand):
+    help = (
+        "Create the monthly Sales/SalesItems partitions for the coming months. "
+        "Rows dated past the last partition are rejected, so run this regularly "
+        "(e.g. from cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--months",
+            type=int,
+            default=3,
+            help="How many months past the current one to cover.",
+        )
+
+    def handle(self, *args, **options):
+        created = ensure_partitions(options["months"])
+        for name in created:
+            self.stdout.write(f"created {name}")
+        self.stdout.write(self.style.SUCCESS(f"{len(created)} partition(s) created"))
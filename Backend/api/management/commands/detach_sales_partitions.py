@@ -0,0 +1,71 @@
+import datetime
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.partitions import (
+    PARTITIONED_MODELS,
+    archive_table,
+    detach_partition,
+    drop_table,
+    is_empty,
+    is_partitioned,
+    list_partitions,
+    month_start,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Detach the Sales/SalesItems partitions that end on or before --before, "
+        "optionally dumping them to gzipped CSV and dropping them. Once "
+        "archive_sales has emptied old months, --drop alone reclaims them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--before", required=True, help="Month as YYYY-MM.")
+        parser.add_argument("--archive-dir", help="Write each partition here first.")
+        parser.add_argument(
+            "--drop",
+            action="store_true",
+            help=(
+                "Drop the detached partitions. Partitions that still hold rows "
+                "are only dropped with --archive-dir."
+            ),
+        )
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        try:
+            before = month_start(datetime.datetime.strptime(options["before"], "%Y-%m"))
+        except ValueError:
+            raise CommandError("--before must look like YYYY-MM.")
+        archive_dir = options["archive_dir"]
+        if archive_dir:
+            os.makedirs(archive_dir, exist_ok=True)
+
+        for model in PARTITIONED_MODELS:
+            table = model._meta.db_table
+            if not is_partitioned(table):
+                raise CommandError(f"{table} is not partitioned.")
+            for name, upper in list_partitions(table):
+                if upper > before:
+                    break
+                if options["dry_run"]:
+                    self.stdout.write(f"would detach {name}")
+                    continue
+                # Detach first: the detached table no longer takes part in
+                # queries, so archiving it doesn't hold up the live table.
+                detach_partition(table, name)
+                self.stdout.write(f"detached {name}")
+                if archive_dir:
+                    path = os.path.join(archive_dir, f"{name}.csv.gz")
+                    archive_table(name, path)
+                    self.stdout.write(f"archived {name} to {path}")
+                if not options["drop"]:
+                    continue
+                if archive_dir or is_empty(name):
+                    drop_table(name)
+                    self.stdout.write(f"dropped {name}")
+                else:
+                    self.stdout.write(f"kept {name}: not empty and not archived")
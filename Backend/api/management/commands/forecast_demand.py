@@ -0,0 +1,43 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.forecast import forecast_all
+
+
+class Command(BaseCommand):
+    help = (
+        "Fit every stocked product's daily sales with exponential smoothing, "
+        "set Inventory.reorder_level of the products sold to the suggested "
+        "level and write reorder suggestions for those at or below it, a "
+        "chunk of stores per worker process. The daily sales totals are "
+        "brought up to date first, like refresh_rankings does. Run it daily."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-stores",
+            type=int,
+            default=settings.FORECAST["CHUNK_STORES"],
+            help="Stores fitted together (default FORECAST['CHUNK_STORES']).",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=settings.FORECAST["WORKERS"],
+            help="Worker processes; 1 runs the chunks in this process.",
+        )
+
+    def handle(self, *args, **options):
+        if options["chunk_stores"] < 1 or options["workers"] < 1:
+            raise CommandError("--chunk-stores and --workers must be positive.")
+        started = time.perf_counter()
+        written, chunks = forecast_all(options["workers"], options["chunk_stores"])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{written} suggestions for {chunks} chunks of stores in "
+                f"{elapsed:.2f}s"
+            )
+        )
@@ -0,0 +1,81 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from api.reconcile import id_chunks, reconcile_chunk, reconcile_chunk_in_worker
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute Sales.total_quantity/total_price/total_tax from SalesItems "
+        "with one aggregate query per id-range chunk, spread over a process "
+        "pool. Reports mismatches and, with --fix, bulk_updates them. Also "
+        "reports items whose sale no longer exists; those are never deleted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=10000)
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=min(4, os.cpu_count() or 1),
+            help="Worker processes; 1 runs the chunks in this process.",
+        )
+        parser.add_argument("--fix", action="store_true")
+        parser.add_argument(
+            "--show", type=int, default=20, help="Mismatches to print (default 20)."
+        )
+
+    def handle(self, *args, **options):
+        if options["chunk_size"] < 1 or options["workers"] < 1:
+            raise CommandError("--chunk-size and --workers must be positive.")
+        started = time.perf_counter()
+        chunks = id_chunks(options["chunk_size"])
+        checked = mismatched = orphaned = 0
+
+        def report(result):
+            nonlocal checked, mismatched, orphaned
+            count, mismatches, orphans = result
+            for pk, stored, expected in mismatches[
+                : max(options["show"] - mismatched, 0)
+            ]:
+                self.stdout.write(
+                    f"sale {pk}: stored {' / '.join(map(str, stored))}, "
+                    f"items give {' / '.join(map(str, expected))}"
+                )
+            for item_id, sales_id in orphans[: max(options["show"] - orphaned, 0)]:
+                self.stdout.write(f"item {item_id}: sale {sales_id} does not exist")
+            checked += count
+            mismatched += len(mismatches)
+            orphaned += len(orphans)
+
+        if options["workers"] == 1:
+            for low, high in chunks:
+                report(reconcile_chunk(low, high, options["fix"]))
+        else:
+            # Forked workers must not share the parent's database connections
+            connections.close_all()
+            with ProcessPoolExecutor(
+                options["workers"], initializer=django.setup
+            ) as pool:
+                futures = [
+                    pool.submit(reconcile_chunk_in_worker, low, high, options["fix"])
+                    for low, high in chunks
+                ]
+                for future in as_completed(futures):
+                    report(future.result())
+
+        elapsed = time.perf_counter() - started
+        rate = checked / elapsed if elapsed else 0
+        action = "fixed" if options["fix"] else "found"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{checked} sales in {len(chunks)} chunks, {elapsed:.2f}s "
+                f"({rate:,.0f} rows/s), {mismatched} mismatches {action}, "
+                f"{orphaned} orphaned items"
+            )
+        )
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.analytics import compact, refresh, refreshed_until, store_dir
+
+
+class Command(BaseCommand):
+    help = (
+        "Append sales items created since the last run to the columnar "
+        "analytics store behind /api/reports/analytics/. Run it periodically."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help="Re-extract everything, picking up updated and deleted rows.",
+        )
+        parser.add_argument(
+            "--compact", action="store_true", help="Merge segments afterwards."
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        count = refresh(rebuild=options["rebuild"])
+        if options["compact"]:
+            compact()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{count} rows added in {elapsed:.1f}s; {store_dir()} is complete "
+                f"up to {refreshed_until()}"
+            )
+        )
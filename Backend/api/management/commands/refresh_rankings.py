@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.rankings import get_ranking, refresh
+
+
+class Command(BaseCommand):
+    help = (
+        "Add sales items created since the last run to the monthly product "
+        "totals and re-rank the stores behind /api/store/{id}/top-products/ "
+        "and /api/reports/top-products/. Run it periodically."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help="Recount every live sales item, picking up updated and deleted rows.",
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        stores = refresh(rebuild=options["rebuild"])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{stores} stores re-ranked in {elapsed:.1f}s; rankings count "
+                f"items up to {get_ranking().counted_until}"
+            )
+        )
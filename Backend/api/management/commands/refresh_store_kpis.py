@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.dashboard import rebuild_store_kpis
+
+
+class Command(BaseCommand):
+    help = (
+        "Refresh the sales materialized views and rebuild every store's "
+        "dashboard KPIs. Schedule it every few minutes and just after midnight."
+    )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        count = rebuild_store_kpis()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(f"KPIs of {count} stores rebuilt in {elapsed:.1f}s")
+        )
@@ -0,0 +1,98 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+
+from api.models import OutboxEvent
+from api.outbox import get_sink, purge_published, relay_batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Publish outbox events (api/outbox.py) to the configured sink in "
+        "batches, at least once and in order. Run one relay per database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=settings.OUTBOX["BATCH_SIZE"]
+        )
+        parser.add_argument(
+            "--sink",
+            help="Dotted path of a sink class to use instead of OUTBOX['SINK'] "
+            "(constructed without options).",
+        )
+        parser.add_argument(
+            "--poll", type=float, default=settings.OUTBOX["POLL_SECONDS"]
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once the outbox is drained instead of polling forever.",
+        )
+        parser.add_argument(
+            "--report-every",
+            type=float,
+            default=60,
+            help="Seconds between throughput reports (default 60).",
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be positive.")
+        sink = import_string(options["sink"])() if options["sink"] else get_sink()
+        started = reported = time.perf_counter()
+        published = batches = failures = 0
+        since_report = 0
+        delay = options["poll"]
+
+        def report(now):
+            elapsed = now - reported
+            backlog = OutboxEvent.objects.filter(published_at__isnull=True).count()
+            self.stdout.write(
+                f"{since_report} events in {elapsed:.1f}s "
+                f"({since_report / elapsed if elapsed else 0:,.0f} events/s), "
+                f"{backlog} waiting"
+            )
+
+        purge_published(settings.OUTBOX["KEEP_DAYS"])
+        try:
+            while True:
+                try:
+                    count = relay_batch(sink, options["batch_size"])
+                except Exception as error:
+                    failures += 1
+                    self.stderr.write(
+                        f"Publishing failed, retrying in {delay:.0f}s: {error!r}"
+                    )
+                    time.sleep(delay)
+                    # Back off while the sink is down, up to a minute
+                    delay = min(delay * 2, 60)
+                    continue
+                delay = options["poll"]
+                if count:
+                    published += count
+                    since_report += count
+                    batches += 1
+                elif options["once"]:
+                    break
+                else:
+                    time.sleep(options["poll"])
+
+                now = time.perf_counter()
+                if now - reported >= options["report_every"]:
+                    report(now)
+                    purge_published(settings.OUTBOX["KEEP_DAYS"])
+                    reported, since_report = now, 0
+        except KeyboardInterrupt:
+            pass
+
+        elapsed = time.perf_counter() - started
+        rate = published / elapsed if elapsed else 0
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{published} events in {batches} batches, {elapsed:.2f}s "
+                f"({rate:,.0f} events/s), {failures} failed sends"
+            )
+        )
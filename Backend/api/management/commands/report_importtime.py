@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.startup import by_package, import_times
+
+
+class Command(BaseCommand):
+    help = (
+        "Boot a fresh interpreter under `python -X importtime` (Django setup "
+        "and the URLconf, as a worker does) and report the slowest imports "
+        "and the boot time against STARTUP['IMPORT_BUDGET_MS']."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--top", type=int, default=20, help="Modules and packages listed."
+        )
+        parser.add_argument(
+            "--budget-ms",
+            type=float,
+            help="Fail above this boot time (default STARTUP['IMPORT_BUDGET_MS']).",
+        )
+
+    def handle(self, *args, **options):
+        budget = options["budget_ms"] or settings.STARTUP["IMPORT_BUDGET_MS"]
+        boot_ms, modules = import_times()
+        top = options["top"]
+
+        self.stdout.write(f"{'cumulative ms':>14}  {'own ms':>8}  module")
+        for name, own, cumulative in sorted(modules, key=lambda m: -m[2])[:top]:
+            self.stdout.write(f"{cumulative / 1000:>14.1f}  {own / 1000:>8.1f}  {name}")
+
+        self.stdout.write(f"\n{'own ms':>8}  package")
+        for package, own in by_package(modules)[:top]:
+            self.stdout.write(f"{own / 1000:>8.1f}  {package}")
+
+        self.stdout.write(
+            f"\n{len(modules)} modules; boot took {boot_ms:.0f} ms "
+            f"(budget {budget:.0f} ms)"
+        )
+        if boot_ms > budget:
+            raise CommandError(f"Boot is {boot_ms - budget:.0f} ms over budget.")
+        self.stdout.write(self.style.SUCCESS("Within budget"))
@@ -0,0 +1,105 @@
+import multiprocessing
+import os
+import socket
+import time
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.tasks import claim, execute, requeue_stale
+
+
+class Command(BaseCommand):
+    help = (
+        "Run queued background tasks (api/tasks.py) on a thread or process "
+        "pool. Start as many workers as needed; they share the queue through "
+        "SELECT ... FOR UPDATE SKIP LOCKED."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=settings.TASK_QUEUE["WORKERS"],
+            help="Tasks run at once.",
+        )
+        parser.add_argument(
+            "--processes",
+            action="store_true",
+            help="Run tasks in worker processes instead of threads.",
+        )
+        parser.add_argument(
+            "--poll",
+            type=float,
+            default=settings.TASK_QUEUE["POLL_SECONDS"],
+            help="Seconds to wait between polls while idle.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once no task is due instead of polling forever.",
+        )
+
+    def handle(self, *args, **options):
+        workers = options["workers"]
+        if workers < 1:
+            raise CommandError("--workers must be positive.")
+        name = f"{socket.gethostname()}:{os.getpid()}"
+        if options["processes"]:
+            # Spawned workers start with no inherited database connections
+            pool = ProcessPoolExecutor(
+                workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=django.setup,
+            )
+        else:
+            pool = ThreadPoolExecutor(workers)
+        self.stdout.write(f"Worker {name} running {workers} tasks at once")
+
+        # Future -> id of the task it runs
+        running = {}
+        counts = {"succeeded": 0, "failed": 0}
+        started = time.perf_counter()
+        try:
+            while True:
+                requeue_stale()
+                claimed = claim(name, workers - len(running))
+                running.update(
+                    (pool.submit(execute, task_id), task_id) for task_id in claimed
+                )
+                if not running:
+                    if options["once"]:
+                        break
+                    time.sleep(options["poll"])
+                    continue
+                done, _ = wait(
+                    running, timeout=options["poll"], return_when=FIRST_COMPLETED
+                )
+                for future in done:
+                    task_id = running.pop(future)
+                    try:
+                        counts[future.result()] += 1
+                    except Exception as error:
+                        # Lost between claim and result, e.g. the database
+                        # went away; requeue_stale hands the task out again
+                        counts["failed"] += 1
+                        self.stderr.write(f"Task {task_id} crashed: {error!r}")
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping; waiting for running tasks to finish")
+        finally:
+            pool.shutdown(wait=True)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{counts['succeeded']} tasks succeeded, {counts['failed']} "
+                f"failed or retried in {elapsed:.1f}s"
+            )
+        )
@@ -0,0 +1,113 @@
+import random
+import time
+import uuid
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client, override_settings
+
+from api.authentication import StoreTokenObtainPairSerializer
+from api.models import IdempotencyKey, OutboxEvent, Sales, Store
+
+
+class Command(BaseCommand):
+    help = (
+        "POST checkouts to /api/sales/ in-process, each sent --retries times at "
+        "once with the same Idempotency-Key, and check that every checkout "
+        "created exactly one sale. The sales are deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--checkouts", type=int, default=50)
+        parser.add_argument(
+            "--retries", type=int, default=5, help="Copies sent of each checkout."
+        )
+        parser.add_argument("--threads", type=int, default=16)
+        parser.add_argument(
+            "--store", type=int, help="Store to sell in (default: the first one)."
+        )
+        parser.add_argument(
+            "--no-keys",
+            action="store_true",
+            help="Send without Idempotency-Key, to show the duplicates it prevents.",
+        )
+        parser.add_argument(
+            "--keep", action="store_true", help="Keep the sales that were created."
+        )
+
+    def handle(self, *args, **options):
+        stores = Store.objects.order_by("id")
+        if options["store"]:
+            stores = stores.filter(id=options["store"])
+        store = stores.filter(inventory__isnull=False).first()
+        if store is None:
+            raise CommandError("No store with inventory to sell from.")
+        product_id = store.inventory.values_list("product_id", flat=True).first()
+        token = str(StoreTokenObtainPairSerializer.get_token(store.admin).access_token)
+        payload = {
+            "store": store.id,
+            "sales_item": [{"product": product_id, "quantity": 1}],
+        }
+
+        keys = [uuid.uuid4().hex for _ in range(options["checkouts"])]
+        sends = [key for key in keys for _ in range(options["retries"])]
+        random.shuffle(sends)
+
+        def send(key):
+            headers = {"HTTP_AUTHORIZATION": f"Bearer {token}"}
+            if not options["no_keys"]:
+                headers["HTTP_IDEMPOTENCY_KEY"] = key
+            try:
+                response = Client().post(
+                    "/api/sales/", payload, content_type="application/json", **headers
+                )
+                sale_id = (
+                    response.json().get("id") if response.status_code == 201 else None
+                )
+                return (
+                    key,
+                    response.status_code,
+                    sale_id,
+                    response.has_header("Idempotent-Replayed"),
+                )
+            finally:
+                connections.close_all()
+
+        rates = {store.id: {"sales_write": "1000000/min"}}
+        with override_settings(
+            ALLOWED_HOSTS=["testserver"], STORE_THROTTLE_RATES=rates
+        ):
+            started = time.perf_counter()
+            with ThreadPoolExecutor(options["threads"]) as pool:
+                results = list(pool.map(send, sends))
+            elapsed = time.perf_counter() - started
+
+        statuses = Counter(status for _, status, _, _ in results)
+        replayed = sum(1 for *_, was_replayed in results if was_replayed)
+        sales_by_key = defaultdict(set)
+        for key, _, sale_id, _ in results:
+            if sale_id is not None:
+                sales_by_key[key].add(sale_id)
+        sale_ids = set().union(*sales_by_key.values())
+        created = Sales.objects.filter(id__in=sale_ids).count()
+        duplicates = created - len(sales_by_key)
+
+        self.stdout.write(
+            f"{len(results)} requests for {len(keys)} checkouts in {elapsed:.1f}s "
+            f"({len(results) / elapsed:.0f} req/s); statuses {dict(statuses)}, "
+            f"{replayed} replayed"
+        )
+        self.stdout.write(f"{created} sales created, {duplicates} duplicates")
+
+        if not options["keep"]:
+            OutboxEvent.objects.filter(
+                topic__startswith="sale.", key__in=sale_ids
+            ).delete()
+            Sales.objects.filter(id__in=sale_ids).delete()
+            IdempotencyKey.objects.filter(key__in=keys).delete()
+
+        if duplicates and not options["no_keys"]:
+            raise CommandError(f"{duplicates} duplicate sales were created.")
+        self.stdout.write(self.style.SUCCESS("Done"))
@@ -0,0 +1,123 @@
+# Generated by Django 5.2 on 2026-10-19 14:29
+
+import datetime
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+PARTITIONED_TABLES = ('api_sales', 'api_salesitems')
+FUTURE_MONTHS = 12
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_table(cursor, table, boundary):
+    """
+    Turn ``table`` into a table range partitioned on created_at.
+
+    The existing table becomes the ``<table>_legacy`` partition holding every row
+    before ``boundary``. A validated CHECK constraint matching the partition
+    bound is added first so ATTACH PARTITION doesn't have to scan it again.
+    """
+    legacy = f'{table}_legacy'
+
+    cursor.execute(
+        "SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s AND indexname <> %s",
+        [table, f'{table}_pkey'],
+    )
+    indexes = cursor.fetchall()
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = %s::regclass AND contype = 'f'",
+        [table],
+    )
+    foreign_keys = cursor.fetchall()
+    cursor.execute(f'SELECT COALESCE(MAX(id), 0) + 1 FROM {table}')
+    next_id = cursor.fetchone()[0]
+
+    # Free the names the partitioned parent is going to take over
+    cursor.execute(f'ALTER TABLE {table} RENAME TO {legacy}')
+    for name, _ in indexes:
+        cursor.execute(f'ALTER INDEX {name} RENAME TO {name[:56]}_legacy')
+
+    # Swap the legacy primary key for one the parent's key can attach
+    cursor.execute(f'CREATE UNIQUE INDEX {legacy}_pkey ON {legacy} (id, created_at)')
+    cursor.execute(f'ALTER TABLE {legacy} DROP CONSTRAINT {table}_pkey')
+    cursor.execute(f'ALTER TABLE {legacy} ADD CONSTRAINT {legacy}_pkey PRIMARY KEY USING INDEX {legacy}_pkey')
+
+    # Ids keep coming from one sequence, now owned by the parent
+    cursor.execute(f'ALTER TABLE {legacy} ALTER COLUMN id DROP IDENTITY IF EXISTS')
+    cursor.execute(f'ALTER TABLE {legacy} ALTER COLUMN id DROP DEFAULT')
+    cursor.execute(f'CREATE SEQUENCE IF NOT EXISTS {table}_id_seq')
+    cursor.execute('SELECT setval(%s, %s, false)', [f'{table}_id_seq', next_id])
+
+    cursor.execute(
+        f'CREATE TABLE {table} (LIKE {legacy} INCLUDING DEFAULTS INCLUDING CONSTRAINTS '
+        f'INCLUDING STORAGE) PARTITION BY RANGE (created_at)'
+    )
+    cursor.execute(f"ALTER TABLE {table} ALTER COLUMN id SET DEFAULT nextval('{table}_id_seq')")
+    cursor.execute(f'ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id')
+    # The partition key has to be part of the primary key
+    cursor.execute(f'ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY (id, created_at)')
+    for name, definition in foreign_keys:
+        cursor.execute(f'ALTER TABLE {table} ADD CONSTRAINT {name} {definition}')
+
+    cursor.execute(
+        f'ALTER TABLE {legacy} ADD CONSTRAINT {legacy}_bound '
+        f'CHECK (created_at IS NOT NULL AND created_at < %s) NOT VALID',
+        [boundary],
+    )
+    cursor.execute(f'ALTER TABLE {legacy} VALIDATE CONSTRAINT {legacy}_bound')
+    cursor.execute(
+        f'ALTER TABLE {table} ATTACH PARTITION {legacy} FOR VALUES FROM (MINVALUE) TO (%s)',
+        [boundary],
+    )
+    cursor.execute(f'ALTER TABLE {legacy} DROP CONSTRAINT {legacy}_bound')
+
+    # Index definitions still name the original table, which is now the parent;
+    # matching indexes on the legacy partition are attached instead of rebuilt.
+    for _, definition in indexes:
+        cursor.execute(definition)
+
+    month = boundary
+    for _ in range(FUTURE_MONTHS):
+        upper = add_months(month, 1)
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS {table}_p{month:%Y%m} PARTITION OF {table} '
+            f'FOR VALUES FROM (%s) TO (%s)',
+            [month, upper],
+        )
+        month = upper
+
+
+def partition_sales(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    today = datetime.datetime.now(datetime.timezone.utc)
+    month = today.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    boundary = add_months(month, 1)
+    with schema_editor.connection.cursor() as cursor:
+        for table in PARTITIONED_TABLES:
+            partition_table(cursor, table, boundary)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_alter_sales_total_price_alter_sales_total_quantity'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='salesitems',
+            name='sales',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='sales_item', to='api.sales'),
+        ),
+        # Converting a table holds an ACCESS EXCLUSIVE lock on it while the
+        # (id, created_at) index is built on the legacy partition; run it in a
+        # maintenance window on large databases.
+        migrations.RunPython(partition_sales),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2 on 2026-10-19 14:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Hourly per-store (and per-store, per-product) sales of the last two days.
+# Refreshed CONCURRENTLY by `refresh_store_kpis`, which needs the unique indexes.
+VIEWS = {
+    'api_store_hourly_sales': (
+        "SELECT store_id, date_trunc('hour', created_at) AS hour, "
+        "COUNT(*) AS sales_count, SUM(total_price) AS revenue, "
+        "SUM(total_quantity) AS items_sold "
+        "FROM api_sales "
+        "WHERE created_at >= date_trunc('day', now()) - interval '1 day' "
+        "GROUP BY 1, 2",
+        '(store_id, hour)',
+    ),
+    'api_store_product_sales': (
+        "SELECT s.store_id, date_trunc('hour', s.created_at) AS hour, i.product_id, "
+        "SUM(i.quantity) AS quantity, "
+        "SUM(i.quantity * i.unit_price * (100 - i.discount)) / 100 AS revenue "
+        "FROM api_salesitems i JOIN api_sales s ON s.id = i.sales_id "
+        "WHERE s.created_at >= date_trunc('day', now()) - interval '1 day' "
+        "AND i.created_at >= date_trunc('day', now()) - interval '1 day' "
+        "GROUP BY 1, 2, 3",
+        '(store_id, hour, product_id)',
+    ),
+}
+
+
+def create_views(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for name, (query, key) in VIEWS.items():
+            cursor.execute(f'CREATE MATERIALIZED VIEW IF NOT EXISTS {name} AS {query}')
+            cursor.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS {name}_key ON {name} {key}')
+
+
+def drop_views(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for name in VIEWS:
+            cursor.execute(f'DROP MATERIALIZED VIEW IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_partition_sales_by_month'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoreKPI',
+            fields=[
+                ('store', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='kpi', serialize=False, to='api.store')),
+                ('day', models.DateField()),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('items_sold', models.PositiveIntegerField(default=0)),
+                ('sales_count', models.PositiveIntegerField(default=0)),
+                ('low_stock_count', models.PositiveIntegerField(default=0)),
+                ('top_products', models.JSONField(default=list)),
+                ('sales_per_hour', models.JSONField(default=list)),
+                ('source', models.CharField(default='live', max_length=20)),
+                ('refreshed_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(create_views, drop_views),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2 on 2026-10-19 15:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_outbox_event'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='inventory',
+            name='api_invento_store_i_953dcf_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='inventorymovement',
+            name='api_invento_invento_ff1ec0_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='sales',
+            name='api_sales_store_i_f9aa5b_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='store',
+            name='api_store_address_2923f9_idx',
+        ),
+        migrations.AlterField(
+            model_name='inventory',
+            name='store',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='inventory', to='api.store'),
+        ),
+        migrations.AlterField(
+            model_name='sales',
+            name='store',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='sales', to='api.store'),
+        ),
+        migrations.AlterField(
+            model_name='salesitems',
+            name='sales',
+            field=models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='sales_item', to='api.sales'),
+        ),
+        migrations.AddIndex(
+            model_name='inventory',
+            index=models.Index(condition=models.Q(('quantity__lte', models.F('reorder_level'))), fields=['store'], name='api_inventory_low_stock'),
+        ),
+        migrations.AddIndex(
+            model_name='sales',
+            index=models.Index(fields=['store', '-created_at', '-id'], include=('total_price', 'total_quantity', 'total_tax', 'overall_discount'), name='api_sales_store_recent'),
+        ),
+    ]
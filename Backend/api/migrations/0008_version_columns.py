@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-19 15:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventory',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='sales',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
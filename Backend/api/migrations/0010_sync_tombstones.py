@@ -0,0 +1,40 @@
+# Generated by Django 5.2 on 2026-10-19 15:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('model', models.CharField(max_length=50)),
+                ('object_id', models.BigIntegerField()),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='inventory',
+            index=models.Index(fields=['store', 'updated_at', 'id'], name='api_invento_store_i_ee8cc6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['updated_at', 'id'], name='api_product_updated_97d703_idx'),
+        ),
+        migrations.AddField(
+            model_name='tombstone',
+            name='store',
+            field=models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='api.store'),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['model', 'deleted_at', 'id'], name='api_tombsto_model_9b89d3_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2 on 2026-10-19 15:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_sync_tombstones'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='store',
+            index=models.Index(fields=['updated_at', 'id'], name='api_store_updated_ba4b63_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='supplier',
+            index=models.Index(fields=['updated_at', 'id'], name='api_supplie_updated_87bad9_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2 on 2026-10-19 15:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_changes_since_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductRanking',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('top_products', models.JSONField(default=list)),
+                ('abc', models.JSONField(default=dict)),
+                ('counted_until', models.DateTimeField(null=True)),
+                ('refreshed_at', models.DateTimeField(auto_now=True)),
+                ('store', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.store')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('store',), name='unique_ranking_store', nulls_distinct=False)],
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductSalesMonth',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('month', models.DateField()),
+                ('quantity', models.BigIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=6, default=0, max_digits=22)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.product')),
+                ('store', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.store')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['month', 'product'], name='api_product_month_129fd7_idx')],
+                'constraints': [models.UniqueConstraint(fields=('store', 'month', 'product'), name='unique_product_sales_month')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2 on 2026-10-19 15:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_product_rankings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReorderSuggestion',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('on_hand', models.PositiveIntegerField()),
+                ('daily_demand', models.FloatField()),
+                ('reorder_level', models.PositiveIntegerField()),
+                ('reorder_quantity', models.PositiveIntegerField()),
+                ('computed_at', models.DateTimeField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.product')),
+                ('store', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.store')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('store', 'product'), name='unique_reorder_suggestion')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2 on 2026-10-19 16:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_reorder_suggestions'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='inventory',
+            index=models.Index(fields=['updated_at'], name='api_invento_updated_683756_idx'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2 on 2026-10-19 16:44
+
+import json
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def copy_sync_keys(apps, schema_editor):
+    """
+    Carry over the sales pushed while dedupe used expiring idempotency keys.
+    """
+    IdempotencyKey = apps.get_model("api", "IdempotencyKey")
+    Sales = apps.get_model("api", "Sales")
+    SyncedSale = apps.get_model("api", "SyncedSale")
+    keys = IdempotencyKey.objects.filter(key__startswith="sync:")
+    for key in keys.iterator():
+        sales_id = json.loads(bytes(key.body))["id"]
+        store_id = Sales.objects.filter(pk=sales_id).values_list("store_id", flat=True).first()
+        if store_id is not None:
+            SyncedSale.objects.get_or_create(
+                store_id=store_id,
+                client_id=key.key.removeprefix("sync:"),
+                defaults={"sales_id": sales_id, "fingerprint": key.fingerprint},
+            )
+    keys.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_inventory_updated_at_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncedSale',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('client_id', models.CharField(max_length=100)),
+                ('fingerprint', models.CharField(max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sales', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='api.sales')),
+                ('store', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.store')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('store', 'client_id'), name='unique_store_client_sale')],
+            },
+        ),
+        migrations.RunPython(copy_sync_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2 on 2026-10-19 16:51
+
+import datetime
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+
+
+def count_history(apps, schema_editor):
+    """
+    Daily totals of the forecast history that refresh_rankings already
+    counted; it adds the items past its watermark itself.
+    """
+    ProductRanking = apps.get_model("api", "ProductRanking")
+    ProductSalesDay = apps.get_model("api", "ProductSalesDay")
+    SalesItems = apps.get_model("api", "SalesItems")
+    ranking = ProductRanking.objects.filter(store=None).first()
+    if ranking is None or ranking.counted_until is None:
+        return
+    upto = ranking.counted_until
+    since = upto - datetime.timedelta(days=settings.FORECAST["HISTORY_DAYS"] + 1)
+    rows = (
+        SalesItems.objects.filter(
+            created_at__gt=since,
+            created_at__lte=upto,
+            sales__created_at__lte=upto,
+        )
+        .annotate(day=TruncDate("created_at"))
+        .values("sales__store_id", "product_id", "day")
+        .annotate(sold=Sum("quantity"))
+        .order_by()
+    )
+    ProductSalesDay.objects.bulk_create(
+        (
+            ProductSalesDay(
+                store_id=row["sales__store_id"],
+                product_id=row["product_id"],
+                day=row["day"],
+                quantity=row["sold"],
+            )
+            for row in rows.iterator()
+        ),
+        batch_size=5000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_synced_sales'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSalesDay',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('day', models.DateField()),
+                ('quantity', models.BigIntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.product')),
+                ('store', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.store')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('store', 'day', 'product'), name='unique_product_sales_day')],
+            },
+        ),
+        migrations.RunPython(count_history, migrations.RunPython.noop),
+    ]
@@ -2,6 +2,8 @@ from django.db import models
 from django.db.models import Q, F, Func
 from django.contrib.auth.models import AbstractUser
 from django.db.models.functions import Length
+from django.utils import timezone
+from .cache import admin_username
 
 
 class Address(models.Model):
@@ -49,6 +51,7 @@ class Product(models.Model):
         indexes = [
             models.Index(fields=["product_name"]),  # For product searches
             models.Index(fields=["created_at"]),  # For date filtering
+            models.Index(fields=["updated_at", "id"]),  # Changes since
         ]
         constraints = [
             models.CheckConstraint(name="check_cost_price", check=Q(cost_price__gte=0)),
@@ -80,11 +83,11 @@ class Store(models.Model):
     class Meta:
         indexes = [
             models.Index(fields=["name"]),  # For store searches
-            models.Index(fields=["address"]),  # For geographic lookups
+            models.Index(fields=["updated_at", "id"]),  # Changes since
         ]
 
     def __str__(self):
-        return f"{self.name}-{self.admin.username}"
+        return f"{self.name}-{admin_username(self.admin_id)}"
 
 
 class Supplier(models.Model):
@@ -97,6 +100,7 @@ class Supplier(models.Model):
     class Meta:
         indexes = [
             models.Index(fields=["name"]),  # For supplier searches
+            models.Index(fields=["updated_at", "id"]),  # Changes since
         ]
 
     def __str__(self):
@@ -105,7 +109,10 @@ class Supplier(models.Model):
 
 class Inventory(models.Model):
     id = models.BigAutoField(primary_key=True)
-    store = models.ForeignKey(Store, on_delete=models.CASCADE, related_name="inventory")
+    # Store lookups use the unique (store, product, supplier) index
+    store = models.ForeignKey(
+        Store, on_delete=models.CASCADE, related_name="inventory", db_index=False
+    )
     product = models.ForeignKey(
         Product, on_delete=models.CASCADE, related_name="inventory"
     )
@@ -115,6 +122,8 @@ class Inventory(models.Model):
     )
     reorder_level = models.PositiveIntegerField(default=10)
     last_restock_date = models.DateTimeField(null=True, blank=True)
+    # Bumped by every API update, for optimistic locking
+    version = models.PositiveIntegerField(default=1)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -126,8 +135,15 @@ class Inventory(models.Model):
             )
         ]
         indexes = [
-            models.Index(fields=["store", "product"]),
             models.Index(fields=["created_at"]),
+            models.Index(fields=["store", "updated_at", "id"]),  # Changes since
+            models.Index(fields=["updated_at"]),  # All stores' list ETags
+            # Only the rows at or below their reorder level, per store
+            models.Index(
+                fields=["store"],
+                condition=Q(quantity__lte=F("reorder_level")),
+                name="api_inventory_low_stock",
+            ),
         ]
 
     def __str__(self):
@@ -136,7 +152,10 @@ class Inventory(models.Model):
 
 class Sales(models.Model):
     id = models.BigAutoField(primary_key=True)
-    store = models.ForeignKey(Store, on_delete=models.CASCADE, related_name="sales")
+    # Store lookups use the (store, created_at) index
+    store = models.ForeignKey(
+        Store, on_delete=models.CASCADE, related_name="sales", db_index=False
+    )
     total_quantity = models.PositiveIntegerField(default=0)
     total_tax = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     total_price = models.DecimalField(max_digits=10, decimal_places=2, default=0)
@@ -144,6 +163,8 @@ class Sales(models.Model):
     products = models.ManyToManyField(
         Product, through="SalesItems", related_name="sales"
     )
+    # Bumped by every API update, for optimistic locking
+    version = models.PositiveIntegerField(default=1)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -156,11 +177,22 @@ class Sales(models.Model):
         )
 
     def __str__(self):
-        return f"Sales {self.id} by {self.store.admin.username}"
+        return f"Sales {self.id} by {admin_username(self.store.admin_id)}"
 
     class Meta:
         indexes = [
-            models.Index(fields=["store"]),  # For store-specific queries
+            # A store's sales newest first, as listed; the totals are included
+            # so per-store aggregates over a date range read only the index
+            models.Index(
+                fields=["store", "-created_at", "-id"],
+                include=[
+                    "total_price",
+                    "total_quantity",
+                    "total_tax",
+                    "overall_discount",
+                ],
+                name="api_sales_store_recent",
+            ),
             models.Index(fields=["created_at"]),  # For date range reporting
         ]
         constraints = [
@@ -176,8 +208,15 @@ class Sales(models.Model):
 
 class SalesItems(models.Model):
     id = models.BigAutoField(primary_key=True)
+    # Sales is range partitioned on PostgreSQL, so its primary key is
+    # (id, created_at) and a database level foreign key on id alone isn't possible
     sales = models.ForeignKey(
-        Sales, on_delete=models.CASCADE, related_name="sales_item"
+        Sales,
+        on_delete=models.CASCADE,
+        related_name="sales_item",
+        db_constraint=False,
+        # Served by the (sales, product) index
+        db_index=False,
     )
     product = models.ForeignKey(
         Product, on_delete=models.CASCADE, related_name="sales_item"
@@ -195,7 +234,7 @@ class SalesItems(models.Model):
         )
 
     def __str__(self):
-        return f"{self.quantity} x {self.product.product_name} in SALE {self.sales.id}"
+        return f"{self.quantity} x {self.product.product_name} in SALE {self.sales_id}"
 
     class Meta:
         indexes = [
@@ -253,5 +292,310 @@ class InventoryMovement(models.Model):
         indexes = [
             models.Index(fields=["created_at"]),
             models.Index(fields=["movement_type"]),
-            models.Index(fields=["inventory"]),
         ]
+
+
+class StoreKPI(models.Model):
+    """
+    Precomputed dashboard figures of one store for ``day`` (see api/dashboard.py).
+    """
+
+    store = models.OneToOneField(
+        Store, on_delete=models.CASCADE, primary_key=True, related_name="kpi"
+    )
+    day = models.DateField()
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    items_sold = models.PositiveIntegerField(default=0)
+    sales_count = models.PositiveIntegerField(default=0)
+    low_stock_count = models.PositiveIntegerField(default=0)
+    # [{"product", "product_name", "quantity", "revenue"}], best sellers first
+    top_products = models.JSONField(default=list)
+    # [{"hour", "sales", "revenue"}] for the 24 hours of ``day``
+    sales_per_hour = models.JSONField(default=list)
+    source = models.CharField(max_length=20, default="live")
+    refreshed_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"KPIs of store {self.store_id} on {self.day}"
+
+
+class ProductSalesMonth(models.Model):
+    """
+    Units and revenue of a product in a store in one month, accumulated from
+    ``SalesItems`` by ``refresh_rankings`` (see api/rankings.py).
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    store = models.ForeignKey(Store, on_delete=models.CASCADE, related_name="+")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="+")
+    month = models.DateField()  # first day of the month (UTC)
+    quantity = models.BigIntegerField(default=0)
+    # Unrounded sum of the item subtotals, so adding batches stays exact
+    revenue = models.DecimalField(max_digits=22, decimal_places=6, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["store", "month", "product"], name="unique_product_sales_month"
+            )
+        ]
+        indexes = [
+            models.Index(fields=["month", "product"]),  # Rankings of all stores
+        ]
+
+    def __str__(self):
+        return f"Product {self.product_id} in store {self.store_id}, {self.month:%Y-%m}"
+
+
+class ProductSalesDay(models.Model):
+    """
+    Units of a product sold in a store on one (local) day, accumulated from
+    ``SalesItems`` together with ProductSalesMonth. Demand forecasts
+    (api/forecast.py) are fitted from it.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    store = models.ForeignKey(Store, on_delete=models.CASCADE, related_name="+")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="+")
+    day = models.DateField()
+    quantity = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["store", "day", "product"], name="unique_product_sales_day"
+            )
+        ]
+
+    def __str__(self):
+        return f"Product {self.product_id} in store {self.store_id}, {self.day}"
+
+
+class ProductRanking(models.Model):
+    """
+    Best sellers and ABC classes of a store, or of all stores when ``store``
+    is null, over the last ``RANKINGS["MONTHS"]`` months (see api/rankings.py).
+    """
+
+    store = models.ForeignKey(
+        Store, on_delete=models.CASCADE, null=True, related_name="+"
+    )
+    # [{"product", "product_name", "quantity", "revenue"}], best sellers first
+    top_products = models.JSONField(default=list)
+    # {"A": {"products": [ids], "revenue": "..."}, "B": ..., "C": ...}
+    abc = models.JSONField(default=dict)
+    # Every item created up to here is counted; the global row's is the
+    # watermark of the next refresh
+    counted_until = models.DateTimeField(null=True)
+    refreshed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["store"], nulls_distinct=False, name="unique_ranking_store"
+            )
+        ]
+
+    def __str__(self):
+        scope = f"store {self.store_id}" if self.store_id else "all stores"
+        return f"Ranking of {scope}"
+
+
+class ReorderSuggestion(models.Model):
+    """
+    Forecast demand of a product in a store and the reorder level and
+    quantity it suggests, written by ``forecast_demand`` (see api/forecast.py)
+    for the products to reorder only.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    store = models.ForeignKey(Store, on_delete=models.CASCADE, related_name="+")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="+")
+    on_hand = models.PositiveIntegerField()  # over all of the store's suppliers
+    daily_demand = models.FloatField()  # smoothed units per day
+    reorder_level = models.PositiveIntegerField()
+    reorder_quantity = models.PositiveIntegerField()  # 0 above reorder_level
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["store", "product"], name="unique_reorder_suggestion"
+            )
+        ]
+
+    def __str__(self):
+        return f"Reorder {self.reorder_quantity} of product {self.product_id} in store {self.store_id}"
+
+
+class Task(models.Model):
+    """
+    A unit of background work in the database-backed queue (see api/tasks.py).
+    """
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+    STATUS_CHOICES = [
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (SUCCEEDED, "Succeeded"),
+        (FAILED, "Failed"),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    name = models.CharField(max_length=100)  # key of api.tasks.TASKS
+    payload = models.JSONField(default=dict, blank=True)  # keyword arguments
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_at = models.DateTimeField(default=timezone.now)  # not before
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_by = models.ForeignKey(
+        StoreAdmin, on_delete=models.SET_NULL, null=True, blank=True
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "run_at"]),  # Workers polling the queue
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.id} ({self.status})"
+
+
+class OutboxEvent(models.Model):
+    """
+    A change for downstream consumers, written in the same transaction as the
+    change itself and published by ``relay_outbox`` (see api/outbox.py).
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    topic = models.CharField(max_length=50)  # e.g. "sale.created"
+    # Kept after the store is deleted so its last events still go out
+    store = models.ForeignKey(
+        Store,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        related_name="+",
+    )
+    key = models.BigIntegerField()  # id of the changed row
+    payload = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    published_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            # The relay's queue: only unpublished rows, in id order
+            models.Index(
+                fields=["id"],
+                name="api_outbox_unpublished",
+                condition=Q(published_at__isnull=True),
+            ),
+            models.Index(fields=["published_at"]),  # Purging old events
+        ]
+
+    def __str__(self):
+        return f"{self.topic} #{self.key} (event {self.id})"
+
+
+class IdempotencyKey(models.Model):
+    """
+    The response to a write sent with an ``Idempotency-Key`` header, replayed
+    to retries of the same request (see api/idempotency.py).
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey(StoreAdmin, on_delete=models.CASCADE, related_name="+")
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)  # sha256 of method, path, body
+    status_code = models.PositiveSmallIntegerField()
+    headers = models.JSONField(default=dict)
+    body = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "key"], name="unique_user_idempotency_key"
+            )
+        ]
+        indexes = [
+            models.Index(fields=["created_at"]),  # Purging expired keys
+        ]
+
+    def __str__(self):
+        return f"{self.key} ({self.status_code})"
+
+
+class SyncedSale(models.Model):
+    """
+    A sale a POS terminal pushed under its own ``client_id`` (see api/sync.py),
+    kept for good so a resent sale is never created twice. Sales can't hold
+    the unique (store, client_id) itself: every unique constraint of a
+    partitioned table must include its partition key, created_at.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    store = models.ForeignKey(Store, on_delete=models.CASCADE, related_name="+")
+    client_id = models.CharField(max_length=100)
+    # Sales is partitioned, so no foreign key constraint (like SalesItems.sales);
+    # the id is still reported once the sale is archived
+    sales = models.ForeignKey(
+        Sales,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        db_index=False,
+        related_name="+",
+    )
+    fingerprint = models.CharField(max_length=64)  # sha256 of the pushed sale
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["store", "client_id"], name="unique_store_client_sale"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.client_id} -> sale {self.sales_id}"
+
+
+class Tombstone(models.Model):
+    """
+    A deleted row, kept so consumers pulling changes since a watermark learn
+    about deletes too (see api/changes.py).
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    model = models.CharField(max_length=50)  # model_name, e.g. "inventory"
+    object_id = models.BigIntegerField()
+    # Kept after the store is deleted, like OutboxEvent.store
+    store = models.ForeignKey(
+        Store,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        related_name="+",
+    )
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["model", "deleted_at", "id"]),  # Changes since
+        ]
+
+    def __str__(self):
+        return f"{self.model} {self.object_id} deleted"
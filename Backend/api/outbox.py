@@ -0,0 +1,198 @@
+import datetime
+import json
+import os
+import queue
+import urllib.request
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import OutboxEvent
+
+CENT = Decimal("0.01")
+
+
+def record(topic, store_id, key, payload):
+    """
+    Add an event to the outbox. Call it inside the transaction that makes the
+    change so the event is committed (or rolled back) together with it.
+    """
+    return OutboxEvent.objects.create(
+        topic=topic,
+        store_id=store_id,
+        key=key,
+        # Decimals as strings, like the REST API
+        payload=json.loads(json.dumps(payload, cls=DjangoJSONEncoder)),
+    )
+
+
+def _cents(value):
+    # Unsaved totals are exact; store them as the numeric(…, 2) columns do
+    return Decimal(value).quantize(CENT, ROUND_HALF_UP)
+
+
+def sale_payload(sale, items=None):
+    items = sale.sales_item.all() if items is None else items
+    return {
+        "id": sale.id,
+        "store": sale.store_id,
+        "created_at": sale.created_at.isoformat(),
+        "total_quantity": sale.total_quantity,
+        "total_price": _cents(sale.total_price),
+        "total_tax": _cents(sale.total_tax),
+        "overall_discount": _cents(sale.overall_discount),
+        "items": [
+            {
+                "id": item.id,
+                "product": item.product_id,
+                "quantity": item.quantity,
+                "unit_price": item.unit_price,
+                "discount": item.discount,
+            }
+            for item in items
+        ],
+    }
+
+
+def inventory_payload(inventory):
+    return {
+        "id": inventory.id,
+        "store": inventory.store_id,
+        "product": inventory.product_id,
+        "supplier": inventory.supplier_id,
+        "quantity": inventory.quantity,
+        "reorder_level": inventory.reorder_level,
+    }
+
+
+def movement_payload(movement):
+    return {
+        "id": movement.id,
+        "inventory": movement.inventory_id,
+        "quantity": movement.quantity,
+        "movement_type": movement.movement_type,
+        "source_store": movement.source_store_id,
+        "destination_store": movement.destination_store_id,
+        "created_by": movement.created_by_id,
+        "created_at": movement.created_at.isoformat(),
+        "notes": movement.notes,
+    }
+
+
+def as_message(event):
+    return {
+        "id": event.id,
+        "topic": event.topic,
+        "store": event.store_id,
+        "key": event.key,
+        "created_at": event.created_at.isoformat(),
+        "payload": event.payload,
+    }
+
+
+class FileSink:
+    """
+    Appends events to an NDJSON file, fsynced after every batch.
+    """
+
+    def __init__(self, path):
+        self.path = os.fspath(path)
+
+    def send(self, messages):
+        with open(self.path, "a", encoding="utf-8") as out:
+            for message in messages:
+                out.write(json.dumps(message, separators=(",", ":")))
+                out.write("\n")
+            out.flush()
+            os.fsync(out.fileno())
+
+
+class HTTPSink:
+    """
+    POSTs each batch as a JSON array; any non-2xx response fails the batch.
+    """
+
+    def __init__(self, url, headers=None, timeout=10):
+        self.url = url
+        self.headers = {"Content-Type": "application/json", **(headers or {})}
+        self.timeout = timeout
+
+    def send(self, messages):
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps(messages).encode(),
+            headers=self.headers,
+            method="POST",
+        )
+        # urlopen raises HTTPError for non-2xx responses
+        with urllib.request.urlopen(request, timeout=self.timeout):
+            pass
+
+
+# Shared by every LocalQueueSink of the process
+local_queue = queue.Queue()
+
+
+class LocalQueueSink:
+    """
+    Puts events on ``outbox.local_queue`` for consumers in the same process.
+    """
+
+    def send(self, messages):
+        for message in messages:
+            local_queue.put(message)
+
+
+def get_sink():
+    config = settings.OUTBOX
+    return import_string(config["SINK"])(**config.get("OPTIONS", {}))
+
+
+def relay_batch(sink, batch_size):
+    """
+    Publish the oldest unpublished events to ``sink`` and mark them published.
+
+    Rows are locked until the batch is marked, so concurrent relays take
+    turns instead of publishing out of order. Events go out in id order, so a
+    store's changes to the same sale or stock row arrive in commit order. A
+    crash after ``send`` but before the commit republishes the batch:
+    delivery is at least once, and consumers deduplicate on the event ``id``.
+    Returns the number of events published.
+    """
+    with transaction.atomic():
+        events = list(
+            OutboxEvent.objects.select_for_update()
+            .filter(published_at__isnull=True)
+            .order_by("id")[:batch_size]
+        )
+        if not events:
+            return 0
+        ids = [event.id for event in events]
+        try:
+            sink.send([as_message(event) for event in events])
+        except Exception as error:
+            # Keep the order: the same batch is retried on the next run
+            failure = error
+            OutboxEvent.objects.filter(id__in=ids).update(
+                attempts=F("attempts") + 1, last_error=repr(error)[:1000]
+            )
+        else:
+            OutboxEvent.objects.filter(id__in=ids).update(
+                published_at=timezone.now(), attempts=F("attempts") + 1, last_error=""
+            )
+            return len(events)
+    raise failure
+
+
+def purge_published(days):
+    """
+    Delete events published more than ``days`` ago.
+    """
+    cutoff = timezone.now() - datetime.timedelta(days=days)
+    deleted, _ = OutboxEvent.objects.filter(published_at__lt=cutoff).delete()
+    return deleted
@@ -0,0 +1,163 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db import connections
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+
+COUNT_KEY = "pagecount:{digest}"
+
+
+def estimated_count(queryset):
+    """
+    PostgreSQL's row estimate for ``queryset``, or None on other databases:
+    the table's (and its partitions') ``pg_class.reltuples`` when unfiltered,
+    else the planner's estimate from EXPLAIN.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return None
+    if not queryset.query.where:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT sum(greatest(reltuples, 0)) FROM pg_class WHERE oid = "
+                "%s::regclass OR oid IN (SELECT inhrelid FROM pg_inherits "
+                "WHERE inhparent = %s::regclass)",
+                [queryset.model._meta.db_table] * 2,
+            )
+            reltuples = cursor.fetchone()[0]
+        if reltuples:  # Never analyzed otherwise
+            return int(reltuples)
+    plan = queryset.explain(format="json")
+    plan = json.loads(plan) if isinstance(plan, str) else plan
+    return plan[0]["Plan"]["Plan Rows"]
+
+
+def approximate_count(queryset, exact_below, timeout=0):
+    """
+    ``(count, is_estimate)`` of ``queryset``: exact while PostgreSQL estimates
+    fewer than ``exact_below`` rows, else the estimate. With a ``timeout`` the
+    result is cached that many seconds per query (filters and scope, not
+    ordering or columns).
+    """
+    try:
+        sql, params = queryset.order_by().values("pk").query.sql_with_params()
+    except EmptyResultSet:
+        return 0, False
+    key = COUNT_KEY.format(
+        digest=hashlib.md5(repr((queryset.db, sql, params)).encode()).hexdigest()
+    )
+    if timeout:
+        cached = cache.get(key)
+        if cached is not None:
+            return tuple(cached)
+
+    estimate = estimated_count(queryset)
+    if estimate is None or estimate < exact_below:
+        result = (queryset.count(), False)
+    else:
+        result = (estimate, True)
+    if timeout:
+        cache.set(key, result, timeout)
+    return result
+
+
+class EstimatedPage(Page):
+    def has_next(self):
+        if self.paginator.count_is_estimate:
+            # The estimate may end before or after the last row
+            return len(self) == self.paginator.per_page
+        return super().has_next()
+
+    def next_page_number(self):
+        if self.paginator.count_is_estimate:
+            # Not validated against num_pages, which the estimate gives
+            return self.number + 1
+        return super().next_page_number()
+
+    def previous_page_number(self):
+        if self.paginator.count_is_estimate:
+            return self.number - 1
+        return super().previous_page_number()
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator whose ``count`` comes from ``approximate_count`` with
+    ``PAGINATION["EXACT_COUNT_BELOW"]`` and ``PAGINATION["COUNT_CACHE_SECONDS"]``.
+    Estimated pages are sliced by page size alone, so every page up to the
+    last row stays reachable whichever way the estimate is off. Lists that
+    aren't querysets are counted exactly.
+    """
+
+    count_is_estimate = False
+
+    def get_count_settings(self):
+        return settings.PAGINATION
+
+    @cached_property
+    def count(self):
+        if not isinstance(self.object_list, QuerySet):
+            return super().count
+        options = self.get_count_settings()
+        count, self.count_is_estimate = approximate_count(
+            self.object_list,
+            options["EXACT_COUNT_BELOW"],
+            options["COUNT_CACHE_SECONDS"],
+        )
+        return count
+
+    def page(self, number):
+        self.count  # Sets count_is_estimate
+        if not self.count_is_estimate:
+            return super().page(number)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(self.error_messages["invalid_page"])
+        if number < 1:
+            raise EmptyPage(self.error_messages["min_page"])
+        bottom = (number - 1) * self.per_page
+        return self._get_page(
+            self.object_list[bottom : bottom + self.per_page], number, self
+        )
+
+    def _get_page(self, *args, **kwargs):
+        return EstimatedPage(*args, **kwargs)
+
+
+class EstimatedCountPagination(PageNumberPagination):
+    """
+    ``PageNumberPagination`` for tables too big to count on every request:
+    ``count`` is PostgreSQL's estimate past ``PAGINATION["EXACT_COUNT_BELOW"]``
+    rows, which ``count_is_estimate`` reports, and ``next`` is set as long
+    as the page is full.
+    """
+
+    django_paginator_class = EstimatedCountPaginator
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "count": self.page.paginator.count,
+                "count_is_estimate": self.page.paginator.count_is_estimate,
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            }
+        )
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema["properties"] = {
+            "count": response_schema["properties"]["count"],
+            "count_is_estimate": {"type": "boolean", "example": False},
+            **response_schema["properties"],
+        }
+        return response_schema
@@ -0,0 +1,145 @@
+import datetime
+import gzip
+import re
+
+from django.db import connection
+from django.utils import timezone
+
+from .models import Sales, SalesItems
+
+# Both tables are range partitioned by month on created_at (migration 0003)
+PARTITIONED_MODELS = (Sales, SalesItems)
+
+UPPER_BOUND = re.compile(r"TO \('([^']+)'\)")
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def month_start(value):
+    """
+    First instant of the month ``value`` falls in, in UTC like the partitions.
+    """
+    if isinstance(value, datetime.datetime):
+        value = value.astimezone(datetime.timezone.utc)
+    return datetime.datetime(value.year, value.month, 1, tzinfo=datetime.timezone.utc)
+
+
+def month_range(value):
+    """
+    ``(start, end)`` of the month containing ``value`` in the current time zone.
+    """
+    start = timezone.make_aware(
+        datetime.datetime(value.year, value.month, 1),
+        timezone.get_current_timezone(),
+    )
+    return start, add_months(start, 1)
+
+
+def partition_name(table, month):
+    return f"{table}_p{month:%Y%m}"
+
+
+def is_partitioned(table):
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)",
+            [table],
+        )
+        return cursor.fetchone() is not None
+
+
+def list_partitions(table):
+    """
+    ``[(partition name, exclusive upper bound)]`` of ``table``, oldest first.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname, pg_get_expr(child.relpartbound, child.oid) "
+            "FROM pg_inherits JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = %s::regclass",
+            [table],
+        )
+        partitions = []
+        for name, bound in cursor.fetchall():
+            match = UPPER_BOUND.search(bound)
+            if match:
+                upper = datetime.datetime.fromisoformat(match.group(1))
+                partitions.append((name, upper))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def create_month_partition(table, month):
+    """
+    Create the partition of ``table`` for ``month`` unless it exists.
+    """
+    name = partition_name(table, month)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} "
+            f"FOR VALUES FROM (%s) TO (%s)",
+            [month, add_months(month, 1)],
+        )
+    return name
+
+
+def ensure_partitions(months_ahead, now=None):
+    """
+    Make sure every partitioned table has partitions up to ``months_ahead``
+    months past the current one. Returns the names of the partitions created.
+    """
+    last = add_months(month_start(now or timezone.now()), months_ahead + 1)
+    created = []
+    for model in PARTITIONED_MODELS:
+        table = model._meta.db_table
+        if not is_partitioned(table):
+            continue
+        partitions = list_partitions(table)
+        month = partitions[-1][1] if partitions else month_start(now or timezone.now())
+        while month < last:
+            created.append(create_month_partition(table, month))
+            month = add_months(month, 1)
+    return created
+
+
+def detach_partition(table, name, concurrently=True):
+    """
+    Detach ``name`` from ``table``.
+
+    ``CONCURRENTLY`` only holds a SHARE UPDATE EXCLUSIVE lock on the parent, so
+    reads and writes of other months carry on, but it can't run inside a
+    transaction block.
+    """
+    mode = " CONCURRENTLY" if concurrently else ""
+    with connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {table} DETACH PARTITION {name}{mode}")
+
+
+def archive_table(name, path):
+    """
+    Write the rows of ``name`` to ``path`` as gzipped CSV with a header.
+    """
+    sql = f"COPY {name} TO STDOUT WITH (FORMAT csv, HEADER)"
+    with gzip.open(path, "wb") as out, connection.cursor() as cursor:
+        raw = cursor.cursor
+        if hasattr(raw, "copy_expert"):  # psycopg2
+            raw.copy_expert(sql, out)
+        else:  # psycopg 3
+            with raw.copy(sql) as copy:
+                for data in copy:
+                    out.write(data)
+
+
+def is_empty(name):
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT NOT EXISTS (SELECT 1 FROM {name})")
+        return cursor.fetchone()[0]
+
+
+def drop_table(name):
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE {name}")
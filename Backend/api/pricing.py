@@ -0,0 +1,149 @@
+from decimal import Decimal
+
+import numpy as np
+
+# Fixed-point scales, as powers of ten. Prices are 2-place decimals and
+# percentages 2-place decimals, so every intermediate value of the Decimal
+# formulas in models.py is an exact integer at one of these scales.
+CENTS = 2
+BASIS_POINTS = 2  # percent * 100
+MICROS = 6  # quantity * price * percent
+TAX_PLACES = MICROS + 4  # price in micros * rate in 1/10000ths
+
+# SalesCreateSerilaizer charges 10% tax
+TAX_RATE = 1000  # basis points
+
+# Values below this keep int64 products of three factors safely in range
+_INT64_SAFE = 2**62
+
+
+def as_fixed(values, places):
+    """
+    Decimals (or anything Decimal accepts) -> integer array at ``places``.
+    Raises ValueError if a value has more decimal places than that.
+    """
+    result = []
+    for value in values:
+        scaled = Decimal(value).scaleb(places)
+        if scaled != scaled.to_integral_value():
+            raise ValueError(f"{value} has more than {places} decimal places")
+        result.append(int(scaled))
+    return _array(result)
+
+
+def to_decimal(value, places):
+    """
+    Integer at ``places`` -> exact Decimal.
+    """
+    return Decimal(int(value)).scaleb(-places)
+
+
+def _array(values):
+    array = np.asarray(values)
+    return array if array.dtype == object else array.astype(np.int64)
+
+
+def _safe_product(*arrays):
+    """
+    Element-wise product, switching to Python ints if int64 could overflow.
+    """
+    bound = 1
+    for array in arrays:
+        bound *= int(np.abs(array).max()) if len(array) else 0
+    if bound >= _INT64_SAFE:
+        arrays = [np.asarray(array, dtype=object) for array in arrays]
+    result = arrays[0]
+    for array in arrays[1:]:
+        result = result * array
+    return result
+
+
+def round_half_up(numerator, places):
+    """
+    Round fixed-point integers down by ``places`` digits, halves away from
+    zero (what PostgreSQL does when storing into numeric(…, 2)).
+    """
+    divisor = 10**places
+    numerator = np.asarray(numerator)
+    magnitude = (np.abs(numerator) + divisor // 2) // divisor
+    return np.where(numerator < 0, -magnitude, magnitude)
+
+
+def item_subtotals(quantity, unit_price, discount):
+    """
+    ``SalesItems.item_subtotal`` in micros, i.e. exactly
+    ``quantity * (unit_price - unit_price * (discount / 100))``.
+
+    ``unit_price`` is in cents and ``discount`` in basis points.
+    """
+    quantity, unit_price, discount = map(_array, (quantity, unit_price, discount))
+    return _safe_product(quantity, unit_price, 10000 - discount)
+
+
+def segment_sums(values, starts):
+    """
+    Sums of ``values`` over the runs beginning at ``starts`` (sorted rows).
+    """
+    if not len(values):
+        return values[:0]
+    if (
+        values.dtype != object
+        and int(np.abs(values).max()) * len(values) >= _INT64_SAFE
+    ):
+        values = values.astype(object)
+    return np.add.reduceat(values, starts)
+
+
+def sale_totals(sales_ids, quantity, unit_price, discount):
+    """
+    Per sale ``(ids, total_quantity, total_price in micros)`` of items given
+    as parallel arrays sorted by ``sales_ids``.
+    """
+    sales_ids = _array(sales_ids)
+    if not len(sales_ids):
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty
+    starts = np.flatnonzero(np.r_[True, sales_ids[1:] != sales_ids[:-1]])
+    subtotals = item_subtotals(quantity, unit_price, discount)
+    return (
+        sales_ids[starts],
+        segment_sums(_array(quantity), starts),
+        segment_sums(subtotals, starts),
+    )
+
+
+def taxes(total_price, rate=TAX_RATE):
+    """
+    ``total_price * rate`` at TAX_PLACES, from prices in micros and ``rate``
+    in basis points.
+    """
+    total_price = _array(total_price)
+    return _safe_product(total_price, np.full(len(total_price), rate, np.int64))
+
+
+def grand_totals(total_price, total_tax, overall_discount):
+    """
+    ``Sales.grand_total`` in micros from stored cents and basis points:
+    ``total_price + total_price * (total_tax / 100)
+    - total_price * (overall_discount / 100)``.
+    """
+    total_price, total_tax, overall_discount = map(
+        _array, (total_price, total_tax, overall_discount)
+    )
+    return _safe_product(total_price, 10000 + total_tax - overall_discount)
+
+
+def price_sale(quantities, unit_prices, discounts):
+    """
+    Exact ``(total_quantity, total_price, total_tax)`` of one sale's items, as
+    SalesCreateSerilaizer stores them, from Decimal prices and discounts.
+    """
+    subtotals = item_subtotals(
+        quantities, as_fixed(unit_prices, CENTS), as_fixed(discounts, BASIS_POINTS)
+    )
+    total_price = sum(subtotals.tolist())
+    return (
+        sum(quantities),
+        to_decimal(total_price, MICROS),
+        to_decimal(total_price * TAX_RATE, TAX_PLACES),
+    )
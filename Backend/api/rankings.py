@@ -0,0 +1,189 @@
+import datetime
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import DateField, Sum
+from django.db.models.functions import TruncDate, TruncMonth
+from django.utils import timezone
+
+from .models import (
+    Product,
+    ProductRanking,
+    ProductSalesDay,
+    ProductSalesMonth,
+    SalesItems,
+    Store,
+)
+from .partitions import add_months, month_start
+from .reconcile import SUBTOTAL_X100
+
+CENT = Decimal("0.01")
+
+
+def window_start(now):
+    """
+    First month counted in the rankings: ``now``'s month and the
+    ``RANKINGS["MONTHS"] - 1`` before it.
+    """
+    return add_months(month_start(now), 1 - settings.RANKINGS["MONTHS"]).date()
+
+
+def accumulate(watermark, upto):
+    """
+    Add the items created in ``(watermark, upto]`` to the monthly and the
+    daily totals, one INSERT ... SELECT ... ON CONFLICT each, and return the
+    ids of the stores they were sold in. The joined sales are bounded too, so
+    both tables only read the partitions of that window.
+    """
+    # A sale is created in the transaction that creates its items, and those
+    # commit within SETTLE_SECONDS (see refresh)
+    items = SalesItems.objects.filter(created_at__lte=upto, sales__created_at__lte=upto)
+    if watermark is not None:
+        since = watermark - datetime.timedelta(
+            seconds=settings.RANKINGS["SETTLE_SECONDS"]
+        )
+        items = items.filter(created_at__gt=watermark, sales__created_at__gt=since)
+    totals = (
+        items.annotate(
+            month=TruncMonth(
+                "created_at", output_field=DateField(), tzinfo=datetime.timezone.utc
+            )
+        )
+        .values("sales__store_id", "product_id", "month")
+        .annotate(sold=Sum("quantity"), subtotal=Sum(SUBTOTAL_X100) / 100)
+        .order_by()
+    )
+    # Local days, as forecasts count them
+    days = (
+        items.annotate(day=TruncDate("created_at"))
+        .values("sales__store_id", "product_id", "day")
+        .annotate(sold=Sum("quantity"))
+        .order_by()
+    )
+    sql, params = totals.query.sql_with_params()
+    table = ProductSalesMonth._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (store_id, product_id, month, quantity, revenue) "
+            f"{sql} ON CONFLICT (store_id, month, product_id) DO UPDATE SET "
+            f"quantity = {table}.quantity + excluded.quantity, "
+            f"revenue = {table}.revenue + excluded.revenue RETURNING store_id",
+            params,
+        )
+        store_ids = {store_id for store_id, in cursor.fetchall()}
+        sql, params = days.query.sql_with_params()
+        table = ProductSalesDay._meta.db_table
+        cursor.execute(
+            f"INSERT INTO {table} (store_id, product_id, day, quantity) {sql} "
+            f"ON CONFLICT (store_id, day, product_id) DO UPDATE SET "
+            f"quantity = {table}.quantity + excluded.quantity",
+            params,
+        )
+    return store_ids
+
+
+def rank(store_id, since):
+    """
+    ``(top_products, abc)`` of a store, or of all stores when ``store_id`` is
+    None, from the monthly totals since ``since``. Best sellers are ranked by
+    units, like the dashboard; ABC classes by revenue: A until
+    ``RANKINGS["ABC"][0]`` percent of it, B until ``RANKINGS["ABC"][1]``.
+    """
+    totals = ProductSalesMonth.objects.filter(month__gte=since)
+    if store_id is not None:
+        totals = totals.filter(store_id=store_id)
+    rows = list(
+        totals.values("product_id")
+        .annotate(quantity=Sum("quantity"), revenue=Sum("revenue"))
+        .order_by("-revenue", "product_id")
+        .values_list("product_id", "quantity", "revenue")
+    )
+
+    a_share, b_share = settings.RANKINGS["ABC"]
+    total = sum(revenue for _, _, revenue in rows)
+    abc = {name: {"products": [], "revenue": Decimal(0)} for name in "ABC"}
+    running = Decimal(0)
+    for product_id, _, revenue in rows:
+        # Classed by the share sold before it, so the product crossing a
+        # threshold still belongs to the higher class
+        if running * 100 < a_share * total:
+            name = "A"
+        elif running * 100 < b_share * total:
+            name = "B"
+        else:
+            name = "C"
+        abc[name]["products"].append(product_id)
+        abc[name]["revenue"] += revenue
+        running += revenue
+    for entry in abc.values():
+        entry["revenue"] = str(entry["revenue"].quantize(CENT))
+
+    best = sorted(rows, key=lambda row: (-row[1], row[0]))[: settings.RANKINGS["TOP"]]
+    names = dict(
+        Product.objects.filter(id__in=[row[0] for row in best]).values_list(
+            "id", "product_name"
+        )
+    )
+    top_products = [
+        {
+            "product": product_id,
+            "product_name": names.get(product_id),
+            "quantity": quantity,
+            "revenue": str(revenue.quantize(CENT)),
+        }
+        for product_id, quantity, revenue in best
+    ]
+    return top_products, abc
+
+
+def refresh(rebuild=False):
+    """
+    Add the sales items created since the last refresh to the monthly (and
+    daily) totals and re-rank all stores and the stores they were sold in;
+    every store when the window moved to a new month.
+
+    Items younger than ``RANKINGS["SETTLE_SECONDS"]`` are left for the next
+    run so rows from transactions still in flight aren't skipped past.
+    Updated and deleted items are only picked up by a ``rebuild``, which
+    recounts the live tables (archived months aren't counted again). Returns
+    the number of stores re-ranked.
+    """
+    upto = timezone.now() - datetime.timedelta(
+        seconds=settings.RANKINGS["SETTLE_SECONDS"]
+    )
+    with transaction.atomic():
+        ProductRanking.objects.get_or_create(store=None)
+        # Locking the ranking of all stores serializes refreshes
+        ranking = ProductRanking.objects.select_for_update().get(store=None)
+        watermark = None if rebuild else ranking.counted_until
+        if watermark is not None and upto <= watermark:
+            return 0
+        if rebuild:
+            ProductSalesMonth.objects.all().delete()
+            ProductSalesDay.objects.all().delete()
+
+        store_ids = accumulate(watermark, upto)
+        if watermark is None or month_start(watermark) != month_start(upto):
+            store_ids = set(Store.objects.values_list("id", flat=True))
+        since = window_start(upto)
+        for store_id in sorted(store_ids):
+            top_products, abc = rank(store_id, since)
+            ProductRanking.objects.update_or_create(
+                store_id=store_id,
+                defaults={"top_products": top_products, "abc": abc},
+            )
+        ranking.top_products, ranking.abc = rank(None, since)
+        ranking.save()
+        # Rankings of stores without new sales are current too
+        ProductRanking.objects.update(counted_until=upto)
+    return len(store_ids)
+
+
+def get_ranking(store_id=None):
+    """
+    The ranking of a store, or of all stores; an empty one before the first
+    refresh.
+    """
+    ranking = ProductRanking.objects.filter(store_id=store_id).first()
+    return ranking or ProductRanking(store_id=store_id)
@@ -0,0 +1,133 @@
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import connections
+from django.db.models import (
+    DecimalField,
+    Exists,
+    ExpressionWrapper,
+    F,
+    Max,
+    Min,
+    OuterRef,
+    Sum,
+)
+from django.utils import timezone
+
+from .models import Sales, SalesItems
+from .pricing import TAX_RATE
+
+CENT = Decimal("0.01")
+TOTAL_FIELDS = ["total_quantity", "total_price", "total_tax"]
+NO_ITEMS = (0, Decimal("0.00"), Decimal("0.00"))
+
+# quantity * unit_price * (100 - discount), i.e. the item subtotal * 100, so
+# the database sums exact numerics without any division
+SUBTOTAL_X100 = ExpressionWrapper(
+    F("quantity") * F("unit_price") * (100 - F("discount")),
+    output_field=DecimalField(max_digits=30, decimal_places=4),
+)
+
+
+def id_chunks(chunk_size):
+    """
+    ``[(first id, last id + 1)]`` ranges covering every sale, and the sale ids
+    of items whose sale is gone.
+    """
+    sales = Sales.objects.aggregate(low=Min("id"), high=Max("id"))
+    items = SalesItems.objects.aggregate(low=Min("sales_id"), high=Max("sales_id"))
+    lows = [bound for bound in (sales["low"], items["low"]) if bound is not None]
+    highs = [bound for bound in (sales["high"], items["high"]) if bound is not None]
+    if not lows:
+        return []
+    low, high = min(lows), max(highs)
+    return [
+        (start, min(start + chunk_size, high + 1))
+        for start in range(low, high + 1, chunk_size)
+    ]
+
+
+def expected_totals(low, high, since=None):
+    """
+    ``{sales id: (total_quantity, total_price, total_tax)}`` recomputed from
+    the items of sales ``low <= id < high`` with one aggregate query, rounded
+    the way the database stores them. Items are never older than their sale,
+    so the oldest sale's ``since`` bounds the item partitions scanned.
+    """
+    items = SalesItems.objects.filter(sales_id__gte=low, sales_id__lt=high)
+    if since is not None:
+        items = items.filter(created_at__gte=since)
+    rows = (
+        items.values("sales_id")
+        .annotate(item_quantity=Sum("quantity"), subtotal_x100=Sum(SUBTOTAL_X100))
+        .order_by()
+    )
+    totals = {}
+    for row in rows:
+        price = Decimal(row["subtotal_x100"]) / 100
+        totals[row["sales_id"]] = (
+            row["item_quantity"],
+            price.quantize(CENT, ROUND_HALF_UP),
+            (price * TAX_RATE / 10000).quantize(CENT, ROUND_HALF_UP),
+        )
+    return totals
+
+
+def orphaned_items(low, high):
+    """
+    ``[(item id, sales id)]`` of the items of sales ``low <= id < high`` whose
+    sale doesn't exist. The partitioned tables have no database foreign key
+    (migration 0003), so only the ORM's cascade keeps them consistent.
+    """
+    sales = Sales.objects.filter(id=OuterRef("sales_id"), id__gte=low, id__lt=high)
+    return list(
+        SalesItems.objects.filter(sales_id__gte=low, sales_id__lt=high)
+        .filter(~Exists(sales))
+        .values_list("id", "sales_id")
+        .order_by("id")
+    )
+
+
+def reconcile_chunk(low, high, fix=False):
+    """
+    Compare the stored totals of sales ``low <= id < high`` with their items.
+    Returns ``(sales checked, [(id, stored, expected)], orphaned items)``;
+    with ``fix`` the mismatches are written back with one ``bulk_update``.
+    Orphaned items are only reported.
+    """
+    orphans = orphaned_items(low, high)
+    stored = list(
+        Sales.objects.filter(id__gte=low, id__lt=high).values_list(
+            "id", "created_at", *TOTAL_FIELDS
+        )
+    )
+    if not stored:
+        return 0, [], orphans
+    expected = expected_totals(low, high, since=min(row[1] for row in stored))
+    mismatches = []
+    for pk, _, *values in stored:
+        want = expected.get(pk, NO_ITEMS)
+        if tuple(values) != want:
+            mismatches.append((pk, tuple(values), want))
+
+    if fix and mismatches:
+        now = timezone.now()
+        Sales.objects.bulk_update(
+            [
+                Sales(pk=pk, updated_at=now, **dict(zip(TOTAL_FIELDS, want)))
+                for pk, _, want in mismatches
+            ],
+            [*TOTAL_FIELDS, "updated_at"],
+            batch_size=1000,
+        )
+    return len(stored), mismatches, orphans
+
+
+def reconcile_chunk_in_worker(low, high, fix=False):
+    """
+    ``reconcile_chunk`` for a process pool.
+    """
+    try:
+        return reconcile_chunk(low, high, fix)
+    finally:
+        # Pool workers keep running between chunks; don't hold connections idle
+        connections.close_all()
@@ -1,7 +1,15 @@
 from rest_framework import serializers
 from .models import *
+from .cache import reference_cache
+from .analytics import GROUP_COLUMNS
+from .pricing import price_sale
+from .tasks import TASKS, check_payload
+from .outbox import record, sale_payload
+from collections import defaultdict
 from decimal import Decimal
+from django.conf import settings
 from django.db import transaction
+from django.utils import timezone
 
 
 class ProductSerializer(serializers.ModelSerializer):
@@ -22,7 +30,7 @@ class SupplierSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Supplier
-        fields = ["name", "contact"]
+        fields = ["name", "contact_no"]
 
 
 class StoreAdminSerializer(serializers.ModelSerializer):
@@ -31,13 +39,38 @@ class StoreAdminSerializer(serializers.ModelSerializer):
         fields = ["username", "email"]
 
 
+class CachedReferenceField(serializers.Field):
+    """
+    Read-only nested representation of a reference row, served from the
+    per-process reference cache so only the foreign key is needed from the row.
+    """
+
+    def __init__(self, namespace, serializer_class, select_related=(), **kwargs):
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+        self.namespace = namespace
+        self.serializer_class = serializer_class
+        self.select_related = select_related
+
+    def load(self, pk):
+        model = self.serializer_class.Meta.model
+        instance = model.objects.select_related(*self.select_related).filter(pk=pk)
+        instance = instance.first()
+        if instance is None:
+            return None
+        return dict(self.serializer_class(instance).data)
+
+    def to_representation(self, value):
+        return reference_cache.get(self.namespace, value, self.load)
+
+
 class StoreSerializer(serializers.ModelSerializer):
-    store_admin = StoreAdminSerializer(read_only=True)
+    store_admin = StoreAdminSerializer(read_only=True, source="admin")
     store_admin_id = serializers.PrimaryKeyRelatedField(
-        queryset=StoreAdmin.objects.all(), write_only=True, source="store_admin"
+        queryset=StoreAdmin.objects.all(), write_only=True, source="admin"
     )
 
-    address = AddressSerializer(read_only=True)
+    address = CachedReferenceField("address", AddressSerializer, source="address_id")
     address_id = serializers.PrimaryKeyRelatedField(
         queryset=Address.objects.all(), write_only=True, source="address"
     )
@@ -47,9 +80,17 @@ class StoreSerializer(serializers.ModelSerializer):
         fields = ["name", "store_admin", "store_admin_id", "address", "address_id"]
 
 
+class CachedStoreField(CachedReferenceField):
+    def __init__(self, **kwargs):
+        kwargs.setdefault("source", "store_id")
+        super().__init__(
+            "store", StoreSerializer, select_related=("admin", "address"), **kwargs
+        )
+
+
 class InventoryReadSerializer(serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
-    store = StoreSerializer(read_only=True)
+    store = CachedStoreField()
 
     class Meta:
         model = Inventory
@@ -60,6 +101,7 @@ class InventoryReadSerializer(serializers.ModelSerializer):
             "supplier",
             "reorder_level",
             "last_restock_date",
+            "version",
             "created_at",
         ]
 
@@ -69,6 +111,7 @@ class InventoryCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Inventory
         fields = "__all__"
+        read_only_fields = ["version"]
 
 
 class SalesItemsSerializer(serializers.ModelSerializer):
@@ -80,7 +123,7 @@ class SalesItemsSerializer(serializers.ModelSerializer):
 
 
 class SalesReadSerializer(serializers.ModelSerializer):
-    store = StoreSerializer(read_only=True)
+    store = CachedStoreField()
 
     class SalesItemsCreateSerializer(serializers.ModelSerializer):
         class Meta:
@@ -99,12 +142,20 @@ class SalesReadSerializer(serializers.ModelSerializer):
             "total_price",
             "overall_discount",
             "grand_total",
+            "version",
             "created_at",
         ]
 
 
+class SalesItemsWriteSerializer(serializers.ModelSerializer):
+    # Prices and discounts are taken from the product when the sale is saved
+    class Meta:
+        model = SalesItems
+        fields = ["product", "quantity"]
+
+
 class SalesCreateSerilaizer(serializers.ModelSerializer):
-    sales_item = SalesItemsSerializer(many=True)
+    sales_item = SalesItemsWriteSerializer(many=True)
 
     class Meta:
         model = Sales
@@ -118,6 +169,7 @@ class SalesCreateSerilaizer(serializers.ModelSerializer):
             "total_tax",
             "overall_discount",
             "grand_total",
+            "version",
         ]
 
         read_only_fields = [
@@ -126,6 +178,7 @@ class SalesCreateSerilaizer(serializers.ModelSerializer):
             "total_tax",
             "overall_discount",
             "grand_total",
+            "version",
         ]
 
     # PAYLOAD
@@ -152,80 +205,216 @@ class SalesCreateSerilaizer(serializers.ModelSerializer):
             raise serializers.ValidationError("Store is required.")
 
         with transaction.atomic():
-            total_quantity = 0
-            total_price = Decimal("0.00")
-
             sales = Sales.objects.create(store=store, **validated_data)
 
-            for item in sales_items_data:
-                product = item["product"]
-                quantity = item["quantity"]
-
-                total_quantity += quantity
-                effective_price = product.sale_price - (
-                    product.sale_price * (product.discount / Decimal("100"))
-                )
-                subtotal = effective_price * quantity
-                total_price += subtotal
-
-                SalesItems.objects.create(
+            products = [item["product"] for item in sales_items_data]
+            quantities = [item["quantity"] for item in sales_items_data]
+            total_quantity, total_price, total_tax = price_sale(
+                quantities,
+                [product.sale_price for product in products],
+                [product.discount for product in products],
+            )
+            items = SalesItems.objects.bulk_create(
+                SalesItems(
                     sales=sales,
                     product=product,
                     quantity=quantity,
                     unit_price=product.sale_price,
                     discount=product.discount,
                 )
+                for product, quantity in zip(products, quantities)
+            )
 
             discount_percent = validated_data.get("overall_discount", Decimal("0"))
-            total_tax = Decimal("0.10") * total_price  # 10% tax
 
             sales.total_quantity = total_quantity
             sales.total_price = total_price
             sales.total_tax = total_tax
             sales.overall_discount = discount_percent
             sales.save()
+            record("sale.created", sales.store_id, sales.id, sale_payload(sales, items))
 
         return sales
 
+    def sync_items(self, sale, items_data):
+        """
+        Make ``sale``'s items match ``items_data`` with as few writes as
+        possible: items are matched by product, changed ones updated in place
+        and only the rest inserted or deleted. Prices and discounts are
+        refreshed from the products. Returns the items in payload order.
+        """
+        existing = defaultdict(list)
+        # Usually prefetched by the view
+        for item in sorted(sale.sales_item.all(), key=lambda item: item.id):
+            existing[item.product_id].append(item)
+
+        items, changed, added = [], [], []
+        now = timezone.now()
+        for data in items_data:
+            product = data["product"]
+            values = {
+                "quantity": data["quantity"],
+                "unit_price": product.sale_price,
+                "discount": product.discount,
+            }
+            if existing[product.id]:
+                item = existing[product.id].pop(0)
+                if any(getattr(item, name) != value for name, value in values.items()):
+                    for name, value in values.items():
+                        setattr(item, name, value)
+                    item.updated_at = now
+                    changed.append(item)
+            else:
+                item = SalesItems(sales=sale, product=product, **values)
+                added.append(item)
+            items.append(item)
+
+        removed = [item.id for left in existing.values() for item in left]
+        if removed:
+            SalesItems.objects.filter(sales=sale, id__in=removed).delete()
+        if changed:
+            SalesItems.objects.bulk_update(
+                changed, ["quantity", "unit_price", "discount", "updated_at"]
+            )
+        if added:
+            SalesItems.objects.bulk_create(added)
+        return items
+
     def update(self, instance, validated_data):
-        sales_items_data = validated_data.pop("sales_item", [])
         discount = validated_data.pop("overall_discount", instance.overall_discount)
 
-        total_quantity = 0
-        total_price = 0
-
         with transaction.atomic():
-            # Delete old sales items
-            instance.sales_item.all().delete()
-
-            for item in sales_items_data:
-                product = Product.objects.get(id=item["product"].id)
-                quantity = item["quantity"]
-                unit_price = product.sale_price
-                product_discount = product.discount
-
-                total_quantity += quantity
-                item_price = quantity * (
-                    unit_price - (unit_price * product_discount / 100)
-                )
-                total_price += item_price
-
-                SalesItems.objects.create(
-                    sales=instance,
-                    product=product,
-                    quantity=quantity,
-                    unit_price=unit_price,
-                    discount=product_discount,
+            if "sales_item" in validated_data:
+                items = self.sync_items(instance, validated_data.pop("sales_item"))
+                total_quantity, total_price, total_tax = price_sale(
+                    [item.quantity for item in items],
+                    [item.unit_price for item in items],
+                    [item.discount for item in items],
                 )
+                # Update the instance fields
+                instance.total_quantity = total_quantity
+                instance.total_price = total_price
+                instance.total_tax = total_tax
+            else:
+                # A partial update without items keeps them
+                items = list(instance.sales_item.all())
 
-            total_tax = total_price * 0.10
-            grand_total = total_price + total_tax - (total_price * (discount / 100))
-
-            # Update the instance fields
-            instance.total_quantity = total_quantity
-            instance.total_price = total_price
-            instance.total_tax = total_tax
             instance.overall_discount = discount
             instance.save()
+            record(
+                "sale.updated",
+                instance.store_id,
+                instance.id,
+                sale_payload(instance, items),
+            )
 
         return instance
+
+
+class AnalyticsQuerySerializer(serializers.Serializer):
+    group_by = serializers.CharField(required=False, default="")
+    start = serializers.DateTimeField(required=False)
+    end = serializers.DateTimeField(required=False)
+    store = serializers.IntegerField(required=False)
+
+    def validate_group_by(self, value):
+        names = [name.strip() for name in value.split(",") if name.strip()]
+        unknown = set(names) - set(GROUP_COLUMNS)
+        if unknown:
+            raise serializers.ValidationError(
+                f"Can't group by {', '.join(sorted(unknown))}; "
+                f"choose from {', '.join(GROUP_COLUMNS)}."
+            )
+        return list(dict.fromkeys(names))
+
+
+class StoreKPISerializer(serializers.ModelSerializer):
+    class Meta:
+        model = StoreKPI
+        fields = [
+            "store",
+            "day",
+            "revenue",
+            "items_sold",
+            "sales_count",
+            "low_stock_count",
+            "top_products",
+            "sales_per_hour",
+            "source",
+            "refreshed_at",
+        ]
+
+
+class ProductRankingSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ProductRanking
+        fields = ["store", "top_products", "abc", "counted_until", "refreshed_at"]
+
+
+class RankingQuerySerializer(serializers.Serializer):
+    limit = serializers.IntegerField(required=False, min_value=1)
+
+
+class ReorderSuggestionSerializer(serializers.ModelSerializer):
+    product_name = serializers.CharField(source="product.product_name")
+
+    class Meta:
+        model = ReorderSuggestion
+        fields = [
+            "product",
+            "product_name",
+            "on_hand",
+            "daily_demand",
+            "reorder_level",
+            "reorder_quantity",
+            "computed_at",
+        ]
+
+
+class TaskSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Task
+        fields = [
+            "id",
+            "name",
+            "payload",
+            "status",
+            "attempts",
+            "max_attempts",
+            "run_at",
+            "result",
+            "error",
+            "created_by",
+            "created_at",
+            "finished_at",
+        ]
+        read_only_fields = [
+            "status",
+            "attempts",
+            "max_attempts",
+            "result",
+            "error",
+            "created_by",
+            "created_at",
+            "finished_at",
+        ]
+
+    def validate(self, attrs):
+        try:
+            check_payload(attrs["name"], attrs.get("payload") or {})
+        except ValueError as error:
+            raise serializers.ValidationError({"name": str(error)})
+        attrs["max_attempts"] = TASKS[attrs["name"]][1]
+        return attrs
+
+
+class SyncRequestSerializer(serializers.Serializer):
+    cursor = serializers.CharField(required=False, allow_blank=True, default="")
+    store = serializers.IntegerField(required=False)  # superusers only
+    sales = serializers.ListField(child=serializers.DictField(), default=list)
+
+    def validate_sales(self, value):
+        limit = settings.SYNC["MAX_PUSH"]
+        if len(value) > limit:
+            raise serializers.ValidationError(f"Push at most {limit} sales at once.")
+        return value
@@ -0,0 +1,216 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .authentication import revoke_user_tokens
+from .cache import reference_cache
+from .changes import tombstone_store_id
+from .dashboard import count_on_commit
+from .outbox import inventory_payload, movement_payload, record
+from .models import (
+    Address,
+    Inventory,
+    InventoryMovement,
+    Product,
+    Sales,
+    Store,
+    StoreAdmin,
+    Supplier,
+    Tombstone,
+)
+
+# Shared version namespaces to bump when a model changes. Store entries embed
+# their address and admin, so those changes invalidate stores as well. Product
+# and inventory versions only feed conditional GET validators.
+VERSION_NAMESPACES = {
+    Store: ("store", "store_by_admin"),
+    Address: ("address", "store"),
+    StoreAdmin: ("storeadmin", "store"),
+    Supplier: ("supplier",),
+    Product: ("product",),
+    Inventory: ("inventory",),
+}
+
+
+@receiver(post_save, sender=Store)
+@receiver(post_save, sender=Address)
+@receiver(post_save, sender=StoreAdmin)
+@receiver(post_save, sender=Supplier)
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Inventory)
+@receiver(post_delete, sender=Store)
+@receiver(post_delete, sender=Address)
+@receiver(post_delete, sender=StoreAdmin)
+@receiver(post_delete, sender=Supplier)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Inventory)
+def bump_versions(sender, update_fields=None, **kwargs):
+    # Logins only touch last_login, which is never cached
+    if update_fields is not None and set(update_fields) == {"last_login"}:
+        return
+    namespaces = VERSION_NAMESPACES[sender]
+    # Bump after commit so no process can re-cache the old row under the new version
+    transaction.on_commit(lambda: reference_cache.bump(*namespaces))
+
+
+# Token users carry is_superuser and store_id claims, so changing either must
+# revoke the tokens issued with the old values
+
+
+@receiver(pre_save, sender=StoreAdmin)
+def note_superuser_change(sender, instance, update_fields=None, **kwargs):
+    instance._superuser_changed = False
+    if instance.pk is None or (
+        update_fields is not None and "is_superuser" not in update_fields
+    ):
+        return
+    previous = (
+        StoreAdmin.objects.filter(pk=instance.pk)
+        .values_list("is_superuser", flat=True)
+        .first()
+    )
+    instance._superuser_changed = (
+        previous is not None and previous != instance.is_superuser
+    )
+
+
+@receiver(post_save, sender=StoreAdmin)
+def revoke_admin_tokens(sender, instance, **kwargs):
+    # Token users also skip the is_active check
+    if not instance.is_active or getattr(instance, "_superuser_changed", False):
+        revoke_user_tokens(instance.pk)
+
+
+@receiver(pre_save, sender=Store)
+def note_admin_change(sender, instance, **kwargs):
+    instance._previous_admin_id = instance.pk and (
+        Store.objects.filter(pk=instance.pk).values_list("admin_id", flat=True).first()
+    )
+
+
+@receiver(post_save, sender=Store)
+def revoke_reassigned_admin_tokens(sender, instance, **kwargs):
+    previous = getattr(instance, "_previous_admin_id", None)
+    if previous != instance.admin_id:
+        for admin_id in {previous, instance.admin_id} - {None}:
+            revoke_user_tokens(admin_id)
+
+
+# Dashboard KPIs (api/dashboard.py) follow each sale and stock change as a
+# delta on the store's record. The values a row had when loaded are noted
+# before it saves. Deletes only count when the row itself was deleted:
+# cascades (a deleted store or product) and batch deletes (archive_month) are
+# left to the scheduled refresh_store_kpis, like writes that skip signals.
+
+
+def is_today(value):
+    return timezone.localdate(value) == timezone.localdate()
+
+
+def is_low(quantity, reorder_level):
+    return quantity <= reorder_level
+
+
+@receiver(pre_save, sender=Sales)
+def note_sale_totals(sender, instance, **kwargs):
+    # Kept up to date by the post_save below once the instance saved
+    if not hasattr(instance, "_kpi_totals"):
+        instance._kpi_totals = instance.pk and (
+            Sales.objects.filter(pk=instance.pk, created_at=instance.created_at)
+            .values_list("total_price", "total_quantity")
+            .first()
+        )
+
+
+@receiver(post_save, sender=Sales)
+def count_sale_kpis(sender, instance, created, **kwargs):
+    price, quantity = getattr(instance, "_kpi_totals", None) or (0, 0)
+    instance._kpi_totals = (instance.total_price, instance.total_quantity)
+    if is_today(instance.created_at):
+        count_on_commit(
+            instance.store_id,
+            revenue=instance.total_price - price,
+            items_sold=instance.total_quantity - quantity,
+            sales_count=int(created),
+        )
+
+
+@receiver(post_delete, sender=Sales)
+def uncount_sale_kpis(sender, instance, origin=None, **kwargs):
+    if origin is instance and is_today(instance.created_at):
+        count_on_commit(
+            instance.store_id,
+            revenue=-instance.total_price,
+            items_sold=-instance.total_quantity,
+            sales_count=-1,
+        )
+
+
+@receiver(pre_save, sender=Inventory)
+def note_low_stock(sender, instance, **kwargs):
+    if not hasattr(instance, "_kpi_low"):
+        previous = instance.pk and (
+            Inventory.objects.filter(pk=instance.pk)
+            .values_list("quantity", "reorder_level")
+            .first()
+        )
+        instance._kpi_low = bool(previous) and is_low(*previous)
+
+
+@receiver(post_save, sender=Inventory)
+def count_low_stock(sender, instance, **kwargs):
+    was_low = getattr(instance, "_kpi_low", False)
+    instance._kpi_low = is_low(instance.quantity, instance.reorder_level)
+    count_on_commit(
+        instance.store_id, low_stock_count=int(instance._kpi_low) - int(was_low)
+    )
+
+
+@receiver(post_delete, sender=Inventory)
+def uncount_low_stock(sender, instance, origin=None, **kwargs):
+    if origin is instance and is_low(instance.quantity, instance.reorder_level):
+        count_on_commit(instance.store_id, low_stock_count=-1)
+
+
+# Outbox events for stock changes. Deletes run in Django's own transaction;
+# saves must be wrapped in one by the caller (InventoryViewsSet and the admin
+# do) for the event to commit together with the change.
+
+
+@receiver(post_save, sender=Inventory)
+def record_inventory_saved(sender, instance, created, **kwargs):
+    topic = "inventory.created" if created else "inventory.updated"
+    record(topic, instance.store_id, instance.id, inventory_payload(instance))
+
+
+@receiver(post_delete, sender=Inventory)
+def record_inventory_deleted(sender, instance, **kwargs):
+    record("inventory.deleted", instance.store_id, instance.id, {"id": instance.id})
+
+
+@receiver(post_save, sender=InventoryMovement)
+def record_inventory_movement(sender, instance, created, **kwargs):
+    if created:
+        record(
+            "inventory.movement",
+            instance.inventory.store_id,
+            instance.id,
+            movement_payload(instance),
+        )
+
+
+# Tombstones for change tracking (api/changes.py). Django sends post_delete for
+# every cascaded row too, e.g. a product's inventory, and for queryset deletes.
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Store)
+@receiver(post_delete, sender=Supplier)
+@receiver(post_delete, sender=Inventory)
+def record_tombstone(sender, instance, **kwargs):
+    Tombstone.objects.create(
+        model=sender._meta.model_name,
+        object_id=instance.pk,
+        store_id=tombstone_store_id(instance),
+    )
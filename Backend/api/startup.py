@@ -0,0 +1,185 @@
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import OperationalError, connections
+from django.urls import URLPattern, URLResolver, get_resolver
+from rest_framework_simplejwt.tokens import AccessToken
+
+# What a worker does before it can serve: set Django up and load the URLconf
+BOOT = """
+import time
+started = time.perf_counter()
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+print(round((time.perf_counter() - started) * 1000, 1))
+"""
+
+# Boot, then time the first and second request; the parent passes the path,
+# token and whether to preload in the environment
+FIRST_REQUEST = """
+import json, os, time
+started = time.perf_counter()
+import django
+django.setup()
+from django.test import Client, override_settings
+from django.urls import get_resolver
+get_resolver().url_patterns
+client = Client(HTTP_AUTHORIZATION="Bearer " + os.environ["BENCH_TOKEN"])
+client.handler.load_middleware()  # as get_wsgi_application() does
+booted = time.perf_counter()
+if os.environ["BENCH_PRELOAD"] == "1":
+    from api.startup import preload
+    preload()
+ready = time.perf_counter()
+with override_settings(ALLOWED_HOSTS=["testserver"]):
+    times = []
+    for _ in range(2):
+        sent = time.perf_counter()
+        status = client.get(os.environ["BENCH_PATH"]).status_code
+        times.append(time.perf_counter() - sent)
+print(json.dumps({
+    "boot": booted - started,
+    "preload": ready - booted,
+    "first": times[0],
+    "second": times[1],
+    "status": status,
+}))
+"""
+
+
+def _run(code, env=None, *options):
+    result = subprocess.run(
+        [sys.executable, *options, "-c", code],
+        cwd=settings.BASE_DIR,
+        env={**os.environ, **(env or {})},
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    if result.returncode:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    return result
+
+
+def import_times():
+    """
+    ``(boot ms, [(module, own µs, cumulative µs)])`` of a fresh
+    interpreter running ``BOOT`` under ``python -X importtime``.
+    """
+    result = _run(BOOT, None, "-X", "importtime")
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        own, cumulative, name = line.removeprefix("import time:").split("|")
+        modules.append((name.strip(), int(own), int(cumulative)))
+    return float(result.stdout.strip().splitlines()[-1]), modules
+
+
+def by_package(modules):
+    """
+    Own import time (µs) per top-level package, largest first.
+    """
+    totals = defaultdict(int)
+    for name, own, _ in modules:
+        totals[name.split(".")[0]] += own
+    return sorted(totals.items(), key=lambda item: -item[1])
+
+
+def first_request(path, token, preloaded):
+    """
+    Seconds a fresh worker spends booting, preloading and serving its first
+    and second GET of ``path``.
+    """
+    env = {
+        "BENCH_PATH": path,
+        "BENCH_TOKEN": token,
+        "BENCH_PRELOAD": "1" if preloaded else "0",
+    }
+    return json.loads(_run(FIRST_REQUEST, env).stdout.strip().splitlines()[-1])
+
+
+def _patterns(patterns):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield pattern
+            yield from _patterns(pattern.url_patterns)
+        elif isinstance(pattern, URLPattern):
+            yield pattern
+
+
+def _warm_urls():
+    # Routes compile their regexes on first match, reverse() its lookups
+    resolver = get_resolver()
+    resolver.reverse_dict
+    for pattern in _patterns(resolver.url_patterns):
+        pattern.pattern.regex
+
+
+def _warm_auth():
+    # The first token check imports the JWT backend and its algorithms
+    token = AccessToken()
+    AccessToken(str(token))
+
+
+def _view_attributes(name):
+    seen = set()
+    for pattern in _patterns(get_resolver().url_patterns):
+        view = getattr(pattern, "callback", None)
+        value = getattr(getattr(view, "cls", None), name, None)
+        if value is not None and value not in seen:
+            seen.add(value)
+            yield value
+
+
+def _warm_serializers():
+    # Building the fields once also fills the models' _meta caches and imports
+    # what the fields need
+    for serializer_class in _view_attributes("serializer_class"):
+        serializer_class().fields
+
+
+def _warm_filters():
+    # Builds each filter's form field and label once, which loads the
+    # translation catalogs
+    for filterset_class in _view_attributes("filterset_class"):
+        filterset_class(queryset=filterset_class._meta.model.objects.none()).form
+
+
+def _warm_database():
+    # Only persistent connections outlive the first request
+    for connection in connections.all():
+        if connection.settings_dict["CONN_MAX_AGE"] != 0:
+            try:
+                connection.ensure_connection()
+            except OperationalError:
+                pass  # The first request reports it
+
+
+def preload():
+    """
+    Do what a worker's first requests would otherwise pay for: compile the
+    URL routes, load the JWT backend, build the serializers' fields and the
+    filter forms and open persistent database connections.
+    Returns ``{step: ms}``.
+    """
+    timings = {}
+
+    def step(name, func):
+        started = time.perf_counter()
+        func()
+        timings[name] = (time.perf_counter() - started) * 1000
+
+    step("urls", _warm_urls)
+    step("auth", _warm_auth)
+    step("serializers", _warm_serializers)
+    step("filters", _warm_filters)
+    step("database", _warm_database)
+    return timings
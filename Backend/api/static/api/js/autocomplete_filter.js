@@ -0,0 +1,18 @@
+'use strict';
+{
+    const $ = django.jQuery;
+
+    // Reload the changelist filtered on the picked object (or unfiltered when
+    // cleared), starting again from the first page
+    $(function() {
+        $('.api-autocomplete-filter').on('change', function() {
+            const params = new URLSearchParams(window.location.search);
+            params.delete(this.name);
+            params.delete('p');
+            if (this.value) {
+                params.set(this.name, this.value);
+            }
+            window.location.search = params.toString();
+        });
+    });
+}
@@ -0,0 +1,181 @@
+import base64
+import binascii
+import hashlib
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.utils.dateparse import parse_datetime
+from rest_framework import serializers, status
+from rest_framework.exceptions import APIException, ValidationError
+
+from .changes import changes_since, oldest_mark
+from .models import Inventory, Product, Supplier, SyncedSale
+from .serializers import SalesCreateSerilaizer
+
+# name -> (model, columns sent); store scoped models only send the client's rows.
+# Products are sent whole: a product the store stocks later has an updated_at
+# behind the client's watermark, and product deletes belong to no store.
+STREAMS = {
+    "products": (
+        Product,
+        (
+            "id",
+            "product_name",
+            "cost_price",
+            "sale_price",
+            "discount",
+            "description",
+            "updated_at",
+        ),
+    ),
+    "suppliers": (Supplier, ("id", "name", "contact_no", "updated_at")),
+    "inventory": (
+        Inventory,
+        (
+            "id",
+            "product_id",
+            "supplier_id",
+            "quantity",
+            "reorder_level",
+            "last_restock_date",
+            "version",
+            "updated_at",
+        ),
+    ),
+}
+
+_DECIMAL = serializers.DecimalField(max_digits=None, decimal_places=None)
+_DATETIME = serializers.DateTimeField()
+
+
+class CursorExpired(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = (
+        "The sync cursor is older than the kept tombstones; sync again without one."
+    )
+    default_code = "cursor_expired"
+
+
+def encode_cursor(issued, marks):
+    data = {
+        "at": issued.isoformat(),
+        "streams": {
+            name: {kind: [at.isoformat(), pk] for kind, (at, pk) in mark.items()}
+            for name, mark in marks.items()
+        },
+    }
+    raw = json.dumps(data, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    ``{stream: {"changed"|"deleted": (timestamp, id)}}`` of a cursor from
+    ``encode_cursor``; an empty cursor starts from scratch.
+    """
+    if not cursor:
+        return {}
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        issued = parse_datetime(data["at"])
+        marks = {
+            name: {
+                kind: (parse_datetime(at), int(pk)) for kind, (at, pk) in mark.items()
+            }
+            for name, mark in data["streams"].items()
+            if name in STREAMS
+        }
+    except (binascii.Error, ValueError, TypeError, KeyError, AttributeError):
+        raise ValidationError({"cursor": ["Invalid cursor."]})
+    if issued is None or issued < oldest_mark():
+        raise CursorExpired()
+    return marks
+
+
+def _plain(value, field):
+    # As the REST API renders them
+    if value is None:
+        return None
+    if field.get_internal_type() == "DecimalField":
+        return _DECIMAL.to_representation(value)
+    if field.get_internal_type() == "DateTimeField":
+        return _DATETIME.to_representation(value)
+    return value
+
+
+def pull(marks, store_id, limit):
+    """
+    Up to ``limit`` changed rows and deletes per stream past ``marks``, as
+    ``({stream: {"columns", "rows", "deleted"}}, new marks, more)``. ``more``
+    means some stream filled its batch and the client should pull again.
+    """
+    changes, more = {}, False
+    for name, (model, columns) in STREAMS.items():
+        rows, deleted, marks[name] = changes_since(
+            model, marks.get(name), limit, store_id, columns
+        )
+        more = more or len(rows) == limit or len(deleted) == limit
+        fields = [model._meta.get_field(column) for column in columns]
+        changes[name] = {
+            "columns": columns,
+            "rows": [[_plain(*pair) for pair in zip(row, fields)] for row in rows],
+            "deleted": deleted,
+        }
+    return changes, marks, more
+
+
+def push_sales(request, store_id, sales):
+    """
+    Create the sales a terminal recorded, each at most once per store and
+    ``client_id``: a sale pushed again (the terminal never saw the response),
+    however much later, reports the sale created the first time. Returns one
+    result per sale.
+    """
+    results = []
+    for sale in sales:
+        data = {**sale, "store": store_id}
+        client_id = str(data.pop("client_id", "") or "")
+        if not client_id:
+            results.append(
+                {
+                    "client_id": None,
+                    "status": "invalid",
+                    "errors": {"client_id": ["This field is required."]},
+                }
+            )
+            continue
+        fingerprint = hashlib.sha256(
+            json.dumps(data, sort_keys=True, cls=DjangoJSONEncoder).encode()
+        ).hexdigest()
+        result = {"client_id": client_id}
+        synced = SyncedSale.objects.filter(store_id=store_id, client_id=client_id)
+        stored = synced.first()
+        if stored is None:
+            serializer = SalesCreateSerilaizer(data=data, context={"request": request})
+            if not serializer.is_valid():
+                results.append(
+                    {**result, "status": "invalid", "errors": serializer.errors}
+                )
+                continue
+            try:
+                with transaction.atomic():
+                    created = serializer.save()
+                    SyncedSale.objects.create(
+                        store_id=store_id,
+                        client_id=client_id,
+                        sales=created,
+                        fingerprint=fingerprint,
+                    )
+            except IntegrityError:
+                # Pushed concurrently by another request, which won
+                stored = synced.get()
+            else:
+                results.append({**result, "status": "created", "id": created.id})
+                continue
+        if stored.fingerprint != fingerprint:
+            result["status"] = "conflict"
+        else:
+            result.update(status="duplicate", id=stored.sales_id)
+        results.append(result)
+    return results
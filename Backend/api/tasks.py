@@ -0,0 +1,231 @@
+import datetime
+import inspect
+import threading
+import traceback
+
+from django.conf import settings
+from django.db import DatabaseError, connection, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import analytics, changes, forecast, rankings
+from .dashboard import rebuild_store_kpis
+from .idempotency import purge_expired
+from .models import Task
+from .reconcile import id_chunks, reconcile_chunk
+
+# Task name -> (function, max attempts). Functions take the task's payload as
+# keyword arguments and return something JSON serializable.
+TASKS = {}
+
+
+def task(name, max_attempts=None):
+    """
+    Register the decorated function as the task ``name``.
+    """
+
+    def register(func):
+        TASKS[name] = (func, max_attempts or settings.TASK_QUEUE["MAX_ATTEMPTS"])
+        return func
+
+    return register
+
+
+def check_payload(name, payload):
+    """
+    Raise ValueError unless ``name`` is a registered task accepting ``payload``.
+    """
+    if name not in TASKS:
+        raise ValueError(f"Unknown task {name!r}.")
+    try:
+        inspect.signature(TASKS[name][0]).bind(**payload)
+    except TypeError as error:
+        raise ValueError(f"Bad payload for {name}: {error}") from None
+
+
+def enqueue(name, payload=None, user=None, run_at=None):
+    payload = payload or {}
+    check_payload(name, payload)
+    return Task.objects.create(
+        name=name,
+        payload=payload,
+        max_attempts=TASKS[name][1],
+        run_at=run_at or timezone.now(),
+        created_by=user,
+    )
+
+
+def backoff(attempts):
+    """
+    Delay before retrying a task that failed its ``attempts``-th run.
+    """
+    return datetime.timedelta(
+        seconds=settings.TASK_QUEUE["BACKOFF_SECONDS"] * 2 ** (attempts - 1)
+    )
+
+
+def claim(worker, limit):
+    """
+    Mark up to ``limit`` due tasks as running by ``worker`` and return their
+    ids. ``SKIP LOCKED`` lets any number of workers poll at once without
+    blocking on, or double-claiming, each other's rows.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            Task.objects.select_for_update(skip_locked=True)
+            .filter(status=Task.QUEUED, run_at__lte=now)
+            .order_by("run_at", "id")
+            .values_list("id", flat=True)[:limit]
+        )
+        Task.objects.filter(id__in=ids).update(
+            status=Task.RUNNING,
+            locked_by=worker,
+            locked_at=now,
+            attempts=F("attempts") + 1,
+        )
+    return ids
+
+
+def _finish(task, **fields):
+    # Only if still ours: a stale task may have been handed to another worker
+    return Task.objects.filter(
+        id=task.id, status=Task.RUNNING, locked_by=task.locked_by
+    ).update(locked_at=None, **fields)
+
+
+def touch(task):
+    """
+    Renew the worker's claim on a running ``task``.
+    """
+    return Task.objects.filter(
+        id=task.id, status=Task.RUNNING, locked_by=task.locked_by
+    ).update(locked_at=timezone.now())
+
+
+def heartbeat(task, stop):
+    """
+    Renew the claim on ``task`` every ``TASK_QUEUE["HEARTBEAT_SECONDS"]`` until
+    ``stop`` is set, so that requeue_stale only takes back the tasks of dead
+    workers, however long a task runs.
+    """
+    try:
+        while not stop.wait(settings.TASK_QUEUE["HEARTBEAT_SECONDS"]):
+            try:
+                touch(task)
+            except DatabaseError:
+                pass  # Try again on the next beat
+    finally:
+        connection.close()
+
+
+def execute(task_id):
+    """
+    Run one claimed task and record its result, or schedule a retry with
+    exponential backoff until ``max_attempts`` is reached.
+    """
+    try:
+        task = Task.objects.get(id=task_id)
+        stop = threading.Event()
+        beat = threading.Thread(target=heartbeat, args=(task, stop), daemon=True)
+        beat.start()
+        try:
+            func, _ = TASKS[task.name]
+            result = func(**task.payload)
+        except Exception:
+            error = traceback.format_exc()
+            if task.attempts < task.max_attempts:
+                _finish(
+                    task,
+                    status=Task.QUEUED,
+                    run_at=timezone.now() + backoff(task.attempts),
+                    error=error,
+                )
+            else:
+                _finish(
+                    task, status=Task.FAILED, error=error, finished_at=timezone.now()
+                )
+            return Task.FAILED
+        finally:
+            stop.set()
+            beat.join()
+        _finish(task, status=Task.SUCCEEDED, result=result, finished_at=timezone.now())
+        return Task.SUCCEEDED
+    finally:
+        # Pool workers keep running between tasks; don't hold connections idle
+        connections.close_all()
+
+
+def requeue_stale():
+    """
+    Give tasks whose worker died mid-run (no heartbeat for
+    ``TASK_QUEUE["STALE_SECONDS"]``) back to the queue, or fail them once out
+    of attempts. Returns the number of tasks touched.
+    """
+    now = timezone.now()
+    stale = Task.objects.filter(
+        status=Task.RUNNING,
+        locked_at__lt=now
+        - datetime.timedelta(seconds=settings.TASK_QUEUE["STALE_SECONDS"]),
+    )
+    error = "Worker lost while running the task."
+    requeued = stale.filter(attempts__lt=F("max_attempts")).update(
+        status=Task.QUEUED, locked_by="", locked_at=None, run_at=now, error=error
+    )
+    failed = stale.update(
+        status=Task.FAILED, locked_at=None, finished_at=now, error=error
+    )
+    return requeued + failed
+
+
+# Built-in tasks: the periodic rollups, runnable off the request path
+
+
+@task("refresh_analytics")
+def refresh_analytics(rebuild=False, compact=False):
+    rows = analytics.refresh(rebuild=rebuild)
+    if compact:
+        analytics.compact()
+    return {"rows": rows, "refreshed_until": analytics.refreshed_until()}
+
+
+@task("refresh_rankings")
+def refresh_rankings(rebuild=False):
+    return {"stores": rankings.refresh(rebuild=rebuild)}
+
+
+@task("forecast_demand")
+def forecast_demand(workers=None):
+    written, chunks = forecast.forecast_all(workers)
+    return {"suggestions": written, "chunks": chunks}
+
+
+@task("refresh_store_kpis")
+def refresh_store_kpis():
+    return {"stores": rebuild_store_kpis()}
+
+
+@task("reconcile_sales")
+def reconcile_sales(chunk_size=10000, fix=False):
+    checked = mismatched = orphaned = 0
+    for low, high in id_chunks(chunk_size):
+        count, mismatches, orphans = reconcile_chunk(low, high, fix)
+        checked += count
+        mismatched += len(mismatches)
+        orphaned += len(orphans)
+    return {
+        "checked": checked,
+        "mismatched": mismatched,
+        "fixed": fix,
+        "orphaned_items": orphaned,
+    }
+
+
+@task("purge_idempotency_keys")
+def purge_idempotency_keys():
+    return {"deleted": purge_expired()}
+
+
+@task("purge_tombstones")
+def purge_tombstones():
+    return {"deleted": changes.purge_tombstones()}
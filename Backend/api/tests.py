@@ -1,3 +1,925 @@
-from django.test import TestCase
+import datetime
+import io
+import tempfile
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib import admin as django_admin
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management import call_command
+from django.contrib.postgres.indexes import GinIndex
+from django.db import DatabaseError, OperationalError, connection, transaction
+from django.db.migrations import AddIndex
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import get_resolver
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from . import archive
+from .advisor import advise, migration_stub, propose, unique_proposals
+from .analytics import refresh as refresh_analytics
+from .archive import archive_month, iter_archived_sales
+from .authentication import StoreTokenObtainPairSerializer
+from .cache import reference_cache, store_id_for_user
+from .changes import changes_since
+from .dashboard import refresh_store_kpi
+from .forecast import forecast_all
+from .models import (
+    Address,
+    IdempotencyKey,
+    Inventory,
+    OutboxEvent,
+    Product,
+    ReorderSuggestion,
+    Sales,
+    SalesItems,
+    Store,
+    StoreAdmin,
+    StoreKPI,
+    Supplier,
+    Task,
+)
+from .outbox import purge_published, record, relay_batch
+from .partitions import month_range
+from .pricing import price_sale
+from .rankings import get_ranking
+from .rankings import refresh as refresh_rankings
+from .serializers import SalesReadSerializer
+from .startup import preload
+from .tasks import TASKS, backoff, claim, enqueue, execute, requeue_stale, touch
+from .throttling import LocalBucketBackend, ScopedTokenBucketThrottle
+
+
+class StoreFixtureMixin:
+    """
+    A superuser and two stores, each with a store admin stocking one product.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.superuser = StoreAdmin.objects.create_user(
+            "owner", password="secret", is_superuser=True, is_staff=True
+        )
+        cls.product = Product.objects.create(
+            product_name="Tea",
+            cost_price=Decimal("2.00"),
+            sale_price=Decimal("5.00"),
+            discount=Decimal("0.50"),
+        )
+        cls.supplier = Supplier.objects.create(name="Leaf Co", contact_no="0100")
+        cls.admins, cls.stores, cls.inventory = [], [], []
+        for index in range(2):
+            admin = StoreAdmin.objects.create_user(f"admin{index}", password="secret")
+            store = Store.objects.create(
+                name=f"Store {index}",
+                admin=admin,
+                address=Address.objects.create(
+                    country="Kenya", city="Nairobi", area=f"Area {index}"
+                ),
+            )
+            cls.admins.append(admin)
+            cls.stores.append(store)
+            cls.inventory.append(
+                Inventory.objects.create(
+                    store=store,
+                    product=cls.product,
+                    supplier=cls.supplier,
+                    quantity=100,
+                )
+            )
+        cls.storeless = StoreAdmin.objects.create_user("nostore", password="secret")
+
+    def setUp(self):
+        # Throttle buckets, token denylists and cached store ids
+        cache.clear()
+        reference_cache.clear()
+
+    def authenticate(self, user):
+        token = StoreTokenObtainPairSerializer.get_token(user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        return token
+
+    def use_temp_dir(self, setting):
+        """
+        Point ``settings.<setting>["DIR"]`` at an empty directory for the test.
+        """
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        changed = override_settings(
+            **{setting: {**getattr(settings, setting), "DIR": directory.name}}
+        )
+        changed.enable()
+        self.addCleanup(changed.disable)
+
+    def sell(self, store, created_at, quantity=1, unit_price=Decimal("5.00")):
+        """
+        A sale of ``quantity`` units of the product, backdated to ``created_at``.
+        """
+        sale = Sales.objects.create(
+            store=store,
+            total_quantity=quantity,
+            total_price=quantity * unit_price,
+        )
+        SalesItems.objects.create(
+            sales=sale, product=self.product, quantity=quantity, unit_price=unit_price
+        )
+        Sales.objects.filter(pk=sale.pk).update(created_at=created_at)
+        SalesItems.objects.filter(sales_id=sale.pk).update(created_at=created_at)
+        return sale
+
+
+class TokenRevocationTests(StoreFixtureMixin, APITestCase):
+    def test_demoted_superuser_token_is_revoked(self):
+        self.authenticate(self.superuser)
+        self.assertEqual(self.client.get("/api/products/").status_code, 200)
+
+        self.superuser.is_superuser = False
+        self.superuser.save()
+        self.assertEqual(self.client.get("/api/products/").status_code, 401)
+
+    def test_unrelated_save_keeps_tokens(self):
+        self.authenticate(self.admins[0])
+        self.admins[0].first_name = "Ada"
+        self.admins[0].save()
+        self.assertEqual(self.client.get("/api/products/").status_code, 200)
+
+    def test_reassigned_store_revokes_both_admins(self):
+        store = self.stores[0]
+        old_token = self.authenticate(self.admins[0])
+        new_token = StoreTokenObtainPairSerializer.get_token(self.storeless)
+
+        store.admin = self.storeless
+        store.save()
+        for token in (old_token, new_token.access_token):
+            self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+            self.assertEqual(self.client.get("/api/products/").status_code, 401)
+
+
+class ReferenceCacheTests(StoreFixtureMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.authenticate(self.superuser)
+
+    def embedded_store(self):
+        url = f"/api/inventory/{self.inventory[0].pk}/"
+        return self.client.get(url).data["store"]
+
+    def test_cached_store_is_not_reloaded(self):
+        self.embedded_store()
+        with CaptureQueriesContext(connection) as queries:
+            self.embedded_store()
+        self.assertFalse([q for q in queries if 'FROM "api_store"' in q["sql"]])
+
+    def test_save_invalidates_embedding_rows(self):
+        self.embedded_store()
+        address = self.stores[0].address
+        address.area = "Westlands"
+        with self.captureOnCommitCallbacks(execute=True):
+            address.save()
+        self.assertEqual(self.embedded_store()["address"]["area"], "Westlands")
+
+    def test_delete_invalidates_store_of_admin(self):
+        admin = self.admins[0]
+        self.assertEqual(store_id_for_user(admin), self.stores[0].pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.stores[0].delete()
+        self.assertIsNone(store_id_for_user(admin))
+
+
+class FastReadPathTests(StoreFixtureMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.authenticate(self.superuser)
+        now = timezone.now()
+        self.sell(self.stores[0], now - datetime.timedelta(days=1), quantity=3)
+        self.sell(self.stores[1], now, unit_price=Decimal("4.25"))
+
+    def fetch(self, url, fast):
+        with override_settings(API_FAST_READ_PATH=fast):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_fast_path_matches_serializers(self):
+        for url in (
+            "/api/sales/?ordering=created_at",
+            "/api/sales/?ordering=created_at&store__name__iexact=Store%201",
+            "/api/inventory/?ordering=created_at",
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(self.fetch(url, True), self.fetch(url, False))
+
+    def test_fast_path_skips_serializers(self):
+        with mock.patch.object(
+            SalesReadSerializer, "to_representation", side_effect=AssertionError
+        ):
+            self.assertEqual(
+                len(self.fetch("/api/sales/?ordering=created_at", True)["results"]), 2
+            )
+
+
+class SalesMonthFilterTests(StoreFixtureMixin, APITestCase):
+    def test_month_bounds_sales_and_items(self):
+        self.authenticate(self.superuser)
+        today = timezone.localdate()
+        start, end = month_range(today)
+        self.sell(self.stores[0], start - datetime.timedelta(hours=1), quantity=2)
+        self.sell(self.stores[0], start + datetime.timedelta(hours=1), quantity=3)
+        self.sell(self.stores[1], end, quantity=4)
+        for fast in (False, True):
+            with self.subTest(fast=fast), override_settings(API_FAST_READ_PATH=fast):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(f"/api/sales/?month={today:%Y-%m}")
+                self.assertEqual(
+                    [sale["total_quantity"] for sale in response.data["results"]], [3]
+                )
+                (items,) = [
+                    q["sql"] for q in queries if 'FROM "api_salesitems"' in q["sql"]
+                ]
+                self.assertIn('"api_salesitems"."created_at" >=', items)
+
+
+class ArchivedSalesTests(StoreFixtureMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.use_temp_dir("SALES_ARCHIVE")
+
+        january = datetime.datetime(2020, 1, 10, tzinfo=datetime.timezone.utc)
+        for day, price in enumerate([30, 10, 50, 20, 40]):
+            for store in self.stores:
+                sale = Sales.objects.create(store=store, total_price=price)
+                Sales.objects.filter(pk=sale.pk).update(
+                    created_at=january + datetime.timedelta(days=day)
+                )
+        archive_month(datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc))
+        # Live sales of the next month
+        for day, price in enumerate([35, 15, 45]):
+            sale = Sales.objects.create(store=self.stores[0], total_price=price)
+            Sales.objects.filter(pk=sale.pk).update(
+                created_at=january + datetime.timedelta(days=30 + day)
+            )
+
+    def list_prices(self, **params):
+        response = self.client.get(
+            "/api/sales/", {"created_at__gte": "2020-01-01", **params}
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.data["count"], [
+            Decimal(sale["total_price"]) for sale in response.data["results"]
+        ]
+
+    def test_admin_without_store_sees_no_archived_sales(self):
+        self.authenticate(self.storeless)
+        self.assertEqual(self.list_prices(), (0, []))
+
+    def test_admin_sees_only_own_archived_sales(self):
+        self.authenticate(self.admins[1])
+        count, prices = self.list_prices(size=10)
+        self.assertEqual(count, 5)
+        self.assertEqual(sorted(prices), [10, 20, 30, 40, 50])
+
+    def test_other_ordering_merges_pages(self):
+        self.authenticate(self.admins[0])
+        pages = [
+            self.list_prices(ordering="-total_price", size=3, page_num=number)
+            for number in (1, 2, 3)
+        ]
+        self.assertEqual({count for count, _ in pages}, {8})
+        self.assertEqual(
+            [price for _, prices in pages for price in prices],
+            [50, 45, 40, 35, 30, 20, 15, 10],
+        )
+
+    def test_archived_detail_of_own_store_only(self):
+        sale = next(iter_archived_sales(store_id=self.stores[1].pk))
+        self.authenticate(self.admins[1])
+        self.assertEqual(self.client.get(f"/api/sales/{sale.pk}/").status_code, 200)
+        self.authenticate(self.admins[0])
+        self.assertEqual(self.client.get(f"/api/sales/{sale.pk}/").status_code, 404)
+
+    def test_interrupted_archive_resumes(self):
+        february = datetime.datetime(2020, 2, 1, tzinfo=datetime.timezone.utc)
+        delete = archive._delete_batches
+
+        def crash(sales, ids, start, batch_size):
+            delete(sales, ids[:1], start, batch_size)
+            raise RuntimeError("disk full")
+
+        with mock.patch("api.archive._delete_batches", side_effect=crash):
+            with self.assertRaises(RuntimeError):
+                archive_month(february)
+        self.authenticate(self.admins[0])
+        # Archived and still live rows of February are listed once
+        self.assertEqual(self.list_prices()[0], 8)
+
+        entry = archive_month(february)
+        self.assertNotIn("deleting", entry)
+        self.assertFalse(Sales.objects.filter(created_at__gte=february).exists())
+        count, prices = self.list_prices(size=10)
+        self.assertEqual(count, 8)
+        self.assertEqual(sorted(prices), [10, 15, 20, 30, 35, 40, 45, 50])
+
+
+class AnalyticsReportTests(StoreFixtureMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.use_temp_dir("SALES_ARCHIVE")
+        self.use_temp_dir("ANALYTICS_STORE")
+        yesterday = timezone.now() - datetime.timedelta(days=1)
+        self.sell(self.stores[0], yesterday, quantity=2)
+        self.sell(self.stores[1], yesterday, quantity=3)
+        refresh_analytics()
+
+    def test_admin_sees_own_store(self):
+        self.authenticate(self.admins[0])
+        response = self.client.get("/api/reports/analytics/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["results"][0]["revenue"], "10.00")
+
+    def test_admin_without_store_is_denied(self):
+        self.authenticate(self.storeless)
+        response = self.client.get("/api/reports/analytics/")
+        self.assertEqual(response.status_code, 403)
+
+
+class PricingTests(StoreFixtureMixin, APITestCase):
+    def test_price_sale_matches_decimal_formulas(self):
+        quantities = [3, 1, 7]
+        unit_prices = [Decimal("19.99"), Decimal("0.05"), Decimal("1234.56")]
+        discounts = [Decimal("12.50"), Decimal("0"), Decimal("33.33")]
+        items = [
+            SalesItems(quantity=q, unit_price=p, discount=d)
+            for q, p, d in zip(quantities, unit_prices, discounts)
+        ]
+        total_price = sum(item.item_subtotal for item in items)
+        self.assertEqual(
+            price_sale(quantities, unit_prices, discounts),
+            (11, total_price, total_price * Decimal("0.10")),
+        )
+
+    def test_reconcile_fixes_total_tax(self):
+        now = timezone.now()
+        right = self.sell(self.stores[0], now, quantity=2)
+        wrong = self.sell(self.stores[0], now, quantity=3)
+        Sales.objects.filter(pk=right.pk).update(total_tax=Decimal("1.00"))
+        Sales.objects.filter(pk=wrong.pk).update(total_tax=Decimal("9.99"))
+        stale = Sales.objects.get(pk=wrong.pk).updated_at
+
+        call_command("reconcile_sales", "--fix", "--workers", "1", stdout=io.StringIO())
+        self.assertEqual(
+            dict(Sales.objects.values_list("pk", "total_tax")),
+            {right.pk: Decimal("1.00"), wrong.pk: Decimal("1.50")},
+        )
+        # Fixed rows are handed out again by changes_since and sync
+        self.assertGreater(Sales.objects.get(pk=wrong.pk).updated_at, stale)
+
+    def test_reconcile_reports_orphaned_items(self):
+        now = timezone.now()
+        self.sell(self.stores[0], now)
+        gone = self.sell(self.stores[0], now)
+        # Bypass the ORM cascade, as raw SQL or a detached partition would
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM api_sales WHERE id = %s", [gone.pk])
+        item = SalesItems.objects.get(sales_id=gone.pk)
+
+        out = io.StringIO()
+        call_command("reconcile_sales", "--fix", "--workers", "1", stdout=out)
+        self.assertIn(f"item {item.pk}: sale {gone.pk} does not exist", out.getvalue())
+        self.assertIn("1 orphaned items", out.getvalue())
+        self.assertTrue(SalesItems.objects.filter(pk=item.pk).exists())
+
+
+class StoreKPITests(StoreFixtureMixin, APITestCase):
+    def test_sale_and_stock_apply_deltas(self):
+        store = self.stores[0]
+        self.sell(store, timezone.now(), quantity=2)
+        refresh_store_kpi(store.pk)
+        with mock.patch("api.dashboard.live_sales_kpis") as recompute:
+            with self.captureOnCommitCallbacks(execute=True):
+                sale = Sales.objects.create(store=store)
+                sale.total_quantity = 3
+                sale.total_price = Decimal("15.00")
+                sale.save()
+                self.inventory[0].quantity = 5
+                self.inventory[0].save()
+        recompute.assert_not_called()
+        kpi = StoreKPI.objects.get(store=store)
+        self.assertEqual(
+            (kpi.revenue, kpi.items_sold, kpi.sales_count, kpi.low_stock_count),
+            (Decimal("25.00"), 5, 2, 1),
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            sale.delete()
+            self.inventory[0].quantity = 50
+            self.inventory[0].save()
+        kpi.refresh_from_db()
+        self.assertEqual(
+            (kpi.revenue, kpi.items_sold, kpi.sales_count, kpi.low_stock_count),
+            (Decimal("10.00"), 2, 1, 0),
+        )
+
+    def test_rolled_back_changes_do_not_count(self):
+        store = self.stores[0]
+        refresh_store_kpi(store.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    Sales.objects.create(store=store, total_price=Decimal("5.00"))
+                    raise DatabaseError
+            except DatabaseError:
+                pass
+            Sales.objects.create(store=store, total_price=Decimal("7.00"))
+        kpi = StoreKPI.objects.get(store=store)
+        self.assertEqual((kpi.revenue, kpi.sales_count), (Decimal("7.00"), 1))
+
+    def test_new_day_rebuilds_record(self):
+        store = self.stores[0]
+        StoreKPI.objects.create(
+            store=store,
+            day=timezone.localdate() - datetime.timedelta(days=1),
+            revenue=Decimal("99.00"),
+            sales_count=9,
+        )
+        self.sell(store, timezone.now())
+        with self.captureOnCommitCallbacks(execute=True):
+            Sales.objects.create(store=store, total_price=Decimal("2.00"))
+        kpi = StoreKPI.objects.get(store=store)
+        self.assertEqual(
+            (kpi.day, kpi.revenue, kpi.sales_count),
+            (timezone.localdate(), Decimal("7.00"), 2),
+        )
+
+    def test_delete_store_with_sales_and_stock(self):
+        store = self.stores[0]
+        self.sell(store, timezone.now())
+        refresh_store_kpi(store.pk)
+        self.authenticate(self.superuser)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(f"/api/store/{store.pk}/")
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(StoreKPI.objects.filter(store_id=store.pk).exists())
+
+
+@override_settings(CHANGES={**settings.CHANGES, "SETTLE_SECONDS": 0})
+class SyncTests(StoreFixtureMixin, APITestCase):
+    def test_changes_without_store_are_empty(self):
+        self.inventory[1].delete()
+        rows, deleted, _ = changes_since(Inventory, store_id=None)
+        self.assertEqual((rows, deleted), ([], []))
+
+    def test_admin_pulls_own_store_only(self):
+        self.authenticate(self.admins[0])
+        response = self.client.post("/api/sync/", {}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [row[0] for row in response.data["inventory"]["rows"]],
+            [self.inventory[0].pk],
+        )
+
+    def test_admin_without_store_is_denied(self):
+        self.authenticate(self.storeless)
+        response = self.client.post("/api/sync/", {}, format="json")
+        self.assertEqual(response.status_code, 403)
+
+    def test_resent_sale_is_created_once(self):
+        self.authenticate(self.admins[0])
+        sale = {
+            "client_id": "till-1:42",
+            "sales_item": [{"product": self.product.pk, "quantity": 2}],
+        }
+        first = self.client.post("/api/sync/", {"sales": [sale]}, format="json")
+        # Long after any idempotency key would have expired
+        IdempotencyKey.objects.all().delete()
+        again = self.client.post("/api/sync/", {"sales": [sale]}, format="json")
+        changed = {**sale, "sales_item": [{"product": self.product.pk, "quantity": 3}]}
+        other = self.client.post("/api/sync/", {"sales": [changed]}, format="json")
+        created = first.data["sales"][0]
+        self.assertEqual(created["status"], "created")
+        self.assertEqual(
+            again.data["sales"][0],
+            {"client_id": "till-1:42", "status": "duplicate", "id": created["id"]},
+        )
+        self.assertEqual(other.data["sales"][0]["status"], "conflict")
+        self.assertEqual(Sales.objects.filter(store=self.stores[0]).count(), 1)
+
+
+class ConditionalGetTests(StoreFixtureMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.authenticate(self.superuser)
+
+    def refetch(self, url, response):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+
+    def test_unchanged_list_is_not_modified(self):
+        first = self.client.get("/api/inventory/")
+        self.assertNotIn("Last-Modified", first)
+        self.assertEqual(self.refetch("/api/inventory/", first).status_code, 304)
+
+    def test_inventory_revalidation_counts_nothing(self):
+        first = self.client.get("/api/inventory/?quantity__gte=50")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.refetch("/api/inventory/?quantity__gte=50", first)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse([q for q in queries if "COUNT(" in q["sql"].upper()])
+
+    def test_nested_change_invalidates_list(self):
+        first = self.client.get("/api/store/")
+        address = self.stores[1].address
+        address.area = "Westlands"
+        with self.captureOnCommitCallbacks(execute=True):
+            address.save()
+        self.assertEqual(self.refetch("/api/store/", first).status_code, 200)
+
+    def test_delete_invalidates_list(self):
+        first = self.client.get("/api/inventory/")
+        # Not the latest updated_at
+        with self.captureOnCommitCallbacks(execute=True):
+            self.inventory[0].delete()
+        self.assertEqual(self.refetch("/api/inventory/", first).status_code, 200)
+        since = self.client.get(
+            "/api/inventory/", HTTP_IF_MODIFIED_SINCE="Fri, 01 Jan 2100 00:00:00 GMT"
+        )
+        self.assertEqual(since.status_code, 200)
+
+
+class SparseFieldsTests(StoreFixtureMixin, APITestCase):
+    def test_nested_fields_select_only_their_columns(self):
+        self.authenticate(self.superuser)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                "/api/store/?ordering=name&fields=name,store_admin.username"
+            )
+        self.assertEqual(
+            response.data["results"][0],
+            {"name": "Store 0", "store_admin": {"username": "admin0"}},
+        )
+        (select,) = [q["sql"] for q in queries if "JOIN" in q["sql"]]
+        columns = select.split(" FROM ")[0].removeprefix("SELECT ").split(", ")
+        self.assertEqual(
+            columns,
+            [
+                '"api_store"."id"',
+                '"api_store"."name"',
+                '"api_store"."admin_id"',
+                '"api_store"."updated_at"',
+                '"api_storeadmin"."id"',
+                '"api_storeadmin"."username"',
+            ],
+        )
+
+
+class OutboxTests(StoreFixtureMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.sent = []
+        self.sink = SimpleNamespace(send=self.sent.extend)
+        # The fixture's inventory.created events
+        self.pending = OutboxEvent.objects.filter(published_at__isnull=True)
+        self.ids = list(self.pending.order_by("id").values_list("id", flat=True))
+
+    def test_relay_marks_events_published(self):
+        self.assertEqual(relay_batch(self.sink, 100), 2)
+        self.assertEqual([message["id"] for message in self.sent], self.ids)
+        self.assertFalse(self.pending.exists())
+        self.assertEqual(relay_batch(self.sink, 100), 0)
+
+    def test_failed_batch_is_republished_first(self):
+        failing = SimpleNamespace(send=mock.Mock(side_effect=OSError("down")))
+        with self.assertRaises(OSError):
+            relay_batch(failing, 1)
+        event = OutboxEvent.objects.get(pk=self.ids[0])
+        self.assertIsNone(event.published_at)
+        self.assertEqual(event.attempts, 1)
+        self.assertIn("down", event.last_error)
+
+        self.assertEqual(relay_batch(self.sink, 1), 1)
+        self.assertEqual(self.sent[0]["id"], self.ids[0])
+        event.refresh_from_db()
+        self.assertIsNotNone(event.published_at)
+        self.assertEqual((event.attempts, event.last_error), (2, ""))
+
+    def test_purge_keeps_unpublished_events(self):
+        event = record("sale.deleted", self.stores[0].pk, 1, {"id": 1})
+        OutboxEvent.objects.filter(pk=event.pk).update(
+            published_at=timezone.now() - datetime.timedelta(days=30)
+        )
+        self.assertEqual(purge_published(7), 1)
+        self.assertEqual(sorted(self.pending.values_list("id", flat=True)), self.ids)
+
+
+class IndexAdvisorTests(StoreFixtureMixin, APITestCase):
+    def test_range_filter_wins_over_ordering(self):
+        ((model, index),) = propose(
+            Inventory, "quantity", "gte", "created_at", "store", {"seq scan", "sort"}
+        )
+        self.assertEqual((model, index.fields), (Inventory, ["store", "quantity"]))
+
+    def test_text_search_gets_trigram_index_on_related_table(self):
+        ((model, index),) = propose(
+            Sales, "store__name", "icontains", None, "store", {"seq scan"}
+        )
+        self.assertIs(model, Store)
+        self.assertIsInstance(index, GinIndex)
+        self.assertEqual(index.opclasses, ["gin_trgm_ops"])
+
+    def test_flagged_scans_become_a_loadable_migration(self):
+        # Tables this small are always scanned sequentially
+        findings = advise(min_rows=1, targets=["inventory"])
+        self.assertTrue(any(finding.problems for finding in findings))
+        proposals = unique_proposals(findings)
+        self.assertTrue(proposals)
+        namespace = {}
+        exec(compile(migration_stub(proposals), "stub", "exec"), namespace)
+        migration = namespace["Migration"]
+        self.assertEqual([app for app, _ in migration.dependencies], ["api"])
+        added = [op for op in migration.operations if isinstance(op, AddIndex)]
+        self.assertEqual(
+            [operation.index.name for operation in added],
+            [index.name for _, index in proposals],
+        )
+        # Trigram indexes need the extension first
+        self.assertEqual(
+            len(migration.operations) - len(added),
+            any(isinstance(index, GinIndex) for _, index in proposals),
+        )
+
+
+class EstimatedPaginationTests(StoreFixtureMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        for index in range(10):
+            Inventory.objects.create(
+                store=self.stores[0],
+                product=Product.objects.create(
+                    product_name=f"Tea {index}",
+                    cost_price=1,
+                    sale_price=2,
+                    discount=0,
+                ),
+                supplier=self.supplier,
+            )
+        self.authenticate(self.admins[0])
+
+    def get_page(self, number):
+        # 11 rows, estimated at 10
+        with mock.patch("api.pagination.approximate_count", return_value=(10, True)):
+            response = self.client.get(
+                "/api/inventory/", {"size": 5, "page_num": number}
+            )
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_pages_past_a_low_estimate_stay_reachable(self):
+        page = self.get_page(2)
+        self.assertTrue(page["count_is_estimate"])
+        self.assertIn("page_num=3", page["next"])
+
+        page = self.get_page(3)
+        self.assertEqual(len(page["results"]), 1)
+        self.assertIsNone(page["next"])
+        self.assertIn("page_num=2", page["previous"])
+
+
+@override_settings(RANKINGS={**settings.RANKINGS, "SETTLE_SECONDS": 0})
+class RankingTests(StoreFixtureMixin, APITestCase):
+    def test_refresh_adds_new_sales_within_bounds(self):
+        self.sell(self.stores[0], timezone.now(), quantity=4)
+        refresh_rankings()
+        self.sell(self.stores[0], timezone.now(), quantity=3)
+        with CaptureQueriesContext(connection) as queries:
+            refresh_rankings()
+
+        insert = next(q["sql"] for q in queries if q["sql"].startswith("INSERT"))
+        self.assertIn('"api_sales"."created_at" >', insert)
+        self.assertIn('"api_sales"."created_at" <=', insert)
+        self.assertEqual(get_ranking(self.stores[0].pk).top_products[0]["quantity"], 7)
+
+
+class AdminSearchTests(StoreFixtureMixin, APITestCase):
+    def search(self, model, term):
+        request = RequestFactory().get("/", {"q": term})
+        request.user = self.superuser
+        queryset, _ = django_admin.site._registry[model].get_search_results(
+            request, model.objects.all(), term
+        )
+        return queryset
+
+    def test_sales_are_searched_by_exact_id(self):
+        sale = self.sell(self.stores[0], timezone.now())
+        for model, found in ((Sales, sale), (SalesItems, sale.sales_item.get())):
+            queryset = self.search(model, str(sale.pk))
+            self.assertEqual(list(queryset), [found])
+            self.assertNotIn("LIKE", str(queryset.query).upper())
+            self.assertFalse(self.search(model, "Store 0").exists())
+
+
+class ForecastTests(StoreFixtureMixin, APITestCase):
+    def test_levels_replace_reorder_level(self):
+        Inventory.objects.filter(pk=self.inventory[1].pk).update(quantity=0)
+        unsold = Product.objects.create(
+            product_name="Cocoa", cost_price=1, sale_price=2, discount=0
+        )
+        Inventory.objects.create(
+            store=self.stores[0], product=unsold, supplier=self.supplier, quantity=50
+        )
+        for days_ago in range(1, 15):
+            for store in self.stores:
+                self.sell(store, timezone.now() - datetime.timedelta(days=days_ago))
+        # Left by an earlier run, when store 0 still had to reorder
+        ReorderSuggestion.objects.create(
+            store=self.stores[0],
+            product=self.product,
+            on_hand=0,
+            daily_demand=1,
+            reorder_level=10,
+            reorder_quantity=14,
+            computed_at=timezone.now() - datetime.timedelta(days=1),
+        )
+
+        # Counts the sales into the daily totals first
+        self.assertEqual(forecast_all(workers=1), (1, 1))
+        suggestion = ReorderSuggestion.objects.get()
+        self.assertEqual(suggestion.store_id, self.stores[1].pk)
+        self.assertGreater(suggestion.reorder_quantity, 0)
+        # Every product sold gets the forecast level, the others keep theirs
+        self.assertEqual(
+            set(
+                Inventory.objects.filter(product=self.product).values_list(
+                    "reorder_level", "version"
+                )
+            ),
+            {(suggestion.reorder_level, 2)},
+        )
+        self.assertEqual(Inventory.objects.get(product=unsold).reorder_level, 10)
+
+
+class OptimisticLockTests(StoreFixtureMixin, APITestCase):
+    def patch(self, if_match):
+        return self.client.patch(
+            f"/api/inventory/{self.inventory[0].pk}/",
+            {"quantity": 42},
+            format="json",
+            HTTP_IF_MATCH=if_match,
+        )
+
+    def test_stale_version_conflicts(self):
+        self.authenticate(self.admins[0])
+        self.assertEqual(self.patch('"1"').status_code, 200)
+
+        response = self.patch('"1"')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data["version"], 2)
+        self.inventory[0].refresh_from_db()
+        self.assertEqual(self.inventory[0].version, 2)
+
+
+class IdempotencyTests(StoreFixtureMixin, APITestCase):
+    def create_product(self, key, name="Coffee"):
+        return self.client.post(
+            "/api/products/",
+            {
+                "product_name": name,
+                "cost_price": "3.00",
+                "sale_price": "6.00",
+                "discount": "0.00",
+            },
+            format="json",
+            HTTP_IDEMPOTENCY_KEY=key,
+        )
+
+    def test_retry_replays_the_first_response(self):
+        self.authenticate(self.superuser)
+        first = self.create_product("checkout-1")
+        retry = self.create_product("checkout-1")
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(retry.content, first.content)
+        self.assertEqual(Product.objects.filter(product_name="Coffee").count(), 1)
+
+    def test_key_reused_for_another_request(self):
+        self.authenticate(self.superuser)
+        self.create_product("checkout-1")
+        response = self.create_product("checkout-1", name="Cocoa")
+        self.assertEqual(response.status_code, 422)
+        self.assertFalse(Product.objects.filter(product_name="Cocoa").exists())
+
+
+def flaky():
+    raise RuntimeError("boom")
+
+
+@mock.patch.dict(TASKS, {"flaky": (flaky, 2)})
+@mock.patch("api.tasks.connections")  # keep the test transaction's connection
+class TaskQueueTests(TestCase):
+    def test_claim_takes_due_tasks_once(self, connections):
+        due = enqueue("purge_tombstones")
+        enqueue("purge_tombstones", run_at=timezone.now() + datetime.timedelta(hours=1))
+        self.assertEqual(claim("worker-1", 10), [due.pk])
+        self.assertEqual(claim("worker-2", 10), [])
+        due.refresh_from_db()
+        self.assertEqual(
+            (due.status, due.locked_by, due.attempts), (Task.RUNNING, "worker-1", 1)
+        )
+
+    def test_failures_back_off_then_fail(self, connections):
+        task = enqueue("flaky")
+        claim("worker", 1)
+        before = timezone.now()
+        self.assertEqual(execute(task.pk), Task.FAILED)
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.QUEUED)
+        self.assertGreaterEqual(task.run_at, before + backoff(1))
+        self.assertIn("boom", task.error)
+
+        Task.objects.filter(pk=task.pk).update(run_at=timezone.now())
+        claim("worker", 1)
+        execute(task.pk)
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.attempts), (Task.FAILED, 2))
+        self.assertEqual(backoff(2), 2 * backoff(1))
+
+    def test_only_tasks_without_heartbeat_are_requeued(self, connections):
+        alive, dead = enqueue("flaky"), enqueue("flaky")
+        claim("worker", 2)
+        Task.objects.update(locked_at=timezone.now() - datetime.timedelta(hours=1))
+        touch(Task.objects.get(pk=alive.pk))
+        self.assertEqual(requeue_stale(), 1)
+        self.assertEqual(
+            dict(Task.objects.values_list("pk", "status")),
+            {alive.pk: Task.RUNNING, dead.pk: Task.QUEUED},
+        )
+
+
+@mock.patch("api.throttling.time.monotonic")
+class ThrottleTests(TestCase):
+    def test_burst_then_refill(self, clock):
+        clock.return_value = 1000.0
+        backend = LocalBucketBackend()
+        # A burst takes the whole capacity, then waits for the refill
+        self.assertEqual(
+            [backend.consume("read:store:1", 3, 1.0)[0] for _ in range(4)],
+            [True, True, True, False],
+        )
+        self.assertEqual(backend.consume("read:store:1", 3, 1.0), (False, 1.0))
+        clock.return_value = 1002.0
+        self.assertEqual(
+            [backend.consume("read:store:1", 3, 1.0)[0] for _ in range(3)],
+            [True, True, False],
+        )
+        # Other buckets are untouched
+        self.assertTrue(backend.consume("read:store:2", 3, 1.0)[0])
+
+    def test_buckets_are_bounded(self, clock):
+        clock.return_value = 1000.0
+        backend = LocalBucketBackend(maxsize=2)
+        for ident in range(5):
+            backend.consume(f"anon:10.0.0.{ident}", 10, 1.0)
+        self.assertEqual(len(backend._buckets), 2)
+
+    def test_scope_follows_view_and_method(self, clock):
+        throttle = ScopedTokenBucketThrottle()
+        user = StoreAdmin(username="clerk")
+        view = SimpleNamespace(throttle_scope={"read": "catalog_read"})
+
+        def scope(method, user=user, view=view):
+            return throttle.get_scope(SimpleNamespace(method=method, user=user), view)
+
+        self.assertEqual(scope("GET"), "catalog_read")
+        self.assertEqual(scope("POST"), "write")
+        self.assertEqual(
+            scope("POST", view=SimpleNamespace(throttle_scope="sync")), "sync"
+        )
+        self.assertEqual(scope("GET", user=AnonymousUser()), "anon")
+
+
+class StartupPreloadTests(TestCase):
+    def test_steps_are_timed_in_order(self):
+        timings = preload()
+        self.assertEqual(
+            list(timings), ["urls", "auth", "serializers", "filters", "database"]
+        )
+        self.assertTrue(all(ms >= 0 for ms in timings.values()))
+        self.assertTrue(get_resolver()._populated)
+
+    @mock.patch("api.startup.connections")
+    def test_only_persistent_connections_are_opened(self, connections):
+        def alias(max_age):
+            return SimpleNamespace(
+                settings_dict={"CONN_MAX_AGE": max_age},
+                ensure_connection=mock.Mock(),
+            )
+
+        per_request, persistent, down = alias(0), alias(60), alias(None)
+        down.ensure_connection.side_effect = OperationalError("refused")
+        connections.all.return_value = [per_request, persistent, down]
+        preload()
+        per_request.ensure_connection.assert_not_called()
+        persistent.ensure_connection.assert_called_once_with()
+        down.ensure_connection.assert_called_once_with()
@@ -0,0 +1,173 @@
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+from .cache import LRUCache, store_id_for_user
+
+DURATIONS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_rate(rate):
+    """
+    ``"600/min"`` -> ``(capacity, tokens refilled per second)``.
+    """
+    num, period = rate.split("/")
+    capacity = int(num)
+    return capacity, capacity / DURATIONS[period[0]]
+
+
+class LocalBucketBackend:
+    """
+    In-process token buckets. Stand-in for tests and single-process servers;
+    every worker gets its own buckets. At most ``maxsize`` clients' buckets
+    are kept: the least recently used goes first, having had the longest to
+    refill anyway.
+    """
+
+    def __init__(self, maxsize=10000):
+        # Nothing takes longer than a day to refill
+        self._buckets = LRUCache(maxsize=maxsize, ttl=DURATIONS["d"])
+        self._lock = threading.Lock()
+
+    def consume(self, key, capacity, refill_rate, cost=1):
+        """
+        Take ``cost`` tokens from the bucket; returns ``(allowed, retry_after)``.
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated_at) * refill_rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets.set(key, (tokens, now))
+        return allowed, 0 if allowed else (cost - tokens) / refill_rate
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+# Refill and take tokens atomically inside Redis, using the server clock so
+# workers on different hosts agree on elapsed time.
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local refill_rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call("TIME")
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call("HMGET", KEYS[1], "tokens", "updated_at")
+local tokens = tonumber(bucket[1]) or capacity
+local updated_at = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * refill_rate)
+local allowed = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+end
+redis.call("HSET", KEYS[1], "tokens", tostring(tokens), "updated_at", tostring(now))
+redis.call("EXPIRE", KEYS[1], math.ceil(capacity / refill_rate) + 1)
+return {allowed, tostring(tokens)}
+"""
+
+
+class RedisBucketBackend:
+    """
+    Token buckets shared by every worker, stored in the Redis cache.
+    """
+
+    key_prefix = "throttle:"
+
+    def __init__(self, alias="default"):
+        from django_redis import get_redis_connection
+
+        self.redis = get_redis_connection(alias)
+        self.script = self.redis.register_script(TOKEN_BUCKET_SCRIPT)
+
+    def consume(self, key, capacity, refill_rate, cost=1):
+        allowed, tokens = self.script(
+            keys=[self.key_prefix + key], args=[capacity, refill_rate, cost]
+        )
+        if allowed:
+            return True, 0
+        return False, (cost - float(tokens)) / refill_rate
+
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        path = getattr(settings, "THROTTLE_BACKEND", None)
+        if path is None:
+            cache_backend = settings.CACHES["default"]["BACKEND"]
+            path = (
+                "api.throttling.RedisBucketBackend"
+                if cache_backend.startswith("django_redis.")
+                else "api.throttling.LocalBucketBackend"
+            )
+        _backend = import_string(path)()
+    return _backend
+
+
+class ScopedTokenBucketThrottle(BaseThrottle):
+    """
+    Token bucket throttle with one bucket per scope and client.
+
+    The scope comes from the view's ``throttle_scope``, either a string or a
+    ``{"read": ..., "write": ...}`` mapping, and defaults to ``read``/``write``.
+    Store admins share their store's buckets so all of a store's POS terminals
+    draw from one quota; ``STORE_THROTTLE_RATES`` overrides rates per store.
+    Anonymous clients use the ``anon`` scope, keyed by IP address.
+    """
+
+    def __init__(self):
+        self.retry_after = None
+
+    def get_scope(self, request, view):
+        if not request.user or not request.user.is_authenticated:
+            return "anon"
+        action = "read" if request.method in SAFE_METHODS else "write"
+        scope = getattr(view, "throttle_scope", None)
+        if isinstance(scope, dict):
+            scope = scope.get(action)
+        return scope or action
+
+    def get_bucket(self, request):
+        """
+        ``(store id or None, bucket identity)`` of the requesting client.
+        """
+        user = request.user
+        if not user or not user.is_authenticated:
+            return None, f"anon:{self.get_ident(request)}"
+        store_id = None if user.is_superuser else store_id_for_user(user)
+        if store_id is None:
+            return None, f"user:{user.pk}"
+        return store_id, f"store:{store_id}"
+
+    def get_rate(self, scope, store_id):
+        rates = getattr(settings, "STORE_THROTTLE_RATES", {}).get(store_id, {})
+        return rates.get(scope) or api_settings.DEFAULT_THROTTLE_RATES.get(scope)
+
+    def allow_request(self, request, view):
+        scope = self.get_scope(request, view)
+        store_id, ident = self.get_bucket(request)
+        rate = self.get_rate(scope, store_id)
+        if rate is None:
+            return True
+
+        capacity, refill_rate = parse_rate(rate)
+        allowed, self.retry_after = get_backend().consume(
+            f"{scope}:{ident}", capacity, refill_rate
+        )
+        return allowed
+
+    def wait(self):
+        return math.ceil(self.retry_after) if self.retry_after else None
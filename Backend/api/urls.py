@@ -1,6 +1,7 @@
 from django.urls import path
 from api.views import *
 from rest_framework.routers import DefaultRouter
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
 router = DefaultRouter()
 router.register("products", ProductViewsSet)
@@ -10,5 +11,15 @@ router.register("store-admin", StoreAdminViewsSet)
 router.register("supplier", SupplierViewsSet)
 router.register("address", AddressViewsSet)
 router.register("store", StoreViewsSet)
-urlpatterns = []
+router.register("tasks", TaskViewSet)
+urlpatterns = [
+    path("token/", TokenObtainPairView.as_view(), name="token_obtain_pair"),
+    path("token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
+    path("token/revoke/", LogoutView.as_view(), name="token_revoke"),
+    path("reports/analytics/", AnalyticsReportView.as_view(), name="reports_analytics"),
+    path(
+        "reports/top-products/", TopProductsView.as_view(), name="reports_top_products"
+    ),
+    path("sync/", SyncView.as_view(), name="sync"),
+]
 urlpatterns += router.urls
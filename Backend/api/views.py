@@ -1,7 +1,7 @@
-from rest_framework import viewsets, status
+from rest_framework import mixins, viewsets, status
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.exceptions import PermissionDenied, ValidationError
 from django.contrib.auth import authenticate
 from .models import *
 from .serializers import *
@@ -10,14 +10,36 @@ from rest_framework import filters
 from django_filters.rest_framework import DjangoFilterBackend
 from django.core.cache import cache
 from rest_framework.pagination import PageNumberPagination
+from .fastpath import FastListMixin, GRAND_TOTAL
+from .conditional import ConditionalGetMixin
+from .concurrency import OptimisticLockMixin
+from .fieldsets import SparseFieldsMixin
+from .archive import ArchiveReadMixin
+from .analytics import aggregate, refreshed_until
+from .cache import store_id_for_user
+from .authentication import revoke_token
+from .dashboard import get_store_kpi
+from .outbox import record
+from .pagination import EstimatedCountPagination
+from .rankings import get_ranking
+from .sync import decode_cursor, encode_cursor, pull, push_sales
+from django.conf import settings
+from django.utils import timezone
+from django.db import transaction
+from django.db.models import Max
+from rest_framework.views import APIView
+from rest_framework.decorators import action
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.exceptions import TokenError
 
 # Create your views here.
 
 
-class ProductViewsSet(viewsets.ModelViewSet):
+class ProductViewsSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     permission_classes = [IsAuthenticated]
+    throttle_scope = {"read": "catalog_read"}
 
     # Adding Pagination
     pagination_class = PageNumberPagination
@@ -51,13 +73,22 @@ class ProductViewsSet(viewsets.ModelViewSet):
 
         qs = super().get_queryset()
         if not self.request.user.is_superuser:
-            qs = qs.filter(inventory__store__admin=self.request.user).distinct()
+            store_id = store_id_for_user(self.request.user)
+            qs = qs.filter(inventory__store_id=store_id).distinct()
 
         # Cache the queryset results for 10 minutes
         # cache.set(cache_key, qs, timeout=600)
 
         return qs
 
+    def get_conditional_namespaces(self):
+        """
+        A store admin's product list changes whenever their inventory does.
+        """
+        if self.request.user.is_superuser:
+            return ()
+        return ("inventory",)
+
     def retrieve(self, request, *args, **kwargs):
         """
         Retrieve a single product and cache it.
@@ -106,14 +137,22 @@ class ProductViewsSet(viewsets.ModelViewSet):
         instance.delete()
 
 
-class SalesViewsSet(viewsets.ModelViewSet):
-    queryset = Sales.objects.prefetch_related(
-        "store", "store__address", "sales_item", "sales_item__product"
-    )
+class SalesViewsSet(
+    OptimisticLockMixin,
+    ArchiveReadMixin,
+    SparseFieldsMixin,
+    FastListMixin,
+    viewsets.ModelViewSet,
+):
+    # Stores are resolved from the reference cache by CachedStoreField
+    queryset = Sales.objects.prefetch_related("sales_item", "sales_item__product")
     serializer_class = SalesReadSerializer
     permission_classes = [IsAuthenticated]
-    # Adding Pagination
-    pagination_class = PageNumberPagination
+    throttle_scope = {"read": "reports", "write": "sales_write"}
+    fast_read_computed = {"grand_total": GRAND_TOTAL}
+
+    # Adding Pagination; counts past PAGINATION["EXACT_COUNT_BELOW"] are estimates
+    pagination_class = EstimatedCountPagination
     pagination_class.page_size = 5
     pagination_class.page_query_param = "page_num"
     pagination_class.page_size_query_param = "size"
@@ -135,19 +174,28 @@ class SalesViewsSet(viewsets.ModelViewSet):
     def get_queryset(self):
         qs = super().get_queryset()
         if not self.request.user.is_superuser:
-            return qs.filter(store__admin=self.request.user)
+            return qs.filter(store_id=store_id_for_user(self.request.user))
         return qs
 
-    def get_serializer(self, *args, **kwargs):
+    def get_serializer_class(self):
         if self.request.method == "POST" or self.request.method == "PUT":
             return SalesCreateSerilaizer
-        return super().get_serializer(*args, **kwargs)
+        return super().get_serializer_class()
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            record("sale.deleted", instance.store_id, instance.id, {"id": instance.id})
+            instance.delete()
 
 
-class StoreViewsSet(viewsets.ModelViewSet):
+class StoreViewsSet(ConditionalGetMixin, SparseFieldsMixin, viewsets.ModelViewSet):
     queryset = Store.objects.prefetch_related("admin")
     serializer_class = StoreSerializer
     permission_classes = [IsAuthenticated]
+    throttle_scope = {"read": "catalog_read"}
+    sparse_required_columns = ("updated_at",)
+    # Embedded addresses bump the store version too
+    conditional_namespaces = ("store",)
 
     # Adding Pagination
     pagination_class = PageNumberPagination
@@ -169,14 +217,49 @@ class StoreViewsSet(viewsets.ModelViewSet):
     def get_queryset(self):
         qs = super().get_queryset()
         if not self.request.user.is_superuser:
-            return qs.filter(admin=self.request.user)
+            return qs.filter(admin_id=self.request.user.pk)
         return qs
 
+    @action(detail=True, methods=["get"])
+    def dashboard(self, request, pk=None):
+        """
+        Today's precomputed KPIs of the store, kept current by the sales and
+        inventory signals.
+        """
+        store = self.get_object()
+        return Response(StoreKPISerializer(get_store_kpi(store.pk)).data)
+
+    @action(detail=True, methods=["get"], url_path="top-products")
+    def top_products(self, request, pk=None):
+        """
+        The store's best sellers and ABC classes, precomputed by
+        ``refresh_rankings``; ``?limit=`` shortens the best sellers.
+        """
+        store = self.get_object()
+        return ranking_response(request, store.pk)
+
+    @action(detail=True, methods=["get"], url_path="reorder-suggestions")
+    def reorder_suggestions(self, request, pk=None):
+        """
+        The store's products at or below their forecast reorder level and how
+        many to order, largest orders first (``forecast_demand``).
+        """
+        store = self.get_object()
+        suggestions = (
+            ReorderSuggestion.objects.filter(store_id=store.pk, reorder_quantity__gt=0)
+            .select_related("product")
+            .order_by("-reorder_quantity", "product_id")
+        )
+        page = self.paginate_queryset(suggestions)
+        serializer = ReorderSuggestionSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
 
 class SupplierViewsSet(viewsets.ModelViewSet):
     queryset = Supplier.objects.all()
     serializer_class = SupplierSerializer
     permission_classes = [IsAuthenticated]
+    throttle_scope = {"read": "catalog_read"}
 
     # Adding Pagination
     pagination_class = PageNumberPagination
@@ -194,7 +277,8 @@ class SupplierViewsSet(viewsets.ModelViewSet):
     def get_queryset(self):
         qs = super().get_queryset()
         if not self.request.user.is_superuser:
-            return qs.filter(inventory__store__admin=self.request.user).distinct()
+            store_id = store_id_for_user(self.request.user)
+            return qs.filter(inventory__store_id=store_id).distinct()
         return qs
 
 
@@ -216,43 +300,247 @@ class StoreAdminViewsSet(viewsets.ModelViewSet):
     def get_queryset(self):
         qs = super().get_queryset()
         if not self.request.user.is_superuser:
-            return qs.filter(store__admin=self.request.user)
+            return qs.filter(store__admin_id=self.request.user.pk)
         return qs
 
 
-class InventoryViewsSet(viewsets.ModelViewSet):
-    queryset = Inventory.objects.prefetch_related("store__admin", "product")
+class InventoryViewsSet(
+    OptimisticLockMixin,
+    ConditionalGetMixin,
+    SparseFieldsMixin,
+    FastListMixin,
+    viewsets.ModelViewSet,
+):
+    queryset = Inventory.objects.prefetch_related("product")
     serializer_class = InventoryReadSerializer
     permission_classes = [IsAuthenticated]
+    throttle_scope = {"read": "catalog_read"}
+    sparse_required_columns = ("updated_at",)
+    # Nested stores and products don't touch Inventory.updated_at
+    conditional_namespaces = ("store", "product")
 
-    # Adding Pagination
-    pagination_class = PageNumberPagination
+    # Adding Pagination; counts past PAGINATION["EXACT_COUNT_BELOW"] are estimates
+    pagination_class = EstimatedCountPagination
     pagination_class.page_size = 5
     pagination_class.page_query_param = "page_num"
     pagination_class.page_size_query_param = "size"
     pagination_class.max_page_size = 10
 
+    # Adding Filters
+    filterset_class = InventoryFilters
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    ordering_fields = ["quantity", "reorder_level", "last_restock_date", "created_at"]
+
     # A store admin will get to see only his inventory
     def get_queryset(self):
         qs = super().get_queryset()
         if not self.request.user.is_superuser:
-            return qs.filter(store__admin=self.request.user)
+            return qs.filter(store_id=store_id_for_user(self.request.user))
         return qs
 
-    def get_serializer(self, *args, **kwargs):
+    def get_serializer_class(self):
         if self.request.method == "POST" or self.request.method == "PUT":
             return InventoryCreateSerializer
-        return super().get_serializer(*args, **kwargs)
+        return super().get_serializer_class()
+
+    def list_etag_parts(self, queryset):
+        """
+        The latest change and delete in the user's stores instead of a count of
+        the filtered rows, which scans them all. Both are index lookups; the
+        filters are part of the request path the ETag covers anyway.
+        """
+        deletes = Tombstone.objects.filter(model="inventory")
+        if not self.request.user.is_superuser:
+            deletes = deletes.filter(store_id=store_id_for_user(self.request.user))
+        return (
+            self.get_queryset().aggregate(Max("updated_at"))["updated_at__max"],
+            deletes.order_by("-deleted_at", "-id").values_list("id", flat=True).first(),
+        )
+
+    # The outbox signal handlers write in the same transaction as the change
+    # (OptimisticLockMixin.perform_update runs in one too)
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            serializer.save()
 
 
 class AddressViewsSet(viewsets.ModelViewSet):
     queryset = Address.objects.all()
     serializer_class = AddressSerializer
     permission_classes = [IsAuthenticated]
+    throttle_scope = {"read": "catalog_read"}
 
     # A store admin will get to see only his address details
     def get_queryset(self):
         qs = super().get_queryset()
         if not self.request.user.is_superuser:
-            return qs.filter(store__admin=self.request.user)
+            return qs.filter(store__admin_id=self.request.user.pk)
         return qs
+
+
+class LogoutView(APIView):
+    """
+    Revoke the current access token and, if given, the refresh token.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        if request.auth is not None and hasattr(request.auth, "payload"):
+            revoke_token(request.auth)
+        refresh = request.data.get("refresh")
+        if refresh:
+            try:
+                revoke_token(RefreshToken(refresh))
+            except TokenError as error:
+                return Response(
+                    {"detail": str(error)}, status=status.HTTP_400_BAD_REQUEST
+                )
+        return Response(status=status.HTTP_205_RESET_CONTENT)
+
+
+class AnalyticsReportView(APIView):
+    """
+    Revenue, cost, margin and discount totals from the columnar analytics store
+    (``refresh_analytics``), e.g. ``?group_by=product,store&start=...`` for a
+    product x store margin matrix. Store admins only see their own store.
+    """
+
+    permission_classes = [IsAuthenticated]
+    throttle_scope = "reports"
+
+    def get(self, request):
+        query = AnalyticsQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+        store_id = params.get("store")
+        if not request.user.is_superuser:
+            store_id = store_id_for_user(request.user)
+            # None would aggregate every store
+            if store_id is None:
+                raise PermissionDenied("You don't manage a store.")
+
+        results = aggregate(
+            params["group_by"], params.get("start"), params.get("end"), store_id
+        )
+        if "product" in params["group_by"]:
+            names = dict(
+                Product.objects.filter(
+                    id__in={row["product"] for row in results}
+                ).values_list("id", "product_name")
+            )
+            for row in results:
+                row["product_name"] = names.get(row["product"])
+        if "store" in params["group_by"]:
+            names = dict(
+                Store.objects.filter(
+                    id__in={row["store"] for row in results}
+                ).values_list("id", "name")
+            )
+            for row in results:
+                row["store_name"] = names.get(row["store"])
+        for row in results:
+            # Money as strings, like DecimalField
+            for name in ("revenue", "cost", "margin", "discount"):
+                row[name] = str(row[name])
+        return Response({"refreshed_until": refreshed_until(), "results": results})
+
+
+def ranking_response(request, store_id):
+    query = RankingQuerySerializer(data=request.query_params)
+    query.is_valid(raise_exception=True)
+    data = ProductRankingSerializer(get_ranking(store_id)).data
+    data["top_products"] = data["top_products"][: query.validated_data.get("limit")]
+    return Response(data)
+
+
+class TopProductsView(APIView):
+    """
+    Best sellers and ABC classes of all stores together, precomputed by
+    ``refresh_rankings``. Each store's are at /api/store/{id}/top-products/.
+    """
+
+    permission_classes = [IsAuthenticated]
+    throttle_scope = "reports"
+
+    def get(self, request):
+        if not request.user.is_superuser:
+            raise PermissionDenied(
+                "Only superusers can see the rankings of all stores."
+            )
+        return ranking_response(request, None)
+
+
+class TaskViewSet(mixins.CreateModelMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Status of background tasks; superusers can also enqueue registered tasks
+    (``api.tasks.TASKS``) for the ``run_tasks`` workers.
+    """
+
+    queryset = Task.objects.all()
+    serializer_class = TaskSerializer
+    permission_classes = [IsAuthenticated]
+
+    # Adding Pagination
+    pagination_class = PageNumberPagination
+    pagination_class.page_size = 5
+    pagination_class.page_query_param = "page_num"
+    pagination_class.page_size_query_param = "size"
+    pagination_class.max_page_size = 10
+
+    # Adding Filters
+    filterset_class = TaskFilters
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    ordering_fields = ["created_at", "run_at", "finished_at"]
+    ordering = ["-created_at"]
+
+    # A store admin will get to see only the tasks he started
+    def get_queryset(self):
+        qs = super().get_queryset()
+        if not self.request.user.is_superuser:
+            return qs.filter(created_by_id=self.request.user.pk)
+        return qs
+
+    def perform_create(self, serializer):
+        if not self.request.user.is_superuser:
+            raise PermissionDenied("Only superusers can enqueue tasks.")
+        serializer.save(created_by=self.request.user)
+
+
+class SyncView(APIView):
+    """
+    Offline POS sync in one round trip. ``POST {"cursor": ..., "sales": [...]}``
+    creates the pushed sales (each once per ``client_id``) and returns the
+    catalog and stock changes since ``cursor`` as compact column/row batches
+    with the deleted ids, plus the next cursor. Without a cursor everything is
+    sent, in batches; pull again while ``more`` is true.
+    """
+
+    permission_classes = [IsAuthenticated]
+    throttle_scope = "sync"
+
+    def post(self, request):
+        query = SyncRequestSerializer(data=request.data)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+        if request.user.is_superuser:
+            store_id = params.get("store")
+            if store_id is None:
+                raise ValidationError({"store": ["This field is required."]})
+        else:
+            store_id = store_id_for_user(request.user)
+            if store_id is None:
+                raise PermissionDenied("You don't manage a store.")
+
+        issued = timezone.now()
+        marks = decode_cursor(params["cursor"])
+        results = push_sales(request, store_id, params["sales"])
+        changes, marks, more = pull(marks, store_id, settings.SYNC["BATCH_SIZE"])
+        return Response(
+            {
+                "sales": results,
+                **changes,
+                "cursor": encode_cursor(issued, marks),
+                "more": more,
+            }
+        )